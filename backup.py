@@ -0,0 +1,204 @@
+import argparse
+import gzip
+import json
+import lzma
+import os
+import sys
+from datetime import datetime
+
+# File in a backup directory listing the snapshots, oldest first
+BACKUP_MANIFEST = "backups.json"
+
+# Format version written in snapshot headers
+SNAPSHOT_VERSION = 1
+
+# Deltas taken after a full snapshot before the next backup is full again
+FULL_EVERY = 7
+
+# Compression of each snapshot kind: full snapshots are written rarely and
+# kept long, so they use the smaller format; deltas use the faster one
+COMPRESSION = {
+    "full": (lzma.open, ".jsonl.xz"),
+    "delta": (gzip.open, ".jsonl.gz")
+}
+
+
+def parse_time(text):
+    """
+    argparse type for a point in time (YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]).
+
+    Raises:
+        argparse.ArgumentTypeError: If the text is not a date or date and time
+    """
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a date or date and time: {text}")
+
+
+class BackupSet:
+    """
+    Point-in-time snapshots of a roster in a backup directory.
+
+    A full snapshot holds every student, attendance mark and photo path. A
+    delta holds only the records changed since the previous snapshot, found
+    through the store's change log, so its size (and the work to take it)
+    follows the churn rather than the roster size. Restoring to a point in
+    time applies the latest full snapshot taken by then plus the deltas
+    that followed it.
+    """
+
+    def __init__(self, backup_dir):
+        """
+        Open a backup directory, creating it if needed.
+
+        Args:
+            backup_dir (str): Directory holding the snapshots
+        """
+        self.backup_dir = backup_dir
+        os.makedirs(backup_dir, exist_ok=True)
+        path = os.path.join(backup_dir, BACKUP_MANIFEST)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.snapshots = json.load(f)["snapshots"]
+        else:
+            self.snapshots = []
+
+    def needs_full(self, instance, sequence):
+        """
+        Return True if the next snapshot has to be a full one.
+
+        Deltas are only possible when the previous snapshot came from the
+        same change log and that log has not gone back in time (e.g. a
+        restart from a data directory saved before the last backup).
+
+        Args:
+            instance (str): ID of the store's change log
+            sequence (int): Current sequence number of the change log
+        """
+        if not self.snapshots:
+            return True
+        last = self.snapshots[-1]
+        if last["instance"] != instance or sequence < last["sequence"]:
+            return True
+        deltas = 0
+        for snapshot in reversed(self.snapshots):
+            if snapshot["kind"] == "full":
+                break
+            deltas += 1
+        return deltas >= FULL_EVERY
+
+    @property
+    def last_sequence(self):
+        """Change sequence number covered by the latest snapshot."""
+        return self.snapshots[-1]["sequence"]
+
+    def write(self, kind, header, records):
+        """
+        Write a snapshot and add it to the manifest.
+
+        Args:
+            kind (str): 'full' or 'delta'
+            header (dict): 'instance', 'sequence' and 'next_id' of the store
+            records (iterable): Record dicts of the snapshot
+
+        Returns:
+            dict: Manifest entry of the snapshot
+        """
+        taken = datetime.now()
+        opener, extension = COMPRESSION[kind]
+        name = f"{taken:%Y%m%dT%H%M%S}-{len(self.snapshots):05d}-{kind}{extension}"
+        entry = dict(header, kind=kind, file=name, time=taken.isoformat(timespec="seconds"), records=0)
+
+        path = os.path.join(self.backup_dir, name)
+        with opener(path + ".tmp", 'wt') as f:
+            f.write(json.dumps(dict(entry, type="header", version=SNAPSHOT_VERSION)) + "\n")
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+                entry["records"] += 1
+        os.replace(path + ".tmp", path)
+
+        self.snapshots.append(entry)
+        manifest_path = os.path.join(self.backup_dir, BACKUP_MANIFEST)
+        with open(manifest_path + ".tmp", 'w') as f:
+            json.dump({"snapshots": self.snapshots}, f, indent=1)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        return entry
+
+    def chain(self, at=None):
+        """
+        Return the snapshots to apply to restore a point in time.
+
+        Args:
+            at (datetime, optional): Point in time (default: latest)
+
+        Returns:
+            list: Manifest entries of a full snapshot and the deltas after it
+
+        Raises:
+            ValueError: If no full snapshot was taken by that time
+        """
+        taken = [snapshot for snapshot in self.snapshots
+                 if at is None or datetime.fromisoformat(snapshot["time"]) <= at]
+        for position in range(len(taken) - 1, -1, -1):
+            if taken[position]["kind"] == "full":
+                return taken[position:]
+        raise ValueError(f"No full snapshot in {self.backup_dir}" + (f" taken by {at}" if at else ""))
+
+    def read(self, snapshot):
+        """Yield the record dicts of a snapshot, after checking its header."""
+        opener, _ = COMPRESSION[snapshot["kind"]]
+        with opener(os.path.join(self.backup_dir, snapshot["file"]), 'rt') as f:
+            header = json.loads(next(f))
+            if header.get("type") != "header" or header.get("version") != SNAPSHOT_VERSION:
+                raise ValueError(f"Not a valid snapshot: {snapshot['file']}")
+            for line in f:
+                yield json.loads(line)
+
+    def restore(self, at=None):
+        """
+        Rebuild the roster as of a point in time.
+
+        Args:
+            at (datetime, optional): Point in time (default: latest)
+
+        Returns:
+            dict: 'students' (ID to row), 'attendance' (date to {ID: status}),
+                'photos' (ID to path), 'next_id' and 'time' of the last
+                snapshot applied
+
+        Raises:
+            ValueError: If no full snapshot was taken by that time
+        """
+        chain = self.chain(at)
+        students, attendance, photos = {}, {}, {}
+        for snapshot in chain:
+            for record in self.read(snapshot):
+                student_id = record["id"]
+                if record["type"] == "student":
+                    if record["row"] is None:
+                        students.pop(student_id, None)
+                        photos.pop(student_id, None)
+                    else:
+                        students[student_id] = record["row"]
+                elif record["type"] == "attendance":
+                    attendance.setdefault(record["date"], {})[student_id] = record["status"]
+                elif record["path"] is None:
+                    photos.pop(student_id, None)
+                else:
+                    photos[student_id] = record["path"]
+        return {"students": students, "attendance": attendance, "photos": photos,
+                "next_id": chain[-1]["next_id"], "time": chain[-1]["time"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the snapshots of a backup directory.")
+    parser.add_argument("backup_dir")
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.backup_dir, BACKUP_MANIFEST)):
+        print(f"Error: no backups in {args.backup_dir}", file=sys.stderr)
+        sys.exit(1)
+    for snapshot in BackupSet(args.backup_dir).snapshots:
+        size = os.path.getsize(os.path.join(args.backup_dir, snapshot["file"]))
+        print(f"{snapshot['time']}\t{snapshot['kind']}\t{snapshot['records']} records\t{size} bytes\t{snapshot['file']}")
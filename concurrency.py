@@ -0,0 +1,125 @@
+import functools
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Lock that lets many readers in at once, or one writer.
+
+    Waiting writers are preferred over new readers so a steady stream of
+    reports cannot starve edits. The lock is reentrant per thread: a thread
+    holding it for writing may also take it for reading or writing again,
+    and a reader may take it for reading again. A reader may not upgrade to
+    writing, since two readers doing so would deadlock.
+    """
+
+    def __init__(self):
+        """Initialize an unlocked lock."""
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def acquire_read(self):
+        """Wait until no writer holds or waits for the lock, then take it for reading."""
+        if getattr(self._local, "depth", 0):
+            self._local.depth += 1
+            return
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.depth = 1
+        self._local.writing = False
+
+    def acquire_write(self):
+        """
+        Wait until nobody else holds the lock, then take it for writing.
+
+        Raises:
+            RuntimeError: If this thread holds the lock for reading
+        """
+        if getattr(self._local, "depth", 0):
+            if not self._local.writing:
+                raise RuntimeError("Cannot upgrade a read lock to a write lock")
+            self._local.depth += 1
+            return
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = threading.get_ident()
+        self._local.depth = 1
+        self._local.writing = True
+
+    def release(self):
+        """Release the lock taken by the matching acquire call."""
+        self._local.depth -= 1
+        if self._local.depth:
+            return
+        with self._condition:
+            if self._local.writing:
+                self._writer = None
+            else:
+                self._readers -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        """Hold the lock for reading inside a with block."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def write_locked(self):
+        """Hold the lock for writing inside a with block."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def reads(method):
+    """Run a method of an object with a 'lock' ReadWriteLock held for reading."""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.read_locked():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def writes(method):
+    """Run a method of an object with a 'lock' ReadWriteLock held for writing."""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.write_locked():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class Snapshot:
+    """
+    Consistent, read-only view of the students and attendance at one moment.
+
+    Students are copy-on-write (updates store a new object rather than
+    changing the old one), so the snapshot only copies the dicts, not the
+    records. It can be read from any thread without holding the lock.
+    """
+
+    def __init__(self, students, attendance_records):
+        """
+        Initialize the snapshot.
+
+        Args:
+            students (dict): Copy of the student ID to student mapping
+            attendance_records (dict): Copy of the date to {ID: status} mapping
+        """
+        self.students = students
+        self.attendance_records = attendance_records
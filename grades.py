@@ -0,0 +1,86 @@
+import re
+import threading
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_grade(grade):
+    """Return a grade without surrounding whitespace and with inner runs of whitespace collapsed."""
+    return WHITESPACE_PATTERN.sub(" ", grade.strip())
+
+
+def grade_key(grade):
+    """Return the comparison key of a grade: normalized and case-folded."""
+    return normalize_grade(grade).casefold()
+
+
+class GradeDictionary:
+    """
+    Interned grades, each with a small integer code.
+
+    A roster has few distinct grades, so every student stores the code of
+    their grade (and shares one name string per grade) instead of a copy
+    of the text. Grades that differ only in case or whitespace are the
+    same grade; the first spelling seen is the one displayed. Filters,
+    group-bys and indexes compare codes, and the names are only looked up
+    for display.
+
+    Codes are never reused or renumbered, but they are only meaningful
+    within one process: files and exchanged records keep the names.
+    """
+
+    def __init__(self):
+        """Initialize an empty dictionary."""
+        self.names = []
+        self.keys = []
+        self.codes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of distinct grades."""
+        return len(self.names)
+
+    def code(self, grade):
+        """
+        Return the code of a grade, adding the grade if it is new.
+
+        Args:
+            grade (str): Grade as entered or read from a file
+        """
+        key = grade_key(grade)
+        code = self.codes.get(key)
+        if code is None:
+            with self._lock:
+                code = self.codes.get(key)
+                if code is None:
+                    code = len(self.names)
+                    self.names.append(normalize_grade(grade))
+                    self.keys.append(key)
+                    self.codes[key] = code
+        return code
+
+    def lookup(self, grade):
+        """Return the code of a grade, or None if it has not been seen."""
+        return self.codes.get(grade_key(grade))
+
+    def name(self, code):
+        """Return the display name of a code."""
+        return self.names[code]
+
+    def sort_key(self, code):
+        """Return the case-insensitive sort key of a code."""
+        return self.keys[code]
+
+    def matching(self, text):
+        """
+        Return the codes of the grades containing a text, ignoring case and whitespace runs.
+
+        Only the distinct grades are compared, so a grade search costs one
+        substring test per grade rather than per student.
+        """
+        text = grade_key(text)
+        return frozenset(code for code, key in enumerate(self.keys) if text in key)
+
+
+# Grades of every roster in this process
+GRADES = GradeDictionary()
@@ -1,34 +1,146 @@
+import time
+
+# Reference point for the startup timing (time to first paint / interactive)
+STARTUP_TIME = time.perf_counter()
+
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import csv
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from student import Student, Contact
+from student import validate_records
+from grades import GRADES
+from main import StudentManagementSystem
+import reports
+from logging_setup import configure_logging
 import logging
-import re
-from PIL import Image, ImageTk  # You'll need to install Pillow: pip install Pillow
+
+# Pillow is imported on first photo use (see load_pil); you'll need to install it: pip install Pillow
+Image = None
+ImageTk = None
+
+# Lines kept in the Recent Activities panel (the log file keeps everything)
+ACTIVITY_LOG_CAPACITY = 500
+
+# Delay before queued activity lines are drawn, roughly one frame
+ACTIVITY_FLUSH_MS = 16
+
+# Interval at which a background photo import is checked for completion
+PHOTO_IMPORT_POLL_MS = 100
+
+
+def load_pil():
+    """Import Pillow on first use, so startup does not pay for it."""
+    global Image, ImageTk
+    if Image is None:
+        from PIL import Image as pil_image, ImageTk as pil_image_tk
+        Image, ImageTk = pil_image, pil_image_tk
+    return Image, ImageTk
+
+
+def load_photo(path, size):
+    """
+    Open an image file as a Tk photo.
+    
+    Args:
+        path (str): Image file path
+        size (tuple): (width, height) to resize to
+        
+    Returns:
+        ImageTk.PhotoImage: The resized photo
+    """
+    load_pil()
+    img = Image.open(path)
+    img = img.resize(size, Image.LANCZOS)
+    return ImageTk.PhotoImage(img)
+
+
+class ActivityFeed:
+    """Activity lines shown in a Text widget, which keeps at most a fixed number of them."""
+    
+    def __init__(self, root, text_widget, capacity=ACTIVITY_LOG_CAPACITY):
+        """
+        Initialize the feed.
+        
+        Args:
+            root: The tkinter root window, used to schedule redraws
+            text_widget (tk.Text): Read-only widget showing the lines
+            capacity (int): Maximum number of lines kept
+        """
+        self.root = root
+        self.text_widget = text_widget
+        self.capacity = capacity
+        # Lines not drawn yet; only the newest ones can end up on screen
+        self._pending = deque(maxlen=capacity)
+        self._flush_id = None
+    
+    def append(self, line):
+        """Queue a line (ending in a newline) to be drawn on the next frame."""
+        self._pending.append(line)
+        if self._flush_id is None:
+            self._flush_id = self.root.after(ACTIVITY_FLUSH_MS, self.flush)
+    
+    def flush(self):
+        """Draw all queued lines with one insert and trim the oldest ones."""
+        self._flush_id = None
+        if not self._pending:
+            return
+        
+        text = "".join(self._pending)
+        self._pending.clear()
+        
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.insert(tk.END, text)
+        
+        # The widget always ends with an empty line after the last newline
+        line_count = int(self.text_widget.index("end-1c").split(".")[0]) - 1
+        excess = line_count - self.capacity
+        if excess > 0:
+            self.text_widget.delete("1.0", f"{excess + 1}.0")
+        
+        self.text_widget.see(tk.END)
+        self.text_widget.config(state=tk.DISABLED)
+
 
 class StudentManagementGUI:
     """GUI for the Student Management System."""
     
-    def __init__(self, root):
+    def __init__(self, root, share_name=None, data_dir=None, grades=None):
         """
         Initialize the GUI.
         
         Args:
             root: The tkinter root window
+            share_name (str, optional): Publish the roster to shared memory
+                under this name for other local processes
+            data_dir (str, optional): Directory the roster is loaded from
+                and saved to on exit (default: sample data, not saved)
+            grades (list, optional): With a sharded data directory, the
+                grades to load up front
         """
         self.root = root
         self.root.title("Student Management System")
         self.root.geometry("1000x600")
         self.root.configure(bg="#f0f0f0")
         
-        # Initialize student data
-        self.students = {}
-        self.next_id = 1
-        self.attendance_records = {}
+        # Initialize student data (shared with the CLI system)
+        self.system = StudentManagementSystem()
+        self.students = self.system.students
+        self.attendance_records = self.system.attendance_records
         self.current_student_id = None
-        self.student_photos = {}
+        self.student_photos = self.system.photos
+        # Background photo import in progress, if any
+        self.photo_import = None
+        self.share_name = share_name
+        self.data_dir = data_dir
+        self.grades = grades
+        
+        # Sort state of each treeview and the attendance shown in the attendance tab
+        self.tree_sorts = {}
+        self.attendance_status = {}
         
         # Create main notebook (tabbed interface)
         self.notebook = ttk.Notebook(root)
@@ -47,12 +159,15 @@ class StudentManagementGUI:
         self.notebook.add(self.attendance_frame, text="Attendance")
         self.notebook.add(self.reports_frame, text="Reports")
         
-        # Setup each tab
+        # Only the dashboard is built now; other tabs are built when first selected
         self.setup_dashboard()
-        self.setup_add_student()
-        self.setup_view_students()
-        self.setup_attendance()
-        self.setup_reports()
+        self.pending_tabs = {
+            str(self.add_student_frame): (self.setup_add_student, None),
+            str(self.view_students_frame): (self.setup_view_students, self.refresh_students_list),
+            str(self.attendance_frame): (self.setup_attendance, self.load_attendance),
+            str(self.reports_frame): (self.setup_reports, None)
+        }
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # Status bar
         self.status_var = tk.StringVar()
@@ -60,8 +175,52 @@ class StudentManagementGUI:
         self.status_bar = ttk.Label(root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
-        # Load data if exists
+        # Load data once the first frame has been drawn
+        self.startup_times = {}
+        self.root.after_idle(self.on_first_paint)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    def on_first_paint(self):
+        """Record time to first paint, then load the data."""
+        self.startup_times["first_paint"] = time.perf_counter() - STARTUP_TIME
+        self.root.after_idle(self.finish_startup)
+    
+    def finish_startup(self):
+        """Load the data and record time to interactive."""
         self.load_data()
+        if self.share_name:
+            self.system.share(self.share_name)
+        self.root.update_idletasks()
+        self.startup_times["interactive"] = time.perf_counter() - STARTUP_TIME
+        
+        timing = (f"Startup: first paint {self.startup_times['first_paint'] * 1000:.0f} ms, "
+                  f"interactive {self.startup_times['interactive'] * 1000:.0f} ms")
+        logging.info(timing)
+        self.status_var.set(timing)
+    
+    def on_close(self):
+        """Save the roster to the data directory, if any, stop sharing it and close the window."""
+        if self.data_dir:
+            try:
+                self.system.save(self.data_dir)
+            except OSError as e:
+                if not messagebox.askyesno("Error", f"Could not save to {self.data_dir}: {e}\n\nClose anyway?"):
+                    return
+        self.system.stop_sharing()
+        self.root.destroy()
+    
+    def on_tab_changed(self, event):
+        """Build a tab's widgets the first time it is selected."""
+        tab = self.pending_tabs.pop(self.notebook.select(), None)
+        if tab:
+            setup, populate = tab
+            setup()
+            if populate:
+                populate()
+    
+    def tab_pending(self, frame):
+        """Return True if a tab's widgets have not been built yet."""
+        return str(frame) in self.pending_tabs
     
     def setup_dashboard(self):
         """Setup the dashboard tab."""
@@ -79,6 +238,9 @@ class StudentManagementGUI:
         # Stats variables
         self.total_students_var = tk.StringVar(value="0")
         self.avg_age_var = tk.StringVar(value="0")
+        self.age_range_var = tk.StringVar(value="-")
+        self.grades_var = tk.StringVar(value="-")
+        self.attendance_rate_var = tk.StringVar(value="-")
         
         # Stats labels
         ttk.Label(stats_frame, text="Total Students:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
@@ -87,6 +249,15 @@ class StudentManagementGUI:
         ttk.Label(stats_frame, text="Average Age:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
         ttk.Label(stats_frame, textvariable=self.avg_age_var).grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
         
+        ttk.Label(stats_frame, text="Age Range:").grid(row=0, column=2, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(stats_frame, textvariable=self.age_range_var).grid(row=0, column=3, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(stats_frame, text="Today's Attendance:").grid(row=1, column=2, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(stats_frame, textvariable=self.attendance_rate_var).grid(row=1, column=3, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(stats_frame, text="Largest Grades:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(stats_frame, textvariable=self.grades_var).grid(row=2, column=1, columnspan=3, sticky=tk.W, padx=5, pady=5)
+        
         # Quick actions frame
         actions_frame = ttk.LabelFrame(frame, text="Quick Actions", padding=10)
         actions_frame.pack(fill=tk.X, pady=10)
@@ -99,6 +270,7 @@ class StudentManagementGUI:
         ttk.Button(actions_frame, text="Export Data", command=self.export_data).grid(row=1, column=0, padx=5, pady=5)
         ttk.Button(actions_frame, text="Import Data", command=self.import_data).grid(row=1, column=1, padx=5, pady=5)
         ttk.Button(actions_frame, text="Refresh Dashboard", command=self.update_dashboard).grid(row=1, column=2, padx=5, pady=5)
+        ttk.Button(actions_frame, text="Import Photos", command=self.import_photos).grid(row=1, column=3, padx=5, pady=5)
         
         # Recent activities frame
         recent_frame = ttk.LabelFrame(frame, text="Recent Activities", padding=10)
@@ -112,6 +284,7 @@ class StudentManagementGUI:
         scrollbar = ttk.Scrollbar(self.activity_log, command=self.activity_log.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.activity_log.config(yscrollcommand=scrollbar.set)
+        self.activity_feed = ActivityFeed(self.root, self.activity_log)
     
     def setup_add_student(self):
         """Setup the add student tab."""
@@ -209,13 +382,15 @@ class StudentManagementGUI:
         columns = ("id", "name", "age", "grade", "phone", "email")
         self.students_tree = ttk.Treeview(list_frame, columns=columns, show="headings")
         
-        # Define headings
-        self.students_tree.heading("id", text="ID")
-        self.students_tree.heading("name", text="Name")
-        self.students_tree.heading("age", text="Age")
-        self.students_tree.heading("grade", text="Grade")
-        self.students_tree.heading("phone", text="Phone")
-        self.students_tree.heading("email", text="Email")
+        # Define headings (click to sort, shift-click to add a sort key)
+        self.setup_sortable_headings(self.students_tree, "students", {
+            "id": "ID",
+            "name": "Name",
+            "age": "Age",
+            "grade": "Grade",
+            "phone": "Phone",
+            "email": "Email"
+        })
         
         # Define columns
         self.students_tree.column("id", width=50)
@@ -288,11 +463,13 @@ class StudentManagementGUI:
         columns = ("id", "name", "grade", "status")
         self.attendance_tree = ttk.Treeview(attendance_frame, columns=columns, show="headings")
         
-        # Define headings
-        self.attendance_tree.heading("id", text="ID")
-        self.attendance_tree.heading("name", text="Name")
-        self.attendance_tree.heading("grade", text="Grade")
-        self.attendance_tree.heading("status", text="Status")
+        # Define headings (click to sort, shift-click to add a sort key)
+        self.setup_sortable_headings(self.attendance_tree, "attendance", {
+            "id": "ID",
+            "name": "Name",
+            "grade": "Grade",
+            "status": "Status"
+        })
         
         # Define columns
         self.attendance_tree.column("id", width=50)
@@ -338,6 +515,23 @@ class StudentManagementGUI:
         ttk.Button(report_types_frame, text="Attendance Summary", command=lambda: self.generate_report("attendance")).grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
         ttk.Button(report_types_frame, text="Grade Distribution", command=lambda: self.generate_report("grades")).grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
         ttk.Button(report_types_frame, text="Age Distribution", command=lambda: self.generate_report("ages")).grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Button(report_types_frame, text="Duplicate Contacts", command=lambda: self.generate_report("duplicates")).grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Button(report_types_frame, text="At-Risk Students", command=lambda: self.generate_report("at_risk")).grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        
+        # Options of the at-risk report
+        at_risk_frame = ttk.Frame(report_types_frame)
+        at_risk_frame.grid(row=6, column=0, sticky=tk.W, padx=5)
+        self.at_risk_count = tk.IntVar(value=10)
+        self.at_risk_per_grade = tk.BooleanVar(value=False)
+        self.at_risk_from = tk.StringVar()
+        self.at_risk_to = tk.StringVar()
+        ttk.Label(at_risk_frame, text="Show:").grid(row=0, column=0, sticky=tk.W)
+        ttk.Spinbox(at_risk_frame, from_=1, to=1000, width=5, textvariable=self.at_risk_count).grid(row=0, column=1, sticky=tk.W)
+        ttk.Checkbutton(at_risk_frame, text="Per grade", variable=self.at_risk_per_grade).grid(row=0, column=2, sticky=tk.W, padx=5)
+        ttk.Label(at_risk_frame, text="From:").grid(row=1, column=0, sticky=tk.W)
+        ttk.Entry(at_risk_frame, textvariable=self.at_risk_from, width=11).grid(row=1, column=1, columnspan=2, sticky=tk.W)
+        ttk.Label(at_risk_frame, text="To:").grid(row=2, column=0, sticky=tk.W)
+        ttk.Entry(at_risk_frame, textvariable=self.at_risk_to, width=11).grid(row=2, column=1, columnspan=2, sticky=tk.W)
         
         # Report display frame
         report_display_frame = ttk.LabelFrame(frame, text="Report", padding=10)
@@ -359,74 +553,144 @@ class StudentManagementGUI:
         ttk.Button(export_frame, text="Print Report", command=self.print_report).grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
     
     # Helper methods
+    def setup_sortable_headings(self, tree, name, labels):
+        """
+        Make a treeview's column headings sort its rows.
+        
+        Clicking a heading sorts by that column (again to reverse), and
+        shift-clicking adds the column as a further sort key.
+        
+        Args:
+            tree (ttk.Treeview): Treeview whose item IDs are student IDs
+            name (str): Key of the tree's sort state in self.tree_sorts
+            labels (dict): Heading text by column
+        """
+        self.tree_sorts[name] = {"fields": [], "descending": False, "labels": labels}
+        for column, label in labels.items():
+            tree.heading(column, text=label, command=lambda c=column: self.sort_tree(name, c))
+        tree.bind("<Shift-Button-1>", lambda event: self.on_heading_shift_click(event, tree, name))
+    
+    def on_heading_shift_click(self, event, tree, name):
+        """Add the shift-clicked column as a further sort key."""
+        if tree.identify_region(event.x, event.y) != "heading":
+            return None
+        column = tree.column(tree.identify_column(event.x), "id")
+        self.sort_tree(name, column, add=True)
+        return "break"
+    
+    def sort_tree(self, name, column, add=False):
+        """
+        Change a treeview's sort order and reorder its rows.
+        
+        Args:
+            name (str): 'students' or 'attendance'
+            column (str): Column that was clicked
+            add (bool): Add the column as a further sort key
+        """
+        state = self.tree_sorts[name]
+        if add and column not in state["fields"]:
+            state["fields"].append(column)
+        elif state["fields"] == [column] or (add and column in state["fields"]):
+            state["descending"] = not state["descending"]
+        else:
+            state["fields"] = [column]
+            state["descending"] = False
+        
+        # Show the sort keys in the headings
+        tree = self.students_tree if name == "students" else self.attendance_tree
+        arrow = " \u25bc" if state["descending"] else " \u25b2"
+        for field, label in state["labels"].items():
+            if field in state["fields"]:
+                position = state["fields"].index(field)
+                label += arrow + (str(position + 1) if len(state["fields"]) > 1 else "")
+            tree.heading(field, text=label)
+        
+        ordered = self.ordered_student_ids() if name == "students" else self.ordered_attendance_ids()
+        self.reorder_tree(tree, ordered)
+        self.status_var.set(f"Sorted by {', '.join(state['fields'])}")
+    
+    def ordered_student_ids(self):
+        """Return student IDs in the students list's sort order."""
+        state = self.tree_sorts["students"]
+        return self.system.sorted_ids(state["fields"], state["descending"])
+    
+    def ordered_attendance_ids(self):
+        """
+        Return student IDs in the attendance list's sort order.
+        
+        Status depends on the date shown, so it has no store index; when it
+        is a sort key the indexed order of the other keys is grouped by
+        status in one linear pass.
+        """
+        state = self.tree_sorts["attendance"]
+        fields = [field for field in state["fields"] if field != "status"]
+        ordered = self.system.sorted_ids(fields, state["descending"])
+        if "status" not in state["fields"]:
+            return ordered
+        
+        groups = {"Absent": [], "Present": []}
+        for student_id in ordered:
+            groups.setdefault(self.attendance_status.get(student_id, "Absent"), []).append(student_id)
+        statuses = sorted(groups, reverse=state["descending"])
+        return [student_id for status in statuses for student_id in groups[status]]
+    
+    @staticmethod
+    def reorder_tree(tree, ordered_ids):
+        """Reorder a treeview's rows to follow ordered_ids in a single Tk call."""
+        shown = set(tree.get_children())
+        tree.set_children("", *[iid for iid in map(str, ordered_ids) if iid in shown])
+    
     def log_activity(self, message):
         """Log an activity to the activity log."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_message = f"[{timestamp}] {message}\n"
         
-        self.activity_log.config(state=tk.NORMAL)
-        self.activity_log.insert(tk.END, log_message)
-        self.activity_log.see(tk.END)
-        self.activity_log.config(state=tk.DISABLED)
+        # Bursts of messages are drawn together on the next frame
+        self.activity_feed.append(log_message)
         
-        # Also log to file
+        # Also log to file (full history)
         logging.info(message)
     
     def update_dashboard(self):
-        """Update dashboard statistics."""
+        """Update dashboard statistics from the running aggregates."""
+        stats = self.system.stats
+        
+        # Every change ends here, so attached processes see it right away
+        self.system.publish_shared()
+        
         # Update total students
-        self.total_students_var.set(str(len(self.students)))
+        self.total_students_var.set(str(stats.count))
         
-        # Calculate average age
-        if self.students:
-            total_age = sum(student.age for student in self.students.values())
-            avg_age = total_age / len(self.students)
-            self.avg_age_var.set(f"{avg_age:.1f}")
-        else:
-            self.avg_age_var.set("0")
+        # Age statistics
+        self.avg_age_var.set(f"{stats.mean_age:.1f}" if stats.count else "0")
+        age_range = stats.age_range
+        self.age_range_var.set(f"{age_range[0]} - {age_range[1]}" if age_range else "-")
+        
+        # Grade counts, largest first
+        self.grades_var.set(", ".join(
+            f"{GRADES.name(code)}: {count}" for code, count in stats.grade_counts.most_common(5)
+        ) or "-")
+        
+        # Today's attendance
+        rate, present, marked = stats.attendance_rate(datetime.now().strftime("%Y-%m-%d"))
+        self.attendance_rate_var.set(f"{rate * 100:.1f}% ({present}/{marked})" if rate is not None else "Not taken")
         
         self.status_var.set("Dashboard updated")
     
     def validate_inputs(self):
         """Validate form inputs."""
-        try:
-            # Get values
-            name = self.name_var.get().strip()
-            age_str = self.age_var.get().strip()
-            grade = self.grade_var.get().strip()
-            phone = self.phone_var.get().strip()
-            email = self.email_var.get().strip()
-            
-            # Validate name
-            if not name:
-                raise ValueError("Name cannot be empty")
-            if any(char.isdigit() for char in name):
-                raise ValueError("Name must not contain numbers")
-            
-            # Validate age
-            try:
-                age = int(age_str)
-                if age <= 0:
-                    raise ValueError("Age must be a positive integer")
-            except ValueError:
-                raise ValueError("Age must be a valid integer")
-            
-            # Validate grade
-            if not grade:
-                raise ValueError("Grade cannot be empty")
-            
-            # Validate phone
-            if len(phone) != 11 or not phone.isdigit():
-                raise ValueError("Phone number must be an 11-digit number")
-            
-            # Validate email
-            if not re.match(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", email):
-                raise ValueError("Invalid email address format")
-            
-            return True
-        except ValueError as e:
-            messagebox.showerror("Validation Error", str(e))
+        result = validate_records(
+            names=[self.name_var.get().strip()],
+            ages=[self.age_var.get().strip()],
+            grades=[self.grade_var.get().strip()],
+            phones=[self.phone_var.get().strip()],
+            emails=[self.email_var.get().strip()]
+        )
+        
+        if not result.valid:
+            messagebox.showerror("Validation Error", "\n".join(result.messages(0)))
             return False
+        return True
     
     def add_student(self):
         """Add a new student."""
@@ -436,24 +700,22 @@ class StudentManagementGUI:
         try:
             # Get values
             name = self.name_var.get().strip()
-            age = int(self.age_var.get().strip())
-            grade = self.grade_var.get().strip()
-            phone = self.phone_var.get().strip()
-            email = self.email_var.get().strip()
-            
-            # Create contact and student objects
-            contact = Contact(phone, email)
-            student = Student(self.next_id, name, age, grade, contact)
             
             # Add student to the system
-            self.students[self.next_id] = student
+            ids, errors = self.system.add_many([{
+                "name": name,
+                "age": self.age_var.get().strip(),
+                "grade": self.grade_var.get().strip(),
+                "phone": self.phone_var.get().strip(),
+                "email": self.email_var.get().strip()
+            }])
+            if errors:
+                raise ValueError("\n".join(errors[0]))
+            student = self.students[ids[0]]
             
             # Save photo if selected
             if self.photo_path:
-                self.student_photos[self.next_id] = self.photo_path
-            
-            # Increment ID
-            self.next_id += 1
+                self.system.set_photos({student.id: self.photo_path})
             
             # Log activity
             self.log_activity(f"Added new student: {name} with ID: {student.id}")
@@ -495,9 +757,7 @@ class StudentManagementGUI:
         if file_path:
             try:
                 # Open and resize image
-                img = Image.open(file_path)
-                img = img.resize((100, 100), Image.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
+                photo = load_photo(file_path, (100, 100))
                 
                 # Update photo label
                 self.photo_label.config(image=photo, text="")
@@ -509,6 +769,62 @@ class StudentManagementGUI:
             except Exception as e:
                 messagebox.showerror("Error", f"Error loading image: {str(e)}")
     
+    def import_photos(self):
+        """
+        Attach photos in bulk from a directory, matched by student ID or name.
+        
+        The photos are processed on a background thread (which runs the
+        worker processes), so the window stays responsive; the result is
+        picked up on the Tk thread by finish_photo_import().
+        """
+        if self.photo_import is not None:
+            messagebox.showinfo("Photo Import", "A photo import is already running.")
+            return
+        directory = filedialog.askdirectory(title="Select Photo Directory")
+        
+        if directory:
+            import photo_import
+            self.status_var.set(f"Importing photos from {directory}...")
+            # The worker thread reads a snapshot, not the live roster
+            students = self.system.snapshot().students
+            executor = ThreadPoolExecutor(max_workers=1)
+            self.photo_import = executor.submit(photo_import.import_photos, directory, students,
+                                                photo_import.thumbnail_folder(self.data_dir))
+            executor.shutdown(wait=False)
+            self.root.after(PHOTO_IMPORT_POLL_MS, self.finish_photo_import)
+    
+    def finish_photo_import(self):
+        """Attach the photos of a finished background import, or check again later."""
+        if not self.photo_import.done():
+            self.root.after(PHOTO_IMPORT_POLL_MS, self.finish_photo_import)
+            return
+        future, self.photo_import = self.photo_import, None
+        try:
+            result = future.result()
+            
+            # Attach all photos in one batch; students deleted meanwhile are skipped
+            self.system.set_photos({student_id: path for student_id, path in result.photos.items()
+                                    if student_id in self.students})
+            
+            self.log_activity(result.summary())
+            self.status_var.set(result.summary())
+            
+            message = result.summary()
+            if result.failures:
+                message += "\n\nFailed files:\n" + "\n".join(
+                    f"{os.path.basename(path)}: {reason}" for path, reason in result.failures[:10]
+                )
+                if len(result.failures) > 10:
+                    message += f"\n... and {len(result.failures) - 10} more"
+            messagebox.showinfo("Photo Import", message)
+            
+            if self.current_student_id in result.photos:
+                self.display_student_details(self.current_student_id)
+            
+        except Exception as e:
+            self.status_var.set("Photo import failed")
+            messagebox.showerror("Error", f"Error importing photos: {str(e)}")
+    
     def clear_photo(self):
         """Clear the selected photo."""
         self.photo_label.config(image="", text="No photo selected")
@@ -516,23 +832,17 @@ class StudentManagementGUI:
     
     def refresh_students_list(self):
         """Refresh the students list in the view tab."""
+        if self.tab_pending(self.view_students_frame):
+            return
+        
         # Clear existing items
         for item in self.students_tree.get_children():
             self.students_tree.delete(item)
         
-        # Add students to the list
-        for student_id, student in self.students.items():
-            details = student.get_details()
-            contact = details["contact"] or {"phone": "", "email": ""}
-            
-            self.students_tree.insert("", tk.END, values=(
-                details["id"],
-                details["name"],
-                details["age"],
-                details["grade"],
-                contact["phone"],
-                contact["email"]
-            ))
+        # Add students to the list in the current sort order
+        students = self.students
+        for student_id in self.ordered_student_ids():
+            self.students_tree.insert("", tk.END, iid=str(student_id), values=students[student_id].as_row())
     
     def on_student_select(self, event):
         """Handle student selection in the treeview."""
@@ -558,16 +868,14 @@ class StudentManagementGUI:
             widget.destroy()
         
         # Get student details
-        student = self.students[student_id]
+        student = self.system.get_student(student_id)
         details = student.get_details()
         contact = details["contact"] or {"phone": "", "email": ""}
         
         # Display photo if available
         if student_id in self.student_photos:
             try:
-                img = Image.open(self.student_photos[student_id])
-                img = img.resize((150, 150), Image.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
+                photo = load_photo(self.student_photos[student_id], (150, 150))
                 
                 self.detail_photo_label.config(image=photo, text="")
                 self.detail_photo_label.image = photo  # Keep a reference
@@ -601,10 +909,13 @@ class StudentManagementGUI:
         edit_window.grab_set()
         
         # Get student details
-        student = self.students[self.current_student_id]
+        student = self.system.get_student(self.current_student_id)
         details = student.get_details()
         contact = details["contact"] or {"phone": "", "email": ""}
         
+        # Version the edits are based on; saving fails if someone else saves first
+        version_var = tk.IntVar(value=student.version)
+        
         # Create form
         frame = ttk.Frame(edit_window, padding=20)
         frame.pack(fill=tk.BOTH, expand=True)
@@ -642,9 +953,7 @@ class StudentManagementGUI:
         
         if self.current_student_id in self.student_photos:
             try:
-                img = Image.open(self.student_photos[self.current_student_id])
-                img = img.resize((100, 100), Image.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
+                photo = load_photo(self.student_photos[self.current_student_id], (100, 100))
                 
                 photo_label.config(image=photo, text="")
                 photo_label.image = photo  # Keep a reference
@@ -664,9 +973,7 @@ class StudentManagementGUI:
             if file_path:
                 try:
                     # Open and resize image
-                    img = Image.open(file_path)
-                    img = img.resize((100, 100), Image.LANCZOS)
-                    photo = ImageTk.PhotoImage(img)
+                    photo = load_photo(file_path, (100, 100))
                     
                     # Update photo label
                     photo_label.config(image=photo, text="")
@@ -683,55 +990,34 @@ class StudentManagementGUI:
         # Save button
         def save_changes():
             try:
-                # Validate inputs
+                # Validate and update student
                 name = name_var.get().strip()
-                age_str = age_var.get().strip()
-                grade = grade_var.get().strip()
-                phone = phone_var.get().strip()
-                email = email_var.get().strip()
-                
-                # Validate name
-                if not name:
-                    raise ValueError("Name cannot be empty")
-                if any(char.isdigit() for char in name):
-                    raise ValueError("Name must not contain numbers")
-                
-                # Validate age
-                try:
-                    age = int(age_str)
-                    if age <= 0:
-                        raise ValueError("Age must be a positive integer")
-                except ValueError:
-                    raise ValueError("Age must be a valid integer")
-                
-                # Validate grade
-                if not grade:
-                    raise ValueError("Grade cannot be empty")
-                
-                # Validate phone
-                if len(phone) != 11 or not phone.isdigit():
-                    raise ValueError("Phone number must be an 11-digit number")
-                
-                # Validate email
-                if not re.match(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", email):
-                    raise ValueError("Invalid email address format")
-                
-                # Create contact and update details
-                contact = Contact(phone, email)
-                details = {
+                _, errors = self.system.update_many({self.current_student_id: {
                     'name': name,
-                    'age': age,
-                    'grade': grade,
-                    'contact': contact
-                }
+                    'age': age_var.get().strip(),
+                    'grade': grade_var.get().strip(),
+                    'phone': phone_var.get().strip(),
+                    'email': email_var.get().strip()
+                }}, {self.current_student_id: version_var.get()})
                 
-                # Update student
-                self.students[self.current_student_id].update_details(details)
+                current = self.students.get(self.current_student_id)
+                if errors and current is not None and current.version != version_var.get():
+                    # Someone else saved this student while the dialog was open
+                    if messagebox.askyesno("Conflict", f"{errors[self.current_student_id][0]}.\n\n"
+                                           "Load their changes? Your unsaved edits will be lost.", parent=edit_window):
+                        _, name, age, grade, phone, email = current.as_row()
+                        for var, value in ((name_var, name), (age_var, str(age)), (grade_var, grade),
+                                           (phone_var, phone), (email_var, email)):
+                            var.set(value)
+                        version_var.set(current.version)
+                    return
+                if errors:
+                    raise ValueError("\n".join(errors[self.current_student_id]))
                 
                 # Update photo if changed
                 photo_path = photo_path_var.get()
                 if photo_path:
-                    self.student_photos[self.current_student_id] = photo_path
+                    self.system.set_photos({self.current_student_id: photo_path})
                 
                 # Log activity
                 self.log_activity(f"Updated student: {name} with ID: {self.current_student_id}")
@@ -770,12 +1056,8 @@ class StudentManagementGUI:
         )
         
         if confirm:
-            # Delete student
-            del self.students[self.current_student_id]
-            
-            # Delete photo if exists
-            if self.current_student_id in self.student_photos:
-                del self.student_photos[self.current_student_id]
+            # Delete student (and their photo)
+            self.system.delete_many([self.current_student_id])
             
             # Log activity
             self.log_activity(f"Deleted student: {student_name} with ID: {self.current_student_id}")
@@ -808,29 +1090,12 @@ class StudentManagementGUI:
         for item in self.students_tree.get_children():
             self.students_tree.delete(item)
         
-        # Search and add matching students
-        for student_id, student in self.students.items():
-            details = student.get_details()
-            contact = details["contact"] or {"phone": "", "email": ""}
-            
-            match = False
-            
-            if search_by == "name" and search_text.lower() in details["name"].lower():
-                match = True
-            elif search_by == "id" and search_text == str(details["id"]):
-                match = True
-            elif search_by == "grade" and search_text.lower() in details["grade"].lower():
-                match = True
-            
-            if match:
-                self.students_tree.insert("", tk.END, values=(
-                    details["id"],
-                    details["name"],
-                    details["age"],
-                    details["grade"],
-                    contact["phone"],
-                    contact["email"]
-                ))
+        # Search and add matching students in the current sort order
+        matches = {student.id for student in self.system.search(search_text, search_by)}
+        students = self.students
+        for student_id in self.ordered_student_ids():
+            if student_id in matches:
+                self.students_tree.insert("", tk.END, iid=str(student_id), values=students[student_id].as_row())
         
         self.status_var.set(f"Search results for: {search_text}")
     
@@ -856,6 +1121,7 @@ class StudentManagementGUI:
         values = list(self.attendance_tree.item(item, "values"))
         values[3] = new_status
         self.attendance_tree.item(item, values=values)
+        self.attendance_status[int(values[0])] = new_status
     
     def mark_all_present(self):
         """Mark all students as present."""
@@ -863,6 +1129,7 @@ class StudentManagementGUI:
             values = list(self.attendance_tree.item(item, "values"))
             values[3] = "Present"
             self.attendance_tree.item(item, values=values)
+        self.attendance_status = dict.fromkeys(self.attendance_status, "Present")
     
     def mark_all_absent(self):
         """Mark all students as absent."""
@@ -870,9 +1137,13 @@ class StudentManagementGUI:
             values = list(self.attendance_tree.item(item, "values"))
             values[3] = "Absent"
             self.attendance_tree.item(item, values=values)
+        self.attendance_status = dict.fromkeys(self.attendance_status, "Absent")
     
     def load_attendance(self):
         """Load attendance for the selected date."""
+        if self.tab_pending(self.attendance_frame):
+            return
+        
         date = self.date_var.get()
         
         # Clear existing items
@@ -881,20 +1152,17 @@ class StudentManagementGUI:
         
         # Load attendance records for the date
         attendance = self.attendance_records.get(date, {})
+        self.attendance_status = {student_id: attendance.get(student_id, "Absent") for student_id in self.students}
         
-        # Add students to the list
-        for student_id, student in self.students.items():
-            details = student.get_details()
+        # Add students to the list in the current sort order
+        students = self.students
+        for student_id in self.ordered_attendance_ids():
+            student_id, name, _, grade, _, _ = students[student_id].as_row()
             
             # Get attendance status
-            status = attendance.get(student_id, "Absent")
+            status = self.attendance_status[student_id]
             
-            self.attendance_tree.insert("", tk.END, values=(
-                details["id"],
-                details["name"],
-                details["grade"],
-                status
-            ))
+            self.attendance_tree.insert("", tk.END, iid=str(student_id), values=(student_id, name, grade, status))
         
         self.status_var.set(f"Loaded attendance for {date}")
     
@@ -902,22 +1170,15 @@ class StudentManagementGUI:
         """Save attendance for the selected date."""
         date = self.date_var.get()
         
-        # Create attendance record for the date
-        attendance = {}
-        
-        # Get attendance status for each student
-        for item in self.attendance_tree.get_children():
-            values = self.attendance_tree.item(item, "values")
-            student_id = int(values[0])
-            status = values[3]
-            
-            attendance[student_id] = status
+        # Create attendance record for the date from the statuses shown
+        attendance = dict(self.attendance_status)
         
         # Save attendance record
-        self.attendance_records[date] = attendance
+        self.system.mark_attendance(date, attendance)
         
         # Log activity
         self.log_activity(f"Saved attendance for {date}")
+        self.update_dashboard()
         
         # Show success message
         messagebox.showinfo("Success", f"Attendance for {date} saved successfully")
@@ -934,6 +1195,10 @@ class StudentManagementGUI:
             self.generate_grade_distribution_report()
         elif report_type == "ages":
             self.generate_age_distribution_report()
+        elif report_type == "duplicates":
+            self.generate_duplicates_report()
+        elif report_type == "at_risk":
+            self.generate_at_risk_report()
     
     def generate_student_list_report(self):
         """Generate a student list report."""
@@ -943,14 +1208,16 @@ class StudentManagementGUI:
         report += f"{'ID':<5} {'Name':<20} {'Age':<5} {'Grade':<10} {'Phone':<15} {'Email':<30}\n"
         report += "-" * 85 + "\n"
         
-        for student_id, student in self.students.items():
-            details = student.get_details()
-            contact = details["contact"] or {"phone": "", "email": ""}
-            
-            report += f"{details['id']:<5} {details['name']:<20} {details['age']:<5} {details['grade']:<10} {contact['phone']:<15} {contact['email']:<30}\n"
+        # Covers every grade, including shards that are not loaded
+        rows = self.system.run_reports([reports.STUDENT_LIST])["students"]
+        report += "".join(
+            f"{row['id']:<5} {row['first:name']:<20} {row['first:age']:<5} {row['first:grade']:<10} "
+            f"{row['first:phone']:<15} {row['first:email']:<30}\n"
+            for row in rows
+        )
         
         report += "\n" + "=" * 50 + "\n"
-        report += f"Total Students: {len(self.students)}\n"
+        report += f"Total Students: {len(rows)}\n"
         report += f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
         
         self.report_text.insert(tk.END, report)
@@ -960,32 +1227,23 @@ class StudentManagementGUI:
         report = "Attendance Summary Report\n"
         report += "=" * 50 + "\n\n"
         
-        if not self.attendance_records:
+        # The per-date listing and the per-student statistics come from one scan
+        results = self.system.run_reports([reports.ATTENDANCE_BY_DATE, reports.ATTENDANCE_BY_STUDENT])
+        
+        if not results["attendance_by_date"]:
             report += "No attendance records found.\n"
         else:
-            # Calculate attendance statistics
-            student_attendance = {}
-            
-            for date, attendance in self.attendance_records.items():
-                report += f"Date: {date}\n"
-                report += f"{'ID':<5} {'Name':<20} {'Status':<10}\n"
-                report += "-" * 35 + "\n"
-                
-                for student_id, status in attendance.items():
-                    if student_id in self.students:
-                        student_name = self.students[student_id].name
-                        report += f"{student_id:<5} {student_name:<20} {status:<10}\n"
-                        
-                        # Update student attendance stats
-                        if student_id not in student_attendance:
-                            student_attendance[student_id] = {"present": 0, "absent": 0}
-                        
-                        if status == "Present":
-                            student_attendance[student_id]["present"] += 1
-                        else:
-                            student_attendance[student_id]["absent"] += 1
-                
-                report += "\n"
+            date = None
+            for row in results["attendance_by_date"]:
+                if row["date"] != date:
+                    if date is not None:
+                        report += "\n"
+                    date = row["date"]
+                    report += f"Date: {date}\n"
+                    report += f"{'ID':<5} {'Name':<20} {'Status':<10}\n"
+                    report += "-" * 35 + "\n"
+                report += f"{row['id']:<5} {row['first:name']:<20} {row['first:status']:<10}\n"
+            report += "\n"
             
             # Overall statistics
             report += "Overall Attendance Statistics\n"
@@ -993,13 +1251,16 @@ class StudentManagementGUI:
             report += f"{'ID':<5} {'Name':<20} {'Present':<10} {'Absent':<10} {'Attendance %':<15}\n"
             report += "-" * 60 + "\n"
             
-            for student_id, stats in student_attendance.items():
-                if student_id in self.students:
-                    student_name = self.students[student_id].name
-                    total_days = stats["present"] + stats["absent"]
-                    attendance_percent = (stats["present"] / total_days * 100) if total_days > 0 else 0
-                    
-                    report += f"{student_id:<5} {student_name:<20} {stats['present']:<10} {stats['absent']:<10} {attendance_percent:.2f}%\n"
+            for row in results["attendance_by_student"]:
+                report += (f"{row['id']:<5} {row['first:name']:<20} {row['present']:<10} {row['absent']:<10} "
+                           f"{row['attendance_rate']:.2f}%\n")
+            
+            rates = self.system.percentile_sketches()["attendance_rate"]
+            if rates.count:
+                report += f"\nAttendance % by student (within {rates.max_error:g} points): "
+                report += ", ".join(f"{label} {rates.percentile(q):.1f}%"
+                                    for label, q in (("10th percentile", 10), ("median", 50), ("90th percentile", 90)))
+                report += "\n"
         
         report += "\n" + "=" * 50 + "\n"
         report += f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
@@ -1011,17 +1272,7 @@ class StudentManagementGUI:
         report = "Grade Distribution Report\n"
         report += "=" * 50 + "\n\n"
         
-        # Count students by grade
-        grade_counts = {}
-        
-        for student in self.students.values():
-            grade = student.grade
-            if grade not in grade_counts:
-                grade_counts[grade] = 0
-            grade_counts[grade] += 1
-        
-        # Sort grades
-        sorted_grades = sorted(grade_counts.keys())
+        rows = self.system.run_reports([reports.GRADE_DISTRIBUTION])["grades"]
         
         # Display distribution
         report += "Grade Distribution:\n"
@@ -1029,13 +1280,11 @@ class StudentManagementGUI:
         report += f"{'Grade':<15} {'Count':<10} {'Percentage':<15}\n"
         report += "-" * 40 + "\n"
         
-        for grade in sorted_grades:
-            count = grade_counts[grade]
-            percentage = (count / len(self.students) * 100) if self.students else 0
-            report += f"{grade:<15} {count:<10} {percentage:.2f}%\n"
+        for row in rows:
+            report += f"{row['grade']:<15} {row['count']:<10} {row['percentage']:.2f}%\n"
         
         report += "\n" + "=" * 50 + "\n"
-        report += f"Total Students: {len(self.students)}\n"
+        report += f"Total Students: {sum(row['count'] for row in rows)}\n"
         report += f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
         
         self.report_text.insert(tk.END, report)
@@ -1045,17 +1294,9 @@ class StudentManagementGUI:
         report = "Age Distribution Report\n"
         report += "=" * 50 + "\n\n"
         
-        # Count students by age
-        age_counts = {}
-        
-        for student in self.students.values():
-            age = student.age
-            if age not in age_counts:
-                age_counts[age] = 0
-            age_counts[age] += 1
-        
-        # Sort ages
-        sorted_ages = sorted(age_counts.keys())
+        # The distribution and the statistics come from one scan
+        results = self.system.run_reports([reports.AGE_DISTRIBUTION, reports.AGE_STATISTICS])
+        statistics = results["age_statistics"][0]
         
         # Display distribution
         report += "Age Distribution:\n"
@@ -1063,26 +1304,89 @@ class StudentManagementGUI:
         report += f"{'Age':<10} {'Count':<10} {'Percentage':<15}\n"
         report += "-" * 35 + "\n"
         
-        for age in sorted_ages:
-            count = age_counts[age]
-            percentage = (count / len(self.students) * 100) if self.students else 0
-            report += f"{age:<10} {count:<10} {percentage:.2f}%\n"
+        for row in results["ages"]:
+            report += f"{row['age']:<10} {row['count']:<10} {row['percentage']:.2f}%\n"
         
         # Calculate statistics
-        if self.students:
-            ages = [student.age for student in self.students.values()]
-            min_age = min(ages)
-            max_age = max(ages)
-            avg_age = sum(ages) / len(ages)
-            
+        if statistics["count"]:
             report += "\nAge Statistics:\n"
             report += "-" * 30 + "\n"
-            report += f"Minimum Age: {min_age}\n"
-            report += f"Maximum Age: {max_age}\n"
-            report += f"Average Age: {avg_age:.2f}\n"
+            report += f"Minimum Age: {statistics['min:age']}\n"
+            report += f"Maximum Age: {statistics['max:age']}\n"
+            report += f"Average Age: {statistics['mean:age']:.2f}\n"
+            ages = self.system.percentile_sketches()["age"]
+            report += f"Median Age: {ages.percentile(50)}\n"
+            report += f"90th Percentile Age: {ages.percentile(90)}\n"
         
         report += "\n" + "=" * 50 + "\n"
-        report += f"Total Students: {len(self.students)}\n"
+        report += f"Total Students: {statistics['count']}\n"
+        report += f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        
+        self.report_text.insert(tk.END, report)
+    
+    def generate_at_risk_report(self):
+        """Generate a report of the students with the lowest attendance rates."""
+        try:
+            count = self.at_risk_count.get()
+            if count <= 0:
+                raise ValueError
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "Number of students must be a positive integer")
+            return
+        first = self.at_risk_from.get().strip() or None
+        last = self.at_risk_to.get().strip() or None
+        for date in (first, last):
+            if date:
+                try:
+                    datetime.strptime(date, "%Y-%m-%d")
+                except ValueError:
+                    messagebox.showerror("Error", f"Invalid date: {date} (use YYYY-MM-DD)")
+                    return
+        per_grade = self.at_risk_per_grade.get()
+        
+        report = "At-Risk Students Report\n"
+        report += "=" * 50 + "\n\n"
+        report += f"Lowest {count} attendance rates" + (" per grade" if per_grade else "")
+        report += f", {first or 'first record'} to {last or 'last record'}\n\n"
+        
+        students = self.system.at_risk_students(count, per_grade=per_grade, first=first, last=last)
+        if not students:
+            report += "No attendance records found.\n"
+        else:
+            report += f"{'ID':<5} {'Name':<20} {'Grade':<10} {'Present':<10} {'Absent':<10} {'Attendance %':<15}\n"
+            report += "-" * 70 + "\n"
+            grade = None
+            for student in students:
+                if per_grade and student["grade"] != grade:
+                    if grade is not None:
+                        report += "\n"
+                    grade = student["grade"]
+                report += (f"{student['id']:<5} {student['name']:<20} {student['grade']:<10} {student['present']:<10} "
+                           f"{student['absent']:<10} {student['rate']:.2f}%\n")
+        
+        report += "\n" + "=" * 50 + "\n"
+        report += f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        
+        self.report_text.insert(tk.END, report)
+    
+    def generate_duplicates_report(self):
+        """Generate a report of phone numbers and emails shared by several students."""
+        report = "Duplicate Contacts Report\n"
+        report += "=" * 50 + "\n\n"
+        
+        duplicates = self.system.find_duplicates()
+        if not duplicates:
+            report += "No shared phone numbers or email addresses found.\n"
+        else:
+            report += f"{'Field':<10} {'Value':<30} {'Student IDs':<30}\n"
+            report += "-" * 70 + "\n"
+            report += "".join(
+                f"{duplicate['field']:<10} {duplicate['value']:<30} {', '.join(map(str, duplicate['ids'])):<30}\n"
+                for duplicate in duplicates
+            )
+        
+        report += "\n" + "=" * 50 + "\n"
+        report += f"Shared Values: {len(duplicates)}\n"
         report += f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
         
         self.report_text.insert(tk.END, report)
@@ -1146,25 +1450,7 @@ class StudentManagementGUI:
         
         if file_path:
             try:
-                with open(file_path, 'w', newline='') as csvfile:
-                    writer = csv.writer(csvfile)
-                    
-                    # Write header
-                    writer.writerow(["ID", "Name", "Age", "Grade", "Phone", "Email"])
-                    
-                    # Write student data
-                    for student_id, student in self.students.items():
-                        details = student.get_details()
-                        contact = details["contact"] or {"phone": "", "email": ""}
-                        
-                        writer.writerow([
-                            details["id"],
-                            details["name"],
-                            details["age"],
-                            details["grade"],
-                            contact["phone"],
-                            contact["email"]
-                        ])
+                self.system.export_csv(file_path)
                 
                 self.log_activity(f"Exported student data to {file_path}")
                 messagebox.showinfo("Success", f"Student data exported to {file_path}")
@@ -1181,46 +1467,35 @@ class StudentManagementGUI:
         
         if file_path:
             try:
-                with open(file_path, 'r', newline='') as csvfile:
-                    reader = csv.reader(csvfile)
-                    
-                    # Skip header
-                    next(reader)
-                    
-                    # Read student data
-                    for row in reader:
-                        if len(row) >= 6:
-                            student_id = int(row[0])
-                            name = row[1]
-                            age = int(row[2])
-                            grade = row[3]
-                            phone = row[4]
-                            email = row[5]
-                            
-                            # Create contact and student objects
-                            contact = Contact(phone, email)
-                            student = Student(student_id, name, age, grade, contact)
-                            
-                            # Add student to the system
-                            self.students[student_id] = student
-                            
-                            # Update next_id if needed
-                            if student_id >= self.next_id:
-                                self.next_id = student_id + 1
+                # Add new rows and update changed ones; unchanged rows are skipped
+                counts, errors = self.system.import_csv(file_path)
+                summary = f"{counts['added']} added, {counts['updated']} updated, {counts['unchanged']} unchanged"
                 
-                self.log_activity(f"Imported student data from {file_path}")
+                self.log_activity(f"Imported {file_path}: {summary} ({len(errors)} invalid rows skipped)")
                 self.update_dashboard()
                 self.refresh_students_list()
-                messagebox.showinfo("Success", f"Student data imported from {file_path}")
+                
+                message = f"Imported {file_path}: {summary}"
+                if errors:
+                    # Data rows start on line 2, after the header
+                    message += "\n\nSkipped invalid rows:\n" + "\n".join(
+                        f"Row {index + 2}: {'; '.join(messages)}" for index, messages in list(errors.items())[:10]
+                    )
+                messagebox.showinfo("Success", message)
                 
             except Exception as e:
                 messagebox.showerror("Error", f"Error importing data: {str(e)}")
     
     def load_data(self):
-        """Load data from files if they exist."""
-        # This would typically load from a database or files
-        # For this example, we'll just add some sample data
-        self.add_sample_data()
+        """Load the roster from the data directory, or add sample data without one."""
+        if self.data_dir:
+            try:
+                self.system.load(self.data_dir, self.grades)
+                self.log_activity(f"Loaded {len(self.students)} students from {self.data_dir}")
+            except (ValueError, OSError) as e:
+                messagebox.showerror("Error", f"Error loading {self.data_dir}: {e}")
+        else:
+            self.add_sample_data()
         
         # Update dashboard and lists
         self.update_dashboard()
@@ -1232,28 +1507,19 @@ class StudentManagementGUI:
         # Only add if no students exist
         if not self.students:
             # Sample students
-            contact1 = Contact("12345678901", "john.doe@example.com")
-            student1 = Student(1, "John Doe", 18, "Grade 12", contact1)
-            self.students[1] = student1
-            
-            contact2 = Contact("23456789012", "jane.smith@example.com")
-            student2 = Student(2, "Jane Smith", 17, "Grade 11", contact2)
-            self.students[2] = student2
-            
-            contact3 = Contact("34567890123", "bob.johnson@example.com")
-            student3 = Student(3, "Bob Johnson", 16, "Grade 10", contact3)
-            self.students[3] = student3
-            
-            # Set next ID
-            self.next_id = 4
+            self.system.add_many([
+                {"name": "John Doe", "age": 18, "grade": "Grade 12", "phone": "12345678901", "email": "john.doe@example.com"},
+                {"name": "Jane Smith", "age": 17, "grade": "Grade 11", "phone": "23456789012", "email": "jane.smith@example.com"},
+                {"name": "Bob Johnson", "age": 16, "grade": "Grade 10", "phone": "34567890123", "email": "bob.johnson@example.com"}
+            ])
             
             # Sample attendance
             today = datetime.now().strftime("%Y-%m-%d")
-            self.attendance_records[today] = {
+            self.system.mark_attendance(today, {
                 1: "Present",
                 2: "Present",
                 3: "Absent"
-            }
+            })
             
             # Log activity
             self.log_activity("Loaded sample data")
@@ -1261,8 +1527,17 @@ class StudentManagementGUI:
 
 def main():
     """Main function to run the GUI."""
+    parser = argparse.ArgumentParser(description="Student Management System GUI.")
+    parser.add_argument("--share", metavar="NAME",
+                        help="publish the roster to shared memory under NAME for other local processes")
+    parser.add_argument("--data-dir", help="directory the roster is loaded from and saved to on exit")
+    parser.add_argument("--grade", action="append", dest="grades", metavar="GRADE",
+                        help="with a sharded --data-dir, load only this grade up front (repeatable)")
+    args = parser.parse_args()
+    
+    configure_logging()
     root = tk.Tk()
-    app = StudentManagementGUI(root)
+    app = StudentManagementGUI(root, args.share, args.data_dir, args.grades)
     root.mainloop()
 
 
@@ -0,0 +1,158 @@
+import bisect
+import re
+
+from grades import GRADES
+
+NON_DIGIT_PATTERN = re.compile(r"\D")
+
+# Sort key of each student field (text fields sort case-insensitively)
+FIELD_KEYS = {
+    "id": lambda student: student.id,
+    "name": lambda student: student.name.lower(),
+    "age": lambda student: student.age,
+    "grade": lambda student: GRADES.sort_key(student.grade_code),
+    "phone": lambda student: student.as_row()[4],
+    "email": lambda student: student.as_row()[5].lower()
+}
+
+# Fields that should be unique across students, with their position in
+# Student.as_row() and the normalisation applied before comparing
+UNIQUE_FIELDS = {
+    "phone": (4, lambda value: NON_DIGIT_PATTERN.sub("", value or "")),
+    "email": (5, lambda value: (value or "").strip().lower())
+}
+
+
+class SortIndex:
+    """
+    Sorted permutation of student IDs for one or more fields.
+
+    Entries are (key, id) pairs kept in sorted order, so ties are broken by
+    ID and reading the order back never sorts. Additions and removals are
+    a binary search plus a list insert or delete.
+    """
+
+    def __init__(self, fields, students):
+        """
+        Build the index.
+
+        Args:
+            fields (tuple): Field names from FIELD_KEYS, most significant first
+            students (iterable): Students to index
+        """
+        unknown = [field for field in fields if field not in FIELD_KEYS]
+        if unknown:
+            raise ValueError(f"Unknown sort field: {', '.join(unknown)}")
+        self.fields = tuple(fields)
+        self._keys = [FIELD_KEYS[field] for field in self.fields]
+        self.entries = sorted(self.entry(student) for student in students)
+
+    def key(self, student):
+        """Return the sort key of a student."""
+        return tuple(key(student) for key in self._keys)
+
+    def entry(self, student):
+        """Return the (key, id) entry of a student."""
+        return self.key(student), student.id
+
+    def add(self, student):
+        """Index a student."""
+        bisect.insort(self.entries, self.entry(student))
+
+    def remove(self, student):
+        """Remove a student; call before the student's fields change."""
+        entry = self.entry(student)
+        position = bisect.bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def add_many(self, students):
+        """Index many students, rebuilding once for large batches."""
+        if len(students) > len(self.entries) // 8:
+            self.entries = sorted(self.entries + [self.entry(student) for student in students])
+        else:
+            for student in students:
+                self.add(student)
+
+    def remove_many(self, students):
+        """Remove many students, filtering once for large batches."""
+        if len(students) > len(self.entries) // 8:
+            removed = {student.id for student in students}
+            self.entries = [entry for entry in self.entries if entry[1] not in removed]
+        else:
+            for student in students:
+                self.remove(student)
+
+    def ids(self, descending=False):
+        """Yield student IDs in index order."""
+        entries = reversed(self.entries) if descending else self.entries
+        for _, student_id in entries:
+            yield student_id
+
+
+class UniqueIndex:
+    """
+    Hash index from a normalised field value to the students using it.
+
+    Lookups, additions and removals are O(1). A value maps to a set of IDs
+    rather than a single ID, so duplicates that already exist in loaded
+    data are kept track of (and reported) instead of silently overwritten.
+    Empty values are not indexed.
+    """
+
+    def __init__(self, field, students=()):
+        """
+        Build the index.
+
+        Args:
+            field (str): Field name from UNIQUE_FIELDS
+            students (iterable): Students to index
+        """
+        if field not in UNIQUE_FIELDS:
+            raise ValueError(f"Unknown unique field: {field}")
+        self.field = field
+        self._position, self.normalize = UNIQUE_FIELDS[field]
+        self.owners = {}
+        for student in students:
+            self.add(student)
+
+    def value(self, student):
+        """Return the normalised value of a student."""
+        return self.normalize(student.as_row()[self._position])
+
+    def add(self, student):
+        """Index a student."""
+        value = self.value(student)
+        if value:
+            self.owners.setdefault(value, set()).add(student.id)
+
+    def remove(self, student):
+        """Remove a student; call before the student's fields change."""
+        value = self.value(student)
+        owners = self.owners.get(value)
+        if owners is not None:
+            owners.discard(student.id)
+            if not owners:
+                del self.owners[value]
+
+    def conflicts(self, value, student_id=None):
+        """
+        Return the IDs of other students using a value.
+
+        Args:
+            value (str): Raw (not yet normalised) field value
+            student_id (int, optional): ID of the student the value is for
+
+        Returns:
+            list: Sorted IDs of the other students with the same value
+        """
+        value = self.normalize(value)
+        if not value:
+            return []
+        return sorted(owner for owner in self.owners.get(value, ()) if owner != student_id)
+
+    def duplicates(self):
+        """Yield (value, sorted IDs) for every value used by several students."""
+        for value, owners in self.owners.items():
+            if len(owners) > 1:
+                yield value, sorted(owners)
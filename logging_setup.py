@@ -0,0 +1,201 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+from contextlib import contextmanager
+
+LOG_FILE = 'student_management.log'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Rotate the log file once it reaches this size, keeping a few old files
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+
+# Name of the logger used for one-entry-per-student messages
+RECORD_LOGGER_NAME = "student.records"
+
+# Logging modes for per-record messages
+LOG_MODES = ("all", "sample", "aggregate")
+
+_listener = None
+
+
+class BatchFlushRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler that flushes to disk once per batch of records."""
+
+    def flush(self):
+        """Skip the flush StreamHandler.emit() does after every record."""
+
+    def flush_batch(self):
+        """Flush all records written since the last batch."""
+        super().flush()
+
+    def close(self):
+        """Flush pending records and close the file."""
+        self.flush_batch()
+        super().close()
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """Queue listener that drains all queued records before flushing once."""
+
+    def _monitor(self):
+        """Handle records from the queue until the sentinel arrives."""
+        q = self.queue
+        has_task_done = hasattr(q, 'task_done')
+        stopping = False
+        while not stopping:
+            record = self.dequeue(True)
+            batch = [record]
+
+            # Take everything else that is already waiting
+            try:
+                while batch[-1] is not self._sentinel:
+                    batch.append(self.dequeue(False))
+            except queue.Empty:
+                pass
+
+            for record in batch:
+                if record is self._sentinel:
+                    stopping = True
+                else:
+                    self.handle(record)
+                if has_task_done:
+                    q.task_done()
+
+            for handler in self.handlers:
+                if isinstance(handler, BatchFlushRotatingFileHandler):
+                    handler.flush_batch()
+                else:
+                    handler.flush()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves formatting to the listener thread.
+
+    QueueHandler.prepare() formats every record on the logging thread so
+    it can be pickled; this queue is in-process, so records are queued as
+    they are. Arguments of %-style messages are formatted on the listener
+    thread, so callers should not change them after logging.
+    """
+
+    def prepare(self, record):
+        """Return the record unchanged."""
+        return record
+
+
+class RecordLogFilter(logging.Filter):
+    """
+    Thins out per-record log messages during bulk operations.
+
+    In 'all' mode every message passes. In 'sample' mode only every Nth
+    message passes. In 'aggregate' mode none pass and only a count is kept.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self):
+        """Initialize the filter in 'all' mode."""
+        super().__init__()
+        self.mode = "all"
+        self.sample_every = 1
+        self.seen = 0
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        """Return True if the record should be logged."""
+        if self.mode == "all" or record.levelno >= logging.WARNING:
+            return True
+
+        with self._lock:
+            self.seen += 1
+            # Sampling keeps the 1st, (N+1)th, (2N+1)th... message
+            if self.mode == "sample" and (self.seen - 1) % self.sample_every == 0:
+                return True
+            self.suppressed += 1
+            return False
+
+
+_record_filter = RecordLogFilter()
+logging.getLogger(RECORD_LOGGER_NAME).addFilter(_record_filter)
+
+
+def configure_logging(filename=LOG_FILE, level=logging.INFO, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    """
+    Route all logging through a queue to a background file writer.
+
+    Callers only pay for putting a record on a queue; a listener thread
+    formats the records, writes them in batches and rotates the file by
+    size. Entry points call this once at startup.
+
+    Args:
+        filename (str): Log file path
+        level (int): Minimum level to log
+        max_bytes (int): Size at which the log file is rotated
+        backup_count (int): Number of rotated files to keep
+
+    Returns:
+        BatchQueueListener: The running listener
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    file_handler = BatchFlushRotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(DeferredQueueHandler(log_queue))
+
+    _listener = BatchQueueListener(log_queue, file_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Write out all queued records and stop the background writer."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+@contextmanager
+def bulk_logging(mode="aggregate", sample_every=100):
+    """
+    Thin out per-record log messages for the duration of a bulk operation.
+
+    A single summary entry is written at the end with the number of
+    messages that were left out.
+
+    Args:
+        mode (str): One of LOG_MODES
+        sample_every (int): In 'sample' mode, log one message in this many
+
+    Raises:
+        ValueError: If mode is unknown
+    """
+    if mode not in LOG_MODES:
+        raise ValueError(f"Unknown log mode: {mode}")
+
+    previous = (_record_filter.mode, _record_filter.sample_every, _record_filter.seen, _record_filter.suppressed)
+    _record_filter.mode = mode
+    _record_filter.sample_every = max(1, sample_every)
+    _record_filter.seen = 0
+    _record_filter.suppressed = 0
+    try:
+        yield
+    finally:
+        suppressed = _record_filter.suppressed
+        (_record_filter.mode, _record_filter.sample_every,
+         _record_filter.seen, _record_filter.suppressed) = previous
+        if suppressed:
+            logging.info(f"Bulk operation: {suppressed} per-record log entries {'sampled out' if mode == 'sample' else 'aggregated'}")
@@ -1,15 +1,77 @@
-from student import Student, Contact
+from student import Student, Contact, PackedStudent, VersionConflictError, validate_records, row_hash, next_version
+from logging_setup import configure_logging, bulk_logging, LOG_MODES
+from roster_stats import RosterStats
+from indexes import SortIndex, UniqueIndex, FIELD_KEYS, UNIQUE_FIELDS
+from sync import ChangeLog, write_changeset, read_changeset
+from concurrency import ReadWriteLock, Snapshot, reads, writes
+from sharding import ShardSet, loads_all_shards
+from backup import BackupSet, parse_time
+from reports import ReportEngine, ReportSpec, parse_condition, in_date_range, select_lowest
+from grades import GRADES, grade_key
+import argparse
+import bisect
+import copy
+import csv
+import itertools
+import json
 import logging
-import re
+import os
+import shlex
+import sys
+
+# Exit statuses of the non-interactive commands
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_NOT_FOUND = 3
+
+# Files in a data directory
+STUDENTS_FILE = "students.csv"
+ATTENDANCE_FILE = "attendance.csv"
+PHOTOS_FILE = "photos.csv"
+
+# Rows per page when listing students
+DEFAULT_PAGE_SIZE = 20
+
+# Fields of Student.as_row(), used by CSV files and command output
+STUDENT_FIELDS = ("id", "name", "age", "grade", "phone", "email")
+STUDENT_FIELDS_HEADER = ["ID", "Name", "Age", "Grade", "Phone", "Email"]
 
 class StudentManagementSystem:
-    """System for managing student information."""
+    """
+    System for managing student information.
+    
+    The batch methods are safe to call from several threads: changes take
+    the store's lock for writing and lookups take it for reading, so
+    readers never block each other. Students are copy-on-write, which lets
+    long-running reports work on a snapshot() without holding the lock.
+    """
     
     def __init__(self):
         """Initialize the student management system."""
+        self.lock = ReadWriteLock()
         self.students = {}
+        self.attendance_records = {}
+        # Photo file path of each student that has one
+        self.photos = {}
         self.next_id = 1
-        # Logging configuration moved to student.py
+        # Student IDs in ascending order, kept up to date by every mutation
+        self._sorted_ids = []
+        # Running aggregates, kept up to date by every mutation
+        self.stats = RosterStats()
+        # Sort indexes by field tuple, built on first use and then maintained
+        self._sort_indexes = {}
+        # Phone and email lookups for duplicate checks, kept up to date by every mutation
+        self.unique_indexes = {field: UniqueIndex(field) for field in UNIQUE_FIELDS}
+        # Content hash of each student's row, used to skip unchanged rows on import
+        self.row_hashes = {}
+        # Change sequence numbers for delta sync with other instances
+        self.changes = ChangeLog()
+        # Shared memory publisher and the change sequence it last published
+        self.publisher = None
+        self._published_sequence = None
+        # Grade shards of the data directory, when it is sharded
+        self.shards = None
     
     def get_validated_input(self, prompt, validator, error_message=None):
         """
@@ -31,41 +93,44 @@ class StudentManagementSystem:
             except ValueError as e:
                 print(error_message if error_message else f"Error: {e}")
     
+    def validate_field(self, column, value):
+        """
+        Validate a single field with the shared batch validator.
+        
+        Args:
+            column (str): Keyword of validate_records to check (e.g. 'names')
+            value: The input to validate
+            
+        Returns:
+            The validated input, converted to an integer for ages
+            
+        Raises:
+            ValueError: If the input is invalid
+        """
+        result = validate_records(**{column: [value]})
+        if not result.valid:
+            raise ValueError(result.messages(0)[0])
+        return result.ages[0] if column == "ages" else value
+    
     def validate_name(self, name):
         """Validate student name."""
-        if not isinstance(name, str) or not name.strip():
-            raise ValueError("Name must be a non-empty string")
-        if any(char.isdigit() for char in name):
-            raise ValueError("Name must not contain numbers")
-        return name
+        return self.validate_field("names", name)
     
     def validate_age(self, age_input):
         """Convert and validate age."""
-        try:
-            age = int(age_input)
-            if age <= 0:
-                raise ValueError("Age must be a positive integer")
-            return age
-        except ValueError:
-            raise ValueError("Age must be a valid integer")
+        return self.validate_field("ages", age_input)
     
     def validate_grade(self, grade):
         """Validate grade."""
-        if not isinstance(grade, str) or not grade.strip():
-            raise ValueError("Grade must be a non-empty string")
-        return grade
+        return self.validate_field("grades", grade)
     
     def validate_phone(self, phone):
         """Validate phone number."""
-        if len(phone) != 11 or not phone.isdigit():
-            raise ValueError("Phone number must be an 11-digit number")
-        return phone
+        return self.validate_field("phones", phone)
     
     def validate_email(self, email):
         """Validate email address."""
-        if not re.match(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", email):
-            raise ValueError("Invalid email address format")
-        return email
+        return self.validate_field("emails", email)
     
     def add_student(self):
         """Add a new student to the system."""
@@ -77,16 +142,12 @@ class StudentManagementSystem:
             phone = self.get_validated_input("Enter student phone number (11 digits): ", self.validate_phone)
             email = self.get_validated_input("Enter student email: ", self.validate_email)
             
-            # Create contact and student objects
-            contact = Contact(phone, email)
-            student = Student(self.next_id, name, age, grade, contact)
-            
             # Add student to the system
-            self.students[self.next_id] = student
-            self.next_id += 1
+            ids, errors = self.add_many([{"name": name, "age": age, "grade": grade, "phone": phone, "email": email}])
+            if errors:
+                raise ValueError("; ".join(errors[0]))
             
-            logging.info(f"Added new student: {name} with ID: {student.id}")
-            print(f"Student added successfully with ID: {student.id}")
+            print(f"Student added successfully with ID: {ids[0]}")
             
         except ValueError as e:
             logging.error(f"Error adding student: {e}")
@@ -100,7 +161,7 @@ class StudentManagementSystem:
             student_id (int): ID of the student to display
         """
         if student_id in self.students:
-            student = self.students[student_id]
+            student = self.get_student(student_id)
             details = student.get_details()
             
             print("\nStudent Information:")
@@ -133,16 +194,16 @@ class StudentManagementSystem:
                 phone = self.get_validated_input("Enter updated phone number (11 digits): ", self.validate_phone)
                 email = self.get_validated_input("Enter updated email: ", self.validate_email)
                 
-                # Create contact object and update details
-                contact = Contact(phone, email)
-                details = {
+                # Update details
+                _, errors = self.update_many({student_id: {
                     'name': name,
                     'age': age,
                     'grade': grade,
-                    'contact': contact
-                }
-                
-                self.students[student_id].update_details(details)
+                    'phone': phone,
+                    'email': email
+                }})
+                if errors:
+                    raise ValueError("; ".join(errors[student_id]))
                 print("Student details updated successfully.")
                 
             except (ValueError, TypeError) as e:
@@ -152,20 +213,29 @@ class StudentManagementSystem:
             logging.warning(f"Student not found with ID: {student_id}")
             print("Student not found.")
     
-    def list_all_students(self):
-        """Display a list of all students in the system."""
+    def list_all_students(self, page_size=DEFAULT_PAGE_SIZE, sort_by="id"):
+        """
+        Display all students in the system, one page at a time.
+        
+        Args:
+            page_size (int): Number of students per page
+            sort_by (str): A field name from FIELD_KEYS
+        """
         if not self.students:
             print("No students in the system.")
             return
         
-        print("\nAll Students:")
-        print("-" * 50)
-        print(f"{'ID':<5} {'Name':<20} {'Age':<5} {'Grade':<10}")
-        print("-" * 50)
+        header = "\nAll Students:\n" + "-" * 50 + "\n" + f"{'ID':<5} {'Name':<20} {'Age':<5} {'Grade':<10}\n" + "-" * 50 + "\n"
         
-        for student_id, student in self.students.items():
-            details = student.get_details()
-            print(f"{details['id']:<5} {details['name']:<20} {details['age']:<5} {details['grade']:<10}")
+        for page_number, page in enumerate(paginate(self.iter_students(sort_by), page_size)):
+            if page_number and input("Press Enter for the next page, or q to stop: ").strip().lower() == "q":
+                break
+            
+            # One write per page instead of one print per student
+            sys.stdout.write((header if page_number == 0 else "") + "".join(
+                f"{student.id:<5} {student.name:<20} {student.age:<5} {student.grade:<10}\n" for student in page
+            ))
+            sys.stdout.flush()
     
     def delete_student(self, student_id):
         """
@@ -176,12 +246,1217 @@ class StudentManagementSystem:
         """
         if student_id in self.students:
             student_name = self.students[student_id].name
-            del self.students[student_id]
-            logging.info(f"Deleted student: {student_name} with ID: {student_id}")
+            self.delete_many([student_id])
             print(f"Student {student_name} deleted successfully.")
         else:
             logging.warning(f"Student not found with ID: {student_id}")
             print("Student not found.")
+    
+    @writes
+    def add_many(self, records, lazy=False):
+        """
+        Add many students in one call without prompting.
+        
+        All records are validated in a single pass and new IDs are
+        allocated as one contiguous range. One log entry is written for
+        the whole batch.
+        
+        Args:
+            records (list): Dicts with keys 'name', 'age', 'grade', 'phone'
+                and 'email'. An optional 'id' key keeps an existing ID
+                (e.g. when importing) and replaces any student with it; of
+                several records with the same ID, the earlier ones are rejected.
+            lazy (bool): Store the records as PackedStudent rows
+                
+        Returns:
+            tuple: (ids, errors) where ids lists the ID given to each record
+                (None for rejected records) and errors maps the index of
+                each rejected record to its error messages
+        """
+        return self.add_columns({field: [record.get(field) for record in records] for field in STUDENT_FIELDS}, lazy)
+    
+    @writes
+    def add_columns(self, columns, lazy=False, check_unique=True):
+        """
+        Add many students given as columns, as add_many() does for records.
+        
+        Args:
+            columns (dict): Sequence of values per field of STUDENT_FIELDS;
+                the 'id' column may be omitted or hold None for new students
+            lazy (bool): Store the students as PackedStudent rows, which are
+                only turned into Student objects when edited or opened
+            check_unique (bool): Reject records whose phone or email is
+                already used by another student
+                
+        Returns:
+            tuple: (ids, errors) as returned by add_many()
+        """
+        size = len(columns["name"])
+        if "id" not in columns:
+            columns = dict(columns, id=[None] * size)
+        result = validate_records(
+            ids=columns["id"],
+            names=columns["name"],
+            ages=columns["age"],
+            grades=columns["grade"],
+            phones=columns["phone"],
+            emails=columns["email"]
+        )
+        # Of several records with the same ID, the last one is added
+        last_rows = {result.ids[row]: row for row in result.valid_rows() if result.ids[row] is not None}
+        for row in result.valid_rows():
+            student_id = result.ids[row]
+            if student_id is not None and last_rows[student_id] != row:
+                result.add_error(row, f"ID {student_id} appears again later in this batch")
+        if check_unique:
+            self.check_unique(result.ids, columns["phone"], columns["email"], result)
+        valid_rows = result.valid_rows()
+        
+        # Explicit IDs move next_id past them before allocating new ones
+        explicit_ids = [result.ids[row] for row in valid_rows if result.ids[row] is not None]
+        if explicit_ids:
+            self.next_id = max(self.next_id, max(explicit_ids) + 1)
+        
+        # Allocate one ID range for all records without an ID
+        allocated = sum(1 for row in valid_rows if result.ids[row] is None)
+        new_ids = iter(range(self.next_id, self.next_id + allocated))
+        self.next_id += allocated
+        
+        ids = [None] * size
+        new_students = []
+        added_students = []
+        # Packed records added together share one version
+        version = next_version()
+        for row in valid_rows:
+            student_id = result.ids[row] if result.ids[row] is not None else next(new_ids)
+            if student_id in self.students:
+                replaced = self.students[student_id]
+                self.stats.remove(replaced)
+                for index in itertools.chain(self._sort_indexes.values(), self.unique_indexes.values()):
+                    index.remove(replaced)
+            else:
+                new_students.append(student_id)
+            if lazy:
+                # Already validated, so the packed row is built without re-checking
+                student = PackedStudent((student_id, columns["name"][row], result.ages[row], columns["grade"][row],
+                                         columns["phone"][row], columns["email"][row]), version)
+            else:
+                contact = Contact(columns["phone"][row], columns["email"][row])
+                student = Student(student_id, columns["name"][row], result.ages[row], columns["grade"][row], contact)
+            self.students[student_id] = student
+            previous = self.row_hashes.get(student_id)
+            self.row_hashes[student_id] = row_hash(student.as_row())
+            self.changes.record(("student", student_id), previous.hex() if previous else None)
+            self.stats.add(student)
+            for index in self.unique_indexes.values():
+                index.add(student)
+            added_students.append(student)
+            ids[row] = student_id
+        self._index_ids(new_students)
+        for index in self._sort_indexes.values():
+            index.add_many(added_students)
+        
+        added = [student_id for student_id in ids if student_id is not None]
+        logging.info(f"Added {len(added)} students (IDs: {format_id_ranges(added)}), "
+                     f"rejected {len(result.errors)} invalid records")
+        return ids, result.errors
+    
+    @writes
+    def update_many(self, updates, expected_versions=None):
+        """
+        Update many students in one call without prompting.
+        
+        Each update may change any of 'name', 'age', 'grade', 'phone' and
+        'email'; omitted fields keep their current values. All updates are
+        validated in a single pass before any student is changed, and one
+        log entry is written for the whole batch.
+        
+        Editors that read a student and save later pass the version they
+        read in expected_versions. The update is then rejected with a
+        version conflict if someone else saved the student in between,
+        instead of silently overwriting their change.
+        
+        Args:
+            updates (dict): Mapping of student ID to a dict of new values
+            expected_versions (dict, optional): Mapping of student ID to the
+                version its update is based on
+            
+        Returns:
+            tuple: (updated, errors) where updated lists the updated IDs and
+                errors maps each rejected ID to its error messages
+        """
+        self.ensure_loaded(updates)
+        errors = {}
+        merged = []
+        for student_id, changes in updates.items():
+            if student_id not in self.students:
+                errors[student_id] = ["Student not found"]
+                continue
+            try:
+                self.students[student_id].check_version((expected_versions or {}).get(student_id))
+            except VersionConflictError as e:
+                errors[student_id] = [str(e)]
+                continue
+            _, name, age, grade, phone, email = self.students[student_id].as_row()
+            merged.append((student_id, {
+                "name": changes.get("name", name),
+                "age": changes.get("age", age),
+                "grade": changes.get("grade", grade),
+                "phone": changes.get("phone", phone or None),
+                "email": changes.get("email", email or None)
+            }))
+        
+        result = validate_records(
+            names=[details["name"] for _, details in merged],
+            ages=[details["age"] for _, details in merged],
+            grades=[details["grade"] for _, details in merged],
+            phones=[details["phone"] for _, details in merged],
+            emails=[details["email"] for _, details in merged]
+        )
+        self.check_unique([student_id for student_id, _ in merged], [details["phone"] for _, details in merged],
+                          [details["email"] for _, details in merged], result)
+        for row, messages in result.errors.items():
+            errors[merged[row][0]] = messages
+        
+        updated = []
+        for row in result.valid_rows():
+            student_id, details = merged[row]
+            current = self.students[student_id]
+            self.stats.remove(current)
+            for index in itertools.chain(self._sort_indexes.values(), self.unique_indexes.values()):
+                index.remove(current)
+            # Change a copy, so snapshots holding the current object are unaffected
+            student = current.materialize() if isinstance(current, PackedStudent) else copy.copy(current)
+            student.update_details({
+                "name": details["name"],
+                "age": result.ages[row],
+                "grade": details["grade"],
+                "contact": Contact(details["phone"], details["email"])
+            }, log=False)
+            self.students[student_id] = student
+            previous = self.row_hashes[student_id]
+            self.row_hashes[student_id] = row_hash(student.as_row())
+            self.changes.record(("student", student_id), previous.hex())
+            self.stats.add(student)
+            for index in itertools.chain(self._sort_indexes.values(), self.unique_indexes.values()):
+                index.add(student)
+            updated.append(student_id)
+        
+        logging.info(f"Updated {len(updated)} students (IDs: {format_id_ranges(updated)}), "
+                     f"rejected {len(errors)} updates")
+        return updated, errors
+    
+    @writes
+    def delete_many(self, student_ids):
+        """
+        Delete many students in one call without prompting.
+        
+        Args:
+            student_ids (iterable): IDs of the students to delete
+            
+        Returns:
+            tuple: (deleted, missing) lists of deleted and unknown IDs
+        """
+        student_ids = list(student_ids)
+        self.ensure_loaded(student_ids)
+        deleted = []
+        missing = []
+        removed_students = []
+        for student_id in student_ids:
+            student = self.students.pop(student_id, None)
+            if student is None:
+                missing.append(student_id)
+            else:
+                self.changes.record(("student", student_id), self.row_hashes.pop(student_id).hex())
+                self.photos.pop(student_id, None)
+                self.stats.remove(student)
+                for index in self.unique_indexes.values():
+                    index.remove(student)
+                removed_students.append(student)
+                deleted.append(student_id)
+        self._unindex_ids(deleted)
+        for index in self._sort_indexes.values():
+            index.remove_many(removed_students)
+        
+        logging.info(f"Deleted {len(deleted)} students (IDs: {format_id_ranges(deleted)}), "
+                     f"{len(missing)} not found")
+        return deleted, missing
+    
+    @reads
+    def check_unique(self, student_ids, phones, emails, result):
+        """
+        Flag rows whose phone or email is already used by another student.
+        
+        Each check is a hash lookup in the uniqueness indexes. Rows earlier
+        in the same batch count as existing students, so a batch cannot
+        introduce duplicates among its own rows either. Unloaded grade
+        shards are loaded first, since any of their students may already
+        use a phone number or email.
+        
+        Args:
+            student_ids (sequence): ID of the student each row is for, or
+                None for new students
+            phones (sequence): Phone number of each row
+            emails (sequence): Email address of each row
+            result (ValidationResult): Validation result the errors are added to
+        """
+        # Called under the write lock, before the batch changes anything
+        self.load_all()
+        columns = {"phone": phones, "email": emails}
+        batch = {field: {} for field in UNIQUE_FIELDS}
+        for row in result.valid_rows():
+            student_id = student_ids[row]
+            values = {}
+            for field, index in self.unique_indexes.items():
+                value = index.normalize(columns[field][row])
+                if not value:
+                    continue
+                owners = index.conflicts(value, student_id)
+                if owners:
+                    result.add_error(row, f"{field.capitalize()} already used by student ID {owners[0]}")
+                elif value in batch[field] and (student_id is None or batch[field][value] != student_id):
+                    result.add_error(row, f"{field.capitalize()} already used by another record in this batch")
+                else:
+                    values[field] = value
+            if row not in result.errors:
+                for field, value in values.items():
+                    batch[field][value] = student_id
+    
+    @loads_all_shards
+    @reads
+    def find_duplicates(self):
+        """
+        Return every phone number and email address used by several students.
+        
+        The uniqueness indexes are already grouped by value, so this is one
+        pass over the distinct values rather than a comparison of every pair
+        of students.
+        
+        Returns:
+            list: Dicts with 'field', 'value' and 'ids' keys
+        """
+        return [{"field": field, "value": value, "ids": owners}
+                for field, index in self.unique_indexes.items()
+                for value, owners in index.duplicates()]
+    
+    @writes
+    def get_student(self, student_id):
+        """
+        Return the Student with an ID, materializing a packed record.
+        
+        Args:
+            student_id (int): ID of the student
+            
+        Returns:
+            Student: The student, or None if there is no such ID
+        """
+        self.ensure_loaded([student_id])
+        student = self.students.get(student_id)
+        if isinstance(student, PackedStudent):
+            student = student.materialize()
+            self.students[student_id] = student
+        return student
+    
+    @writes
+    def mark_attendance(self, date, statuses):
+        """
+        Record attendance for a date.
+        
+        Args:
+            date (str): Attendance date (YYYY-MM-DD)
+            statuses (dict): Mapping of student ID to 'Present' or 'Absent'
+        """
+        self.ensure_loaded(statuses)
+        attendance = self.attendance_records.setdefault(date, {})
+        for student_id, status in statuses.items():
+            previous = attendance.get(student_id)
+            if previous != status:
+                self.stats.mark(date, previous, status, student_id)
+                self.changes.record(("attendance", date, student_id), previous)
+            attendance[student_id] = status
+    
+    @writes
+    def set_photos(self, photos):
+        """
+        Set or remove the photo paths of students.
+        
+        Args:
+            photos (dict): Mapping of student ID to a photo file path, or
+                None to remove the student's photo
+        """
+        for student_id, path in photos.items():
+            previous = self.photos.get(student_id)
+            if previous == path:
+                continue
+            self.changes.record(("photo", student_id), previous)
+            if path is None:
+                del self.photos[student_id]
+            else:
+                self.photos[student_id] = path
+    
+    @loads_all_shards
+    @writes
+    def export_changes(self, file_path, since=0):
+        """
+        Write the changes made after a sequence number as a changeset.
+        
+        Only changed records are visited, so the cost depends on the number
+        of changes rather than on the roster size. Photo paths point at
+        files on this machine and are not exported.
+        
+        Args:
+            file_path (str): Path of the JSON Lines changeset to write
+            since (int): Sequence number the receiving instance last applied
+            
+        Returns:
+            int: Number of changes written
+        """
+        entries = []
+        for key, sequence, previous in self.changes.since(since):
+            if key[0] == "student":
+                student = self.students.get(key[1])
+                entries.append({"type": "student", "seq": sequence, "id": key[1], "prev": previous,
+                                "row": list(student.as_row()) if student else None})
+            elif key[0] != "photo":
+                _, date, student_id = key
+                entries.append({"type": "attendance", "seq": sequence, "date": date, "id": student_id,
+                                "prev": previous, "status": self.attendance_records[date][student_id]})
+        
+        header = {"source": self.changes.instance, "since": since, "sequence": self.changes.sequence}
+        with open(file_path, 'w') as f:
+            write_changeset(f, header, entries)
+        self.changes.exported = self.changes.sequence
+        logging.info(f"Exported {len(entries)} changes since sequence {since} to {file_path}")
+        return len(entries)
+    
+    @loads_all_shards
+    @writes
+    def apply_changes(self, file_path):
+        """
+        Apply a changeset exported by another instance.
+        
+        Applying is idempotent: changes already present here are counted as
+        unchanged. A change is applied only if the local record still has
+        the value the change was based on; otherwise both sides changed it
+        and it is reported as a conflict and left alone.
+        
+        Args:
+            file_path (str): Path of the changeset
+            
+        Returns:
+            tuple: (counts, conflicts) where counts maps 'applied',
+                'unchanged' and 'conflicts' to numbers of changes plus
+                'sequence' to the sender's sequence number, and conflicts
+                maps each conflicting record to its error messages
+                
+        Raises:
+            ValueError: If the file is not a changeset or came from this instance
+        """
+        with open(file_path, 'r') as f:
+            header, entries = read_changeset(f)
+        if header["source"] == self.changes.instance:
+            raise ValueError("Changeset was exported by this instance")
+        
+        counts = {"applied": 0, "unchanged": 0, "conflicts": 0, "sequence": header["sequence"]}
+        conflicts = {}
+        received = []
+        adds, updates, deletes, marks = [], {}, [], {}
+        for entry in entries:
+            student_id = entry["id"]
+            if entry["type"] == "photo":
+                # Photo paths are local to each machine; older changesets included them
+                continue
+            if entry["type"] == "student":
+                name = f"student {student_id}"
+                key = ("student", student_id)
+                target = row_hash(entry["row"]).hex() if entry["row"] else None
+            else:
+                name = f"attendance {entry['date']} {student_id}"
+                key = ("attendance", entry["date"], student_id)
+                target = entry["status"]
+            current = self._sync_value(key)
+            
+            if current == target:
+                counts["unchanged"] += 1
+                continue
+            if current != entry["prev"]:
+                conflicts[name] = ["Changed on both instances since the last sync"]
+                continue
+            received.append((key, target))
+            if entry["type"] == "attendance":
+                marks.setdefault(entry["date"], {})[student_id] = target
+            elif target is None:
+                deletes.append(student_id)
+            elif current is None:
+                adds.append(entry["row"])
+            else:
+                updates[student_id] = dict(zip(STUDENT_FIELDS[1:], entry["row"][1:]))
+        
+        # Deletions first, so their phone numbers and emails can be reused
+        deleted, _ = self.delete_many(deletes)
+        updated, errors = self.update_many(updates)
+        conflicts.update((f"student {student_id}", messages) for student_id, messages in errors.items())
+        added = 0
+        if adds:
+            ids, errors = self.add_columns(dict(zip(STUDENT_FIELDS, zip(*adds))), lazy=True)
+            conflicts.update((f"student {adds[row][0]}", messages) for row, messages in errors.items())
+            added = len(ids) - len(errors)
+        for date, statuses in marks.items():
+            self.mark_attendance(date, statuses)
+        
+        # The sender has the received values, so a later local edit of the
+        # record is based on them rather than on what was here before
+        for key, target in received:
+            if self._sync_value(key) == target:
+                self.changes.rebase(key, target)
+        
+        counts["applied"] = (len(deleted) + len(updated) + added
+                             + sum(len(statuses) for statuses in marks.values()))
+        counts["conflicts"] = len(conflicts)
+        logging.info(f"Applied changeset {file_path} from {header['source']}: {counts['applied']} applied, "
+                     f"{counts['unchanged']} unchanged, {counts['conflicts']} conflicts")
+        return counts, conflicts
+    
+    def _sync_value(self, key):
+        """Return the value a change log entry compares for a record: row hash or status."""
+        if key[0] == "student":
+            current = self.row_hashes.get(key[1])
+            return current.hex() if current else None
+        _, date, student_id = key
+        return self.attendance_records.get(date, {}).get(student_id)
+    
+    @reads
+    def snapshot(self):
+        """
+        Return a consistent view of the students and attendance.
+        
+        Only the dicts are copied, at C speed, while holding the lock for
+        reading; the snapshot can then be read from any thread for as long
+        as needed while changes continue.
+        
+        Returns:
+            Snapshot: The students and attendance as of now
+        """
+        return Snapshot(dict(self.students),
+                        {date: dict(statuses) for date, statuses in self.attendance_records.items()})
+    
+    def share(self, name):
+        """
+        Publish the roster to shared memory for other local processes.
+        
+        Other processes attach with shared_roster.SharedRoster(name) and
+        read the columns in place, so memory use does not grow with the
+        number of readers.
+        
+        Args:
+            name (str): Name to publish the roster under
+        """
+        from shared_roster import SharedRosterPublisher
+        self.publisher = SharedRosterPublisher(name)
+        self._published_sequence = None
+        self.publish_shared()
+    
+    def stop_sharing(self):
+        """Remove the roster from shared memory, if it was shared."""
+        if self.publisher is not None:
+            self.publisher.close()
+            self.publisher = None
+    
+    def publish_shared(self):
+        """
+        Publish a new generation of the shared roster if anything changed.
+        
+        Returns:
+            bool: True if a new generation was published
+        """
+        if self.publisher is None or self._published_sequence == self.changes.sequence:
+            return False
+        sequence = self.changes.sequence
+        self.publisher.publish(self.snapshot())
+        self._published_sequence = sequence
+        return True
+    
+    def _index_ids(self, student_ids):
+        """Add new student IDs to the sorted ID order."""
+        if not student_ids:
+            return
+        student_ids = sorted(student_ids)
+        if not self._sorted_ids or student_ids[0] > self._sorted_ids[-1]:
+            # Newly allocated IDs always land at the end
+            self._sorted_ids.extend(student_ids)
+        elif len(student_ids) > len(self._sorted_ids) // 8:
+            self._sorted_ids = sorted(self._sorted_ids + student_ids)
+        else:
+            for student_id in student_ids:
+                bisect.insort(self._sorted_ids, student_id)
+    
+    def _unindex_ids(self, student_ids):
+        """Remove deleted student IDs from the sorted ID order."""
+        if len(student_ids) > len(self._sorted_ids) // 8:
+            self._sorted_ids = sorted(self.students)
+            return
+        for student_id in student_ids:
+            index = bisect.bisect_left(self._sorted_ids, student_id)
+            del self._sorted_ids[index]
+    
+    @reads
+    def sort_index(self, fields):
+        """
+        Return the sort index for a tuple of fields.
+        
+        The index is built on first request and then kept up to date by
+        every mutation, so later requests for the same order are free.
+        
+        Args:
+            fields (tuple): Field names from FIELD_KEYS, most significant first
+            
+        Returns:
+            SortIndex: The maintained index
+            
+        Raises:
+            ValueError: If a field is unknown
+        """
+        fields = tuple(fields)
+        if fields not in self._sort_indexes:
+            self._sort_indexes[fields] = SortIndex(fields, self.students.values())
+        return self._sort_indexes[fields]
+    
+    def sorted_ids(self, fields, descending=False):
+        """
+        Return an iterator of student IDs ordered by the given fields.
+        
+        Args:
+            fields (tuple): Field names from FIELD_KEYS, most significant first
+            descending (bool): Reverse the order
+        """
+        if tuple(fields) in ((), ("id",)):
+            return reversed(self._sorted_ids) if descending else iter(self._sorted_ids)
+        return self.sort_index(fields).ids(descending)
+    
+    def iter_students(self, sort_by="id", after_id=None, descending=False):
+        """
+        Yield students in sorted order, starting after a cursor.
+        
+        ID order is served directly from the sorted IDs the system keeps and
+        other orders from the maintained sort indexes. Ties are broken by ID
+        so that every student has a stable position for the cursor.
+        
+        The generator does not hold the lock between students; threads
+        other than the one making changes should iterate a snapshot().
+        
+        Args:
+            sort_by (str): A field name from FIELD_KEYS
+            after_id (int, optional): Start after the student with this ID
+            descending (bool): Yield in descending order
+            
+        Yields:
+            Student: Students in the requested order
+            
+        Raises:
+            ValueError: If sort_by is unknown, or after_id is not a student
+                when sorting by something other than ID
+        """
+        keys, cursor = self._sort_keys(sort_by, after_id)
+        yield from self._iter_ordered(self.students, keys, cursor, descending)
+    
+    @reads
+    def iter_snapshot(self, sort_by="id", after_id=None, descending=False):
+        """
+        Return an iterator of the students as of now, in sorted order after a cursor.
+        
+        The students and their order are copied while holding the lock for
+        reading, as snapshot() does, so the iterator can be consumed lazily
+        from any thread (e.g. while streaming to a slow client) as changes
+        continue. Arguments and errors are those of iter_students().
+        
+        Returns:
+            iterator: Students in the requested order
+        """
+        keys, cursor = self._sort_keys(sort_by, after_id)
+        return self._iter_ordered(dict(self.students), list(keys), cursor, descending)
+    
+    def _sort_keys(self, sort_by, after_id):
+        """Return the sorted IDs or sort index entries of an order, and the key of a cursor in them."""
+        if sort_by == "id":
+            return self._sorted_ids, after_id
+        index = self.sort_index((sort_by,))
+        if after_id is None:
+            return index.entries, None
+        if after_id not in self.students:
+            raise ValueError(f"Student not found with ID: {after_id}")
+        return index.entries, index.entry(self.students[after_id])
+    
+    @staticmethod
+    def _iter_ordered(students, keys, cursor, descending):
+        """Yield students in the order of sorted IDs or (key, ID) entries, starting after a cursor."""
+        if descending:
+            start = len(keys) - 1 if cursor is None else bisect.bisect_left(keys, cursor) - 1
+            positions = range(start, -1, -1)
+        else:
+            start = 0 if cursor is None else bisect.bisect_right(keys, cursor)
+            positions = range(start, len(keys))
+        
+        for position in positions:
+            key = keys[position]
+            yield students[key if isinstance(key, int) else key[1]]
+    
+    def search(self, text, by="name"):
+        """
+        Find students matching a search text.
+        
+        With a sharded data directory, the grades that can match are loaded
+        first: only matching grades for a grade search, all grades for a
+        name search, and all grades for an ID that is not loaded.
+        
+        Args:
+            text (str): Text to search for
+            by (str): 'name' or 'grade' for a case-insensitive substring
+                match, or 'id' for an exact ID match
+                
+        Returns:
+            list: Matching students (Student or PackedStudent)
+        """
+        if self.shards is not None:
+            if by == "grade":
+                self.load_grades([grade for grade in self.shards.unloaded if grade_key(text) in grade_key(grade)])
+            elif by == "id":
+                self.ensure_loaded([int(text)] if text.isdigit() else [])
+            else:
+                self.load_all()
+        
+        with self.lock.read_locked():
+            return self._search(text, by)
+    
+    def _search(self, text, by):
+        """Search the loaded students, as search() does."""
+        if by == "id":
+            student = self.students.get(int(text)) if text.isdigit() else None
+            return [student] if student else []
+        if by == "grade":
+            # Match the distinct grades once, then compare codes
+            codes = GRADES.matching(text)
+            return [student for student in self.students.values() if student.grade_code in codes]
+        
+        text = text.lower()
+        return [student for student in self.students.values() if text in getattr(student, by).lower()]
+    
+    @loads_all_shards
+    @writes
+    def import_csv(self, file_path, check_unique=True, remove_missing=False):
+        """
+        Import students from a CSV file with an ID,Name,Age,Grade,Phone,Email header.
+        
+        The import is an upsert, so re-importing a file is idempotent. Rows
+        whose ID is not in the system are added. Rows for existing students
+        are compared by content hash: unchanged rows are skipped without
+        being parsed or validated, and changed rows update only the fields
+        that differ.
+        
+        Args:
+            file_path (str): Path of the CSV file
+            check_unique (bool): Reject rows whose phone or email is already
+                used by another student
+            remove_missing (bool): Delete students that are not in the file
+            
+        Returns:
+            tuple: (counts, errors) where counts maps 'added', 'updated',
+                'unchanged' and 'removed' to numbers of students and errors
+                maps the index of each rejected row to its error messages
+        """
+        with open(file_path, 'r', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            
+            # Skip header
+            next(reader, None)
+            
+            rows = [row for row in reader if len(row) >= 6]
+        
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        new_rows = []
+        updates = {}
+        update_rows = {}
+        seen = set()
+        for index, row in enumerate(rows):
+            student_id = int(row[0]) if row[0].isdigit() else None
+            if student_id not in self.students:
+                new_rows.append(index)
+                continue
+            seen.add(student_id)
+            if self.row_hashes[student_id] == row_hash(row[:6]):
+                counts["unchanged"] += 1
+                continue
+            # Compare field by field to update only what changed; grades
+            # compare by key, as row_hash() does
+            current = self.students[student_id].as_row()
+            changes = {field: value for field, value, old in zip(STUDENT_FIELDS[1:], row[1:6], current[1:])
+                       if (grade_key(value) != grade_key(old) if field == "grade" else value != str(old))}
+            if changes:
+                updates[student_id] = changes
+                update_rows[student_id] = index
+            else:
+                counts["unchanged"] += 1
+        
+        errors = {}
+        if new_rows:
+            # Validate and add all new rows in one batch, kept packed until used
+            columns = dict(zip(STUDENT_FIELDS, zip(*(rows[index] for index in new_rows))))
+            ids, add_errors = self.add_columns(columns, lazy=True, check_unique=check_unique)
+            errors.update((new_rows[row], messages) for row, messages in add_errors.items())
+            seen.update(student_id for student_id in ids if student_id is not None)
+            counts["added"] = len(new_rows) - len(add_errors)
+        if updates:
+            updated, update_errors = self.update_many(updates)
+            errors.update((update_rows[student_id], messages) for student_id, messages in update_errors.items())
+            counts["updated"] = len(updated)
+        if remove_missing:
+            deleted, _ = self.delete_many([student_id for student_id in self.students if student_id not in seen])
+            counts["removed"] = len(deleted)
+        
+        logging.info(f"Imported {file_path}: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+        return counts, dict(sorted(errors.items()))
+    
+    @loads_all_shards
+    @reads
+    def export_csv(self, file_path):
+        """
+        Export all students to a CSV file.
+        
+        Args:
+            file_path (str): Path of the CSV file
+            
+        Returns:
+            int: Number of exported students
+        """
+        with open(file_path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(STUDENT_FIELDS_HEADER)
+            writer.writerows(student.as_row() for student in self.students.values())
+        return len(self.students)
+    
+    @writes
+    def load(self, data_dir, grades=None):
+        """
+        Load students and attendance from a data directory, if present.
+        
+        A sharded data directory (see shard()) only has the given grades
+        loaded; the others are loaded when something needs them.
+        
+        Loaded records are not recorded as changes. Their values are the
+        baseline for sync: instances loaded from copies of one data
+        directory export only what changed afterwards, based on those values.
+        
+        Args:
+            data_dir (str): Directory holding students.csv and attendance.csv,
+                or a shard manifest
+            grades (list, optional): Grades to load from a sharded
+                directory (default: all)
+                
+        Raises:
+            ValueError: If grades are given for a directory that is not sharded
+        """
+        shards = ShardSet.open(data_dir)
+        if shards is not None:
+            self.shards = shards
+            self.next_id = max(self.next_id, shards.next_id)
+            known = {grade_key(grade) for grade in shards.grades}
+            unknown = sorted(grade for grade in grades or () if grade_key(grade) not in known)
+            if unknown:
+                logging.warning(f"No shards for grades: {', '.join(unknown)}")
+            self.load_grades(shards.grades if grades is None else grades)
+            with self.changes.suspended():
+                self._load_photos(data_dir)
+            changes = ChangeLog.load(data_dir)
+            if changes is not None:
+                self.changes = changes
+            return
+        if grades is not None:
+            raise ValueError(f"{data_dir} is not sharded by grade")
+        
+        with self.changes.suspended():
+            students_path = os.path.join(data_dir, STUDENTS_FILE)
+            if os.path.exists(students_path):
+                # Saved data is loaded as is; existing duplicates are reported, not dropped
+                self.import_csv(students_path, check_unique=False)
+                duplicates = self.find_duplicates()
+                if duplicates:
+                    logging.warning(f"{len(duplicates)} phone numbers or email addresses are shared by several students")
+            
+            attendance_path = os.path.join(data_dir, ATTENDANCE_FILE)
+            if os.path.exists(attendance_path):
+                with open(attendance_path, 'r', newline='') as csvfile:
+                    reader = csv.reader(csvfile)
+                    next(reader, None)
+                    records = {}
+                    for date, student_id, status in reader:
+                        records.setdefault(date, {})[int(student_id)] = status
+                for date, statuses in records.items():
+                    self.mark_attendance(date, statuses)
+            self._load_photos(data_dir)
+        
+        # Carry on from the saved sequence numbers, if any
+        changes = ChangeLog.load(data_dir)
+        if changes is not None:
+            self.changes = changes
+    
+    @writes
+    def load_grades(self, grades):
+        """
+        Load grade shards that are not loaded yet.
+        
+        Loaded records are not recorded as changes, since they are already
+        saved.
+        
+        Args:
+            grades (iterable): Grades to load, matched ignoring case and
+                whitespace runs; unknown and loaded ones are skipped
+        """
+        if self.shards is None:
+            return
+        keys = {grade_key(grade) for grade in grades}
+        for grade in list(self.shards.grades):
+            if grade_key(grade) not in keys or grade in self.shards.loaded:
+                continue
+            rows, marks = self.shards.read(grade)
+            records = {}
+            for date, student_id, status in marks:
+                records.setdefault(date, {})[int(student_id)] = status
+            with self.changes.suspended():
+                if rows:
+                    self.add_columns(dict(zip(STUDENT_FIELDS, zip(*(row[:6] for row in rows)))),
+                                     lazy=True, check_unique=False)
+                for date, statuses in records.items():
+                    self.mark_attendance(date, statuses)
+            self.shards.loaded.add(grade)
+            logging.info(f"Loaded {len(rows)} students of grade {grade} from {self.shards.data_dir}")
+        self.next_id = max(self.next_id, self.shards.next_id)
+    
+    def load_all(self):
+        """Load every grade shard that is not loaded yet."""
+        # Checked without the lock, so the common fully-loaded case stays cheap
+        if self.shards is not None and self.shards.unloaded:
+            self.load_grades(self.shards.unloaded)
+    
+    def ensure_loaded(self, student_ids):
+        """
+        Load the remaining grade shards if any of the IDs is not loaded.
+        
+        A student's grade is not known before their shard is read, so an
+        unknown ID means loading every shard.
+        
+        Args:
+            student_ids (iterable): IDs about to be looked up
+        """
+        if self.shards is not None and self.shards.unloaded:
+            if any(student_id not in self.students for student_id in student_ids):
+                self.load_all()
+    
+    def run_reports(self, specs, max_workers=None):
+        """
+        Evaluate report specs over the whole roster in one fused scan.
+        
+        Loaded grades are scanned in memory; the shards of grades that are
+        not loaded are read and scanned in parallel by a process pool,
+        without loading them into the store.
+        
+        Args:
+            specs (list): reports.ReportSpec objects
+            max_workers (int, optional): Worker processes for the shards
+            
+        Returns:
+            dict: Report name to rows, as returned by ReportEngine.results()
+        """
+        engine = ReportEngine(specs)
+        with self.lock.read_locked():
+            engine.scan(self.students.values(), self.attendance_records)
+            unloaded = self.shards.unloaded if self.shards is not None else []
+        if unloaded:
+            self.shards.evaluate(engine, unloaded, max_workers)
+        return engine.results()
+    
+    def at_risk_students(self, n, grade=None, per_grade=False, first=None, last=None):
+        """
+        Return the students with the lowest attendance rates.
+        
+        Without a date range the per-student attendance counters kept by
+        the roster statistics are used as they are; with one, only the
+        dates in the range are counted. The lowest n are then picked by
+        heap selection rather than by sorting every student.
+        
+        Args:
+            n (int): Students to return (per grade with per_grade)
+            grade (str, optional): Only consider this grade
+            per_grade (bool): Select the lowest n of every grade
+            first (str, optional): First attendance date to count (YYYY-MM-DD)
+            last (str, optional): Last attendance date to count (YYYY-MM-DD)
+            
+        Returns:
+            list: Dicts with 'id', 'name', 'grade', 'present', 'absent' and
+                'rate' (a percentage), lowest rate (then most absences)
+                first, grouped by grade with per_grade
+        """
+        if grade is not None:
+            self.load_grades([grade])
+        else:
+            self.load_all()
+        
+        code = GRADES.lookup(grade) if grade is not None else None
+        if grade is not None and code is None:
+            return []
+        with self.lock.read_locked():
+            if first is None and last is None:
+                days = self.stats.student_attendance
+            else:
+                days = {}
+                for date, statuses in self.attendance_records.items():
+                    if not in_date_range((first, last), date):
+                        continue
+                    for student_id, status in statuses.items():
+                        counts = days.setdefault(student_id, [0, 0])
+                        counts[0] += status == "Present"
+                        counts[1] += 1
+            
+            candidates = ((present / marked, marked - present, student_id, student, present)
+                          for student_id, (present, marked) in days.items()
+                          for student in (self.students.get(student_id),)
+                          if marked and student is not None and (code is None or student.grade_code == code))
+            selected = select_lowest(candidates, n, key=lambda candidate: (candidate[0], -candidate[1], candidate[2]),
+                                     group=(lambda candidate: candidate[3].grade_code) if per_grade else None)
+            groups = sorted(selected, key=GRADES.sort_key) if per_grade else [None]
+            return [{"id": student_id, "name": student.name, "grade": student.grade, "present": present,
+                     "absent": absent, "rate": rate * 100}
+                    for group in groups for rate, absent, student_id, student, present in selected[group]]
+    
+    def percentile_sketches(self, max_workers=None):
+        """
+        Return sketches of the ages and attendance rates of the whole roster.
+        
+        The sketches of loaded grades are maintained on every change, so
+        this only copies them; unloaded grade shards are sketched in
+        parallel by a process pool and merged in.
+        
+        Args:
+            max_workers (int, optional): Worker processes for the shards
+            
+        Returns:
+            dict: 'age' and 'attendance_rate' sketches.Histogram objects
+        """
+        with self.lock.read_locked():
+            ages = self.stats.age_sketch.copy()
+            rates = self.stats.rate_sketch.copy()
+            unloaded = self.shards.unloaded if self.shards is not None else []
+        if unloaded:
+            self.shards.sketch(ages, rates, unloaded, max_workers)
+        return {"age": ages, "attendance_rate": rates}
+    
+    @writes
+    def shard(self, data_dir):
+        """
+        Switch a data directory to one shard per grade.
+        
+        The next save() writes a manifest plus one students file and one
+        attendance file per grade, and removes students.csv and
+        attendance.csv.
+        
+        Args:
+            data_dir (str): Data directory to shard
+            
+        Returns:
+            int: Number of grade shards
+            
+        Raises:
+            ValueError: If the directory is already sharded
+        """
+        if self.shards is not None or ShardSet.open(data_dir) is not None:
+            raise ValueError(f"{data_dir} is already sharded")
+        self.shards = ShardSet(data_dir, next_id=self.next_id)
+        self.shards.loaded = {student.grade for student in self.students.values()}
+        return len(self.shards.loaded)
+    
+    def _save_shards(self, data_dir):
+        """Write the loaded grades as shards of a data directory, as save() does."""
+        if os.path.abspath(data_dir) == os.path.abspath(self.shards.data_dir):
+            shards = self.shards
+        else:
+            # Saving elsewhere writes a complete copy
+            self.load_all()
+            shards = ShardSet(data_dir)
+        
+        # Students may have moved into or been added to grades that are not loaded
+        codes = {student.grade_code for student in self.students.values()}
+        self.load_grades(GRADES.name(code) for code in codes)
+        grade_of = {student_id: student.grade_code for student_id, student in self.students.items()}
+        
+        # Loaded shards no student is in any more (including differently
+        # spelled duplicates of a grade) are written empty, which removes them
+        grades = self.shards.loaded | {GRADES.name(code) for code in codes}
+        contents = {grade: ([], []) for grade in grades}
+        shard_of = {code: contents[GRADES.name(code)] for code in codes}
+        for student_id, student in self.students.items():
+            shard_of[grade_of[student_id]][0].append(student.as_row())
+        for date, attendance in self.attendance_records.items():
+            for student_id, status in attendance.items():
+                # Marks of deleted students have no shard and are dropped
+                if student_id in grade_of:
+                    shard_of[grade_of[student_id]][1].append((date, student_id, status))
+        
+        shards.write(contents, self.next_id)
+        self.shards.loaded = grades
+        
+        # The flat files are superseded by the shards
+        for name in (STUDENTS_FILE, ATTENDANCE_FILE):
+            path = os.path.join(data_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+    
+    @writes
+    def save(self, data_dir):
+        """
+        Save students and attendance to a data directory.
+        
+        Files are written to a temporary name first and then renamed, so an
+        interrupted save never leaves a half-written roster behind. A
+        sharded roster rewrites only the shards of loaded grades.
+        
+        Args:
+            data_dir (str): Directory to write students.csv and attendance.csv to
+        """
+        os.makedirs(data_dir, exist_ok=True)
+        if self.shards is not None:
+            self._save_shards(data_dir)
+        else:
+            students_path = os.path.join(data_dir, STUDENTS_FILE)
+            self.export_csv(students_path + ".tmp")
+            os.replace(students_path + ".tmp", students_path)
+            
+            attendance_path = os.path.join(data_dir, ATTENDANCE_FILE)
+            with open(attendance_path + ".tmp", 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(["Date", "ID", "Status"])
+                for date, attendance in self.attendance_records.items():
+                    writer.writerows((date, student_id, status) for student_id, status in attendance.items())
+            os.replace(attendance_path + ".tmp", attendance_path)
+        
+        photos_path = os.path.join(data_dir, PHOTOS_FILE)
+        with open(photos_path + ".tmp", 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["ID", "Path"])
+            writer.writerows(self.photos.items())
+        os.replace(photos_path + ".tmp", photos_path)
+        
+        self.changes.save(data_dir)
+        logging.info(f"Saved {len(self.students)} students to {data_dir}")
+    
+    def _load_photos(self, data_dir):
+        """Read the photo paths saved in a data directory, if any."""
+        photos_path = os.path.join(data_dir, PHOTOS_FILE)
+        if os.path.exists(photos_path):
+            with open(photos_path, 'r', newline='') as csvfile:
+                reader = csv.reader(csvfile)
+                next(reader, None)
+                self.set_photos({int(student_id): path for student_id, path in reader})
+    
+    def backup(self, backup_dir, full=False):
+        """
+        Take a point-in-time snapshot of the students, attendance and photo paths.
+        
+        Most snapshots are deltas holding only the records changed since the
+        previous snapshot, read from the change log, so they cost time and
+        space in proportion to the changes. A full snapshot is taken first,
+        after FULL_EVERY deltas, and whenever the change log does not carry
+        on from the previous snapshot. Save the roster before backing it up,
+        so a restart cannot rewind the change log past a delta.
+        
+        Args:
+            backup_dir (str): Directory holding the snapshots
+            full (bool): Take a full snapshot even if a delta would do
+            
+        Returns:
+            dict: Manifest entry of the snapshot, or None if nothing changed
+                since the previous one
+        """
+        backups = BackupSet(backup_dir)
+        full = full or backups.needs_full(self.changes.instance, self.changes.sequence)
+        if full:
+            self.load_all()
+        
+        with self.lock.read_locked():
+            header = {"instance": self.changes.instance, "sequence": self.changes.sequence, "next_id": self.next_id}
+            if full:
+                records = [{"type": "student", "id": student_id, "row": list(student.as_row())}
+                           for student_id, student in self.students.items()]
+                records.extend({"type": "attendance", "date": date, "id": student_id, "status": status}
+                               for date, statuses in self.attendance_records.items()
+                               for student_id, status in statuses.items())
+                records.extend({"type": "photo", "id": student_id, "path": path}
+                               for student_id, path in self.photos.items())
+            else:
+                records = []
+                for key, _, _ in self.changes.since(backups.last_sequence):
+                    if key[0] == "student":
+                        student = self.students.get(key[1])
+                        records.append({"type": "student", "id": key[1],
+                                        "row": list(student.as_row()) if student else None})
+                    elif key[0] == "photo":
+                        records.append({"type": "photo", "id": key[1], "path": self.photos.get(key[1])})
+                    else:
+                        _, date, student_id = key
+                        records.append({"type": "attendance", "date": date, "id": student_id,
+                                        "status": self.attendance_records[date][student_id]})
+                if not records:
+                    return None
+        
+        snapshot = backups.write("full" if full else "delta", header, records)
+        logging.info(f"Took {snapshot['kind']} snapshot {snapshot['file']} with {snapshot['records']} records")
+        return snapshot
+    
+    @writes
+    def restore_backup(self, backup_dir, at=None):
+        """
+        Load the roster as it was at a point in time into an empty system.
+        
+        Args:
+            backup_dir (str): Directory holding the snapshots
+            at (datetime, optional): Point in time (default: latest snapshot)
+            
+        Returns:
+            str: Time of the last snapshot applied
+            
+        Raises:
+            ValueError: If the system is not empty or no full snapshot was
+                taken by that time
+        """
+        if self.students or self.attendance_records:
+            raise ValueError("Restore into an empty data directory")
+        state = BackupSet(backup_dir).restore(at)
+        if state["students"]:
+            self.add_columns(dict(zip(STUDENT_FIELDS, zip(*state["students"].values()))), lazy=True, check_unique=False)
+        for date, statuses in state["attendance"].items():
+            self.mark_attendance(date, statuses)
+        self.set_photos(state["photos"])
+        self.next_id = max(self.next_id, state["next_id"])
+        logging.info(f"Restored {len(self.students)} students from {backup_dir} as of {state['time']}")
+        return state["time"]
+
+
+def paginate(iterable, page_size):
+    """Yield lists of up to page_size items from an iterable."""
+    iterator = iter(iterable)
+    while True:
+        page = list(itertools.islice(iterator, page_size))
+        if not page:
+            return
+        yield page
+
+
+def format_id_ranges(ids):
+    """Format student IDs compactly for log messages, e.g. '1-3, 7'."""
+    ranges = []
+    for student_id in sorted(ids):
+        if ranges and student_id == ranges[-1][1] + 1:
+            ranges[-1][1] = student_id
+        else:
+            ranges.append([student_id, student_id])
+    return ", ".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges) or "none"
 
 
 def get_integer_input(prompt):
@@ -193,10 +1468,462 @@ def get_integer_input(prompt):
             print("Please enter a valid integer.")
 
 
-def main():
-    """Main function to run the student management system."""
-    sms = StudentManagementSystem()
+class OutputWriter:
+    """Writes command results as TSV or JSON Lines records."""
+    
+    def __init__(self, stream, output_format="tsv"):
+        """
+        Initialize the writer.
+        
+        Args:
+            stream: Text stream to write to
+            output_format (str): 'tsv' or 'jsonl'
+        """
+        self.stream = stream
+        self.output_format = output_format
+    
+    def format(self, record):
+        """Return one record (a dict) formatted as a single line."""
+        if self.output_format == "jsonl":
+            return json.dumps(record) + "\n"
+        return "\t".join(
+            str(value).replace("\t", " ").replace("\n", " ") for value in record.values()
+        ) + "\n"
+    
+    def write(self, record):
+        """Write one record (a dict) as a single line."""
+        self.stream.write(self.format(record))
     
+    def write_students(self, students, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Write one record per student.
+        
+        Students are consumed lazily and written with one write per page,
+        so memory stays flat for any roster size.
+        
+        Args:
+            students (iterable): Students to write
+            page_size (int): Number of students per write
+            
+        Returns:
+            Student: The last student written (the next page's cursor), or None
+        """
+        last = None
+        for page in paginate(students, page_size):
+            self.stream.write("".join(
+                self.format(dict(zip(STUDENT_FIELDS, student.as_row()))) for student in page
+            ))
+            last = page[-1]
+        return last
+
+
+class BatchRunner:
+    """Runs CLI commands against a StudentManagementSystem without prompting."""
+    
+    def __init__(self, sms, writer, data_dir=None):
+        """
+        Initialize the runner.
+        
+        Args:
+            sms (StudentManagementSystem): System to operate on
+            writer (OutputWriter): Where command results are written
+            data_dir (str, optional): The --data-dir the roster is loaded
+                from and saved to
+        """
+        self.sms = sms
+        self.writer = writer
+        self.data_dir = data_dir
+        self.modified = False
+    
+    def run(self, args):
+        """
+        Run one parsed command.
+        
+        Args:
+            args (argparse.Namespace): Parsed command line
+            
+        Returns:
+            int: Exit status of the command
+        """
+        try:
+            return getattr(self, f"cmd_{args.command.replace('-', '_')}")(args)
+        except (ValueError, OSError) as e:
+            logging.error(f"Error running {args.command}: {e}")
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_FAILURE
+    
+    def run_script(self, stream, parser, stop_on_error=False):
+        """
+        Run one command per line from a script.
+        
+        Blank lines and lines starting with '#' are ignored.
+        
+        Args:
+            stream: Text stream of commands
+            parser (argparse.ArgumentParser): Parser for a single command
+            stop_on_error (bool): Stop at the first failing command
+            
+        Returns:
+            int: Status of the first failing command, or EXIT_OK
+        """
+        status = EXIT_OK
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            
+            try:
+                args = parser.parse_args(shlex.split(line))
+                line_status = self.run(args)
+            except SystemExit:
+                # argparse has already reported the problem on stderr
+                print(f"Error: invalid command on line {line_number}: {line}", file=sys.stderr)
+                line_status = EXIT_USAGE
+            except ValueError as e:
+                print(f"Error: line {line_number}: {e}", file=sys.stderr)
+                line_status = EXIT_USAGE
+            
+            if line_status != EXIT_OK:
+                status = status or line_status
+                if stop_on_error:
+                    break
+        return status
+    
+    def report_errors(self, errors):
+        """Print batch validation errors to stderr."""
+        for key, messages in errors.items():
+            print(f"Error: {key}: {'; '.join(messages)}", file=sys.stderr)
+    
+    def cmd_add(self, args):
+        """Add a student."""
+        ids, errors = self.sms.add_many([{
+            "name": args.name, "age": args.age, "grade": args.grade, "phone": args.phone, "email": args.email
+        }])
+        if errors:
+            self.report_errors({"add": errors[0]})
+            return EXIT_FAILURE
+        self.modified = True
+        self.writer.write_students([self.sms.students[ids[0]]])
+        return EXIT_OK
+    
+    def cmd_get(self, args):
+        """Write the given students."""
+        self.sms.ensure_loaded(args.ids)
+        found = [self.sms.students[student_id] for student_id in args.ids if student_id in self.sms.students]
+        self.writer.write_students(found)
+        return EXIT_OK if len(found) == len(args.ids) else EXIT_NOT_FOUND
+    
+    def cmd_update(self, args):
+        """Update fields of a student."""
+        changes = {field: getattr(args, field) for field in ("name", "age", "grade", "phone", "email")
+                   if getattr(args, field) is not None}
+        updated, errors = self.sms.update_many({args.id: changes})
+        if errors:
+            self.report_errors(errors)
+            return EXIT_NOT_FOUND if args.id not in self.sms.students else EXIT_FAILURE
+        self.modified = True
+        self.writer.write_students([self.sms.students[args.id]])
+        return EXIT_OK
+    
+    def cmd_delete(self, args):
+        """Delete the given students."""
+        deleted, missing = self.sms.delete_many(args.ids)
+        self.modified = self.modified or bool(deleted)
+        for student_id in deleted:
+            self.writer.write({"id": student_id, "deleted": True})
+        for student_id in missing:
+            self.writer.write({"id": student_id, "deleted": False})
+        return EXIT_NOT_FOUND if missing else EXIT_OK
+    
+    def cmd_list(self, args):
+        """Write students page by page, optionally starting after a cursor."""
+        students = self.sms.iter_students(args.sort, args.after_id, args.descending)
+        if args.pages:
+            students = itertools.islice(students, args.pages * args.page_size)
+        
+        last = self.writer.write_students(students, args.page_size)
+        self.writer.stream.flush()
+        if args.pages and last is not None:
+            # Tell scripted callers where the next page starts
+            print(f"next-after-id\t{last.id}", file=sys.stderr)
+        return EXIT_OK
+    
+    def cmd_search(self, args):
+        """Write students matching a search text."""
+        self.writer.write_students(self.sms.search(args.text, args.by))
+        return EXIT_OK
+    
+    def cmd_import(self, args):
+        """Import students from a CSV file."""
+        counts, errors = self.sms.import_csv(args.file, remove_missing=args.remove_missing)
+        self.modified = self.modified or any(counts[name] for name in ("added", "updated", "removed"))
+        # Data rows start on line 2, after the header
+        self.report_errors({f"row {index + 2}": messages for index, messages in errors.items()})
+        self.writer.write(dict(counts, rejected=len(errors)))
+        return EXIT_FAILURE if errors else EXIT_OK
+    
+    def cmd_duplicates(self, args):
+        """Write every phone number and email address shared by several students."""
+        duplicates = self.sms.find_duplicates()
+        for duplicate in duplicates:
+            if self.writer.output_format == "tsv":
+                duplicate = dict(duplicate, ids=" ".join(map(str, duplicate["ids"])))
+            self.writer.write(duplicate)
+        return EXIT_FAILURE if duplicates else EXIT_OK
+    
+    def cmd_sync_export(self, args):
+        """Write the changes made after a sequence number as a changeset."""
+        exported = self.sms.export_changes(args.file, args.since)
+        # Save so the sequence numbers the changeset refers to persist
+        self.modified = True
+        self.writer.write({"exported": exported, "since": args.since, "sequence": self.sms.changes.sequence})
+        return EXIT_OK
+    
+    def cmd_sync_apply(self, args):
+        """Apply a changeset exported by another instance."""
+        counts, conflicts = self.sms.apply_changes(args.file)
+        self.modified = self.modified or bool(counts["applied"])
+        self.report_errors(conflicts)
+        self.writer.write(counts)
+        return EXIT_FAILURE if conflicts else EXIT_OK
+    
+    def cmd_report(self, args):
+        """Write a report defined on the command line."""
+        try:
+            spec = ReportSpec("report", args.group_by or (), args.aggregates or ("count",),
+                              [parse_condition(condition) for condition in args.where or ()],
+                              (args.date_from, args.date_to))
+        except ValueError as e:
+            # An invalid spec is a usage error, not a failed command
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        rows = self.sms.run_reports([spec])["report"]
+        if self.writer.output_format == "tsv" and rows:
+            # Columns depend on the report, so TSV output starts with a header
+            self.writer.write({column: column for column in rows[0]})
+        for row in rows:
+            self.writer.write(row)
+        return EXIT_OK
+    
+    def cmd_at_risk(self, args):
+        """Write the students with the lowest attendance rates."""
+        for student in self.sms.at_risk_students(args.n, args.grade, args.per_grade, args.date_from, args.date_to):
+            self.writer.write(student)
+        return EXIT_OK
+    
+    def cmd_percentiles(self, args):
+        """Write percentiles of the ages and attendance rates from the maintained sketches."""
+        sketches = self.sms.percentile_sketches()
+        try:
+            # Computed before writing, so an invalid Q leaves no partial output
+            rows = [{"field": field, "percentile": q, "value": sketch.percentile(q), "max_error": sketch.max_error}
+                    for field, sketch in sketches.items() for q in args.q or (10, 25, 50, 75, 90)]
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        for row in rows:
+            self.writer.write(row)
+        return EXIT_OK
+    
+    def cmd_backup(self, args):
+        """Take a point-in-time snapshot."""
+        snapshot = self.sms.backup(args.dir, args.full)
+        if snapshot is None:
+            self.writer.write({"kind": None, "records": 0, "file": None})
+        else:
+            self.writer.write({field: snapshot[field] for field in ("kind", "records", "file")})
+        return EXIT_OK
+    
+    def cmd_restore(self, args):
+        """Restore the roster as of a point in time into an empty data directory."""
+        restored_time = self.sms.restore_backup(args.dir, args.at)
+        self.modified = True
+        self.writer.write({"restored": len(self.sms.students), "as_of": restored_time})
+        return EXIT_OK
+    
+    def cmd_shard(self, args):
+        """Switch the data directory to one shard per grade."""
+        # Script lines have no --data-dir of their own
+        data_dir = getattr(args, "data_dir", None) or self.data_dir
+        if not data_dir:
+            raise ValueError("shard needs --data-dir")
+        grades = self.sms.shard(data_dir)
+        # The shards are written when the roster is saved
+        self.modified = True
+        self.writer.write({"grades": grades, "students": len(self.sms.students), "data_dir": data_dir})
+        return EXIT_OK
+    
+    def cmd_export(self, args):
+        """Export all students to a CSV file."""
+        exported = self.sms.export_csv(args.file)
+        self.writer.write({"exported": exported, "file": args.file})
+        return EXIT_OK
+
+
+def positive_int(text):
+    """argparse type for a positive integer."""
+    value = int(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError("must be a positive integer")
+    return value
+
+
+def add_command_parsers(subparsers):
+    """Register the non-interactive commands on an argparse subparsers object."""
+    add = subparsers.add_parser("add", help="add a student")
+    add.add_argument("--name", required=True)
+    add.add_argument("--age", required=True)
+    add.add_argument("--grade", required=True)
+    add.add_argument("--phone", required=True)
+    add.add_argument("--email", required=True)
+    
+    get = subparsers.add_parser("get", help="show students by ID")
+    get.add_argument("ids", nargs="+", type=int, metavar="ID")
+    
+    update = subparsers.add_parser("update", help="update fields of a student")
+    update.add_argument("id", type=int)
+    update.add_argument("--name")
+    update.add_argument("--age")
+    update.add_argument("--grade")
+    update.add_argument("--phone")
+    update.add_argument("--email")
+    
+    delete = subparsers.add_parser("delete", help="delete students by ID")
+    delete.add_argument("ids", nargs="+", type=int, metavar="ID")
+    
+    list_parser = subparsers.add_parser("list", help="list students page by page")
+    list_parser.add_argument("--page-size", type=positive_int, default=DEFAULT_PAGE_SIZE,
+                             help=f"students per page (default: {DEFAULT_PAGE_SIZE})")
+    list_parser.add_argument("--after-id", type=int, help="start after the student with this ID")
+    list_parser.add_argument("--sort", choices=tuple(FIELD_KEYS), default="id")
+    list_parser.add_argument("--descending", action="store_true")
+    list_parser.add_argument("--pages", type=positive_int, help="stop after this many pages")
+    
+    search = subparsers.add_parser("search", help="search students")
+    search.add_argument("text")
+    search.add_argument("--by", choices=("name", "id", "grade"), default="name")
+    
+    import_parser = subparsers.add_parser("import", help="add or update students from CSV")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--remove-missing", action="store_true",
+                               help="delete students that are not in the file")
+    
+    export = subparsers.add_parser("export", help="export students to CSV")
+    export.add_argument("file")
+    
+    subparsers.add_parser("duplicates", help="report phone numbers and emails shared by several students")
+    
+    sync_export = subparsers.add_parser("sync-export", help="write changes since a sequence number for another instance")
+    sync_export.add_argument("file")
+    sync_export.add_argument("--since", type=int, default=0,
+                             help="sequence number the other instance last applied (default: 0, everything)")
+    
+    sync_apply = subparsers.add_parser("sync-apply", help="apply a changeset from another instance")
+    sync_apply.add_argument("file")
+    
+    subparsers.add_parser("shard", help="split the --data-dir roster into one file per grade")
+    
+    report = subparsers.add_parser("report", help="group and aggregate students or attendance")
+    report.add_argument("--group-by", action="append", metavar="FIELD",
+                        help="field to group by, e.g. grade, age_band, date (repeatable)")
+    report.add_argument("--agg", action="append", dest="aggregates", metavar="AGGREGATE",
+                        help="count, percentage, mean:FIELD, min:FIELD, max:FIELD, pNN:FIELD, first:FIELD, "
+                             "present, absent, marked or attendance_rate (repeatable, default: count)")
+    report.add_argument("--where", action="append", metavar="CONDITION",
+                        help="filter such as 'age >= 10' or 'grade in Grade 1,Grade 2' (repeatable)")
+    report.add_argument("--from", dest="date_from", metavar="DATE", help="first attendance date to count")
+    report.add_argument("--to", dest="date_to", metavar="DATE", help="last attendance date to count")
+    
+    at_risk = subparsers.add_parser("at-risk", help="students with the lowest attendance rates")
+    at_risk.add_argument("-n", type=positive_int, default=10, help="students to show (default: 10)")
+    at_risk.add_argument("--grade", help="only this grade")
+    at_risk.add_argument("--per-grade", action="store_true", help="show the lowest N of every grade")
+    at_risk.add_argument("--from", dest="date_from", metavar="DATE", help="first attendance date to count")
+    at_risk.add_argument("--to", dest="date_to", metavar="DATE", help="last attendance date to count")
+    
+    percentiles = subparsers.add_parser("percentiles", help="percentiles of ages and attendance rates")
+    percentiles.add_argument("--q", action="append", type=float, metavar="Q",
+                             help="percentile between 0 and 100 (repeatable, default: 10 25 50 75 90)")
+    
+    backup = subparsers.add_parser("backup", help="take a snapshot (a delta of the changes since the last one)")
+    backup.add_argument("dir", help="backup directory")
+    backup.add_argument("--full", action="store_true", help="take a full snapshot")
+    
+    restore = subparsers.add_parser("restore", help="restore a snapshot into an empty --data-dir")
+    restore.add_argument("dir", help="backup directory")
+    restore.add_argument("--at", type=parse_time, metavar="TIME",
+                         help="point in time, YYYY-MM-DD[THH:MM[:SS]] (default: latest snapshot)")
+
+
+def build_parser():
+    """Build the command line parser for main.py."""
+    parser = argparse.ArgumentParser(
+        description="Student Management System. Runs the interactive menu when no command is given."
+    )
+    parser.add_argument("--data-dir", help="directory the roster is loaded from and saved to")
+    parser.add_argument("--grade", action="append", dest="grades", metavar="GRADE",
+                        help="with a sharded --data-dir, load only this grade up front (repeatable)")
+    parser.add_argument("--format", choices=("tsv", "jsonl"), default="tsv", dest="output_format",
+                        help="output format for command results (default: tsv)")
+    parser.add_argument("--log-mode", choices=LOG_MODES, default="all",
+                        help="how per-record changes are logged by commands (default: all)")
+    parser.add_argument("--log-sample", type=positive_int, default=100,
+                        help="with --log-mode sample, log one change in this many (default: 100)")
+    parser.add_argument("--share", metavar="NAME",
+                        help="publish the roster to shared memory under NAME for other local processes")
+    
+    subparsers = parser.add_subparsers(dest="command")
+    add_command_parsers(subparsers)
+    
+    script = subparsers.add_parser("script", help="run one command per line from a file or stdin")
+    script.add_argument("file", nargs="?", default="-", help="command file, '-' for stdin (default)")
+    script.add_argument("--stop-on-error", action="store_true", help="stop at the first failing command")
+    
+    return parser
+
+
+def build_script_parser():
+    """Build the parser for a single line of a command script."""
+    parser = argparse.ArgumentParser(prog="script", add_help=False)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_command_parsers(subparsers)
+    return parser
+
+
+def run_batch(sms, args):
+    """
+    Run a command or script non-interactively.
+    
+    Args:
+        sms (StudentManagementSystem): System to operate on
+        args (argparse.Namespace): Parsed command line
+        
+    Returns:
+        int: Exit status
+    """
+    runner = BatchRunner(sms, OutputWriter(sys.stdout, args.output_format), args.data_dir)
+    
+    if args.command == "script":
+        if args.file == "-":
+            status = runner.run_script(sys.stdin, build_script_parser(), args.stop_on_error)
+        else:
+            try:
+                with open(args.file, 'r') as script_file:
+                    status = runner.run_script(script_file, build_script_parser(), args.stop_on_error)
+            except OSError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return EXIT_FAILURE
+    else:
+        status = runner.run(args)
+    
+    if args.data_dir and runner.modified:
+        sms.save(args.data_dir)
+    sms.publish_shared()
+    return status
+
+
+def run_interactive(sms):
+    """Run the input()-driven menu loop."""
     while True:
         print("\nStudent Management System")
         print("=" * 30)
@@ -229,6 +1956,7 @@ def main():
             sms.delete_student(student_id)
             
         elif choice == '6':
+            sms.publish_shared()
             logging.info("Exiting program...")
             print("Thank you for using the Student Management System. Goodbye!")
             break
@@ -236,7 +1964,45 @@ def main():
         else:
             logging.warning("Invalid choice.")
             print("Invalid choice. Please enter a number between 1 and 6.")
+        
+        # Let attached processes see the change
+        sms.publish_shared()
+
+
+def main(argv=None):
+    """
+    Main function to run the student management system.
+    
+    Args:
+        argv (list, optional): Command line arguments, defaults to sys.argv
+        
+    Returns:
+        int: Exit status
+    """
+    args = build_parser().parse_args(argv)
+    configure_logging()
+    sms = StudentManagementSystem()
+    if args.data_dir:
+        try:
+            sms.load(args.data_dir, args.grades)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_USAGE
+    if args.share:
+        sms.share(args.share)
+    
+    try:
+        if args.command:
+            with bulk_logging(args.log_mode, args.log_sample):
+                return run_batch(sms, args)
+        
+        run_interactive(sms)
+        if args.data_dir:
+            sms.save(args.data_dir)
+        return EXIT_OK
+    finally:
+        sms.stop_sharing()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+# Supported photo file extensions (matches the GUI photo dialogs)
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp")
+
+# Largest size any photo is displayed at in the GUI
+THUMBNAIL_SIZE = (150, 150)
+
+# Folder of a data directory that thumbnails are written to
+THUMBNAILS_FOLDER = "thumbnails"
+
+# Thumbnail folder used when the roster has no data directory
+DEFAULT_THUMBNAIL_DIR = os.path.join(os.path.expanduser("~"), ".student_management", THUMBNAILS_FOLDER)
+
+
+def thumbnail_folder(data_dir=None):
+    """Return the folder thumbnails are written to for a data directory (or none)."""
+    return os.path.join(data_dir, THUMBNAILS_FOLDER) if data_dir else DEFAULT_THUMBNAIL_DIR
+
+
+def normalize_photo_key(text):
+    """Normalize a file stem or student name for matching."""
+    for separator in ("_", "-", "."):
+        text = text.replace(separator, " ")
+    return " ".join(text.lower().split())
+
+
+def match_photos(directory, students):
+    """
+    Match photo files in a directory to students by ID or name.
+
+    A file named "12.jpg" matches the student with ID 12, while a file named
+    "john_doe.png" matches the student named "John Doe". Each student gets
+    at most one photo: a match by ID wins over a match by name, then the
+    first file name in sorted order, and the other files are reported as
+    failures. Thumbnails are named by student ID, so this also keeps two
+    workers from writing the same thumbnail.
+
+    Args:
+        directory (str): Directory to scan
+        students (dict): Mapping of student ID to Student
+
+    Returns:
+        tuple: (matches, failures) where matches is a list of
+            (student_id, path) pairs and failures a list of (path, reason)
+    """
+    # Build the name lookup once instead of scanning students per file
+    names = {}
+    for student_id, student in students.items():
+        key = normalize_photo_key(student.name)
+        names[key] = None if key in names else student_id
+
+    # Per student: (match rank, path), rank 0 for an ID match, 1 for a name match
+    matched = {}
+    failures = []
+
+    with os.scandir(directory) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if not entry.is_file():
+                continue
+            stem, extension = os.path.splitext(entry.name)
+            if extension.lower() not in PHOTO_EXTENSIONS:
+                continue
+
+            if stem.isdigit():
+                student_id = int(stem)
+                if student_id not in students:
+                    failures.append((entry.path, f"No student with ID: {student_id}"))
+                    continue
+                match = (0, entry.path)
+            else:
+                key = normalize_photo_key(stem)
+                if key not in names:
+                    failures.append((entry.path, f"No student named: {stem}"))
+                    continue
+                if names[key] is None:
+                    failures.append((entry.path, f"Ambiguous student name: {stem}"))
+                    continue
+                student_id = names[key]
+                match = (1, entry.path)
+
+            kept = matched.setdefault(student_id, match)
+            if kept is not match:
+                if match < kept:
+                    matched[student_id], match = match, kept
+                failures.append((match[1], f"Student ID {student_id} already has a photo: "
+                                           f"{os.path.basename(matched[student_id][1])}"))
+
+    matches = [(student_id, path) for student_id, (_, path) in matched.items()]
+    return matches, failures
+
+
+def process_photo(task):
+    """
+    Decode, validate and thumbnail a single photo.
+
+    Runs in a worker process, so Pillow is imported here rather than by
+    the caller.
+
+    Args:
+        task (tuple): (student_id, path, thumbnail_dir)
+
+    Returns:
+        tuple: (student_id, path, thumbnail_path, error)
+    """
+    student_id, path, thumbnail_dir = task
+    try:
+        from PIL import Image
+
+        # verify() detects truncated or corrupt files but leaves the
+        # image unusable, so the file is opened a second time to decode it
+        with Image.open(path) as img:
+            img.verify()
+        with Image.open(path) as img:
+            img.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA")
+            thumbnail_path = os.path.join(thumbnail_dir, f"{student_id}.png")
+            img.save(thumbnail_path, "PNG")
+        return student_id, path, thumbnail_path, None
+    except Exception as e:
+        return student_id, path, None, str(e)
+
+
+class PhotoImportResult:
+    """Outcome of a bulk photo import."""
+
+    def __init__(self):
+        """Initialize an empty result."""
+        self.photos = {}
+        self.failures = []
+        self.scanned = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """Photos processed per second."""
+        return self.scanned / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        """Return a one-line summary of the import."""
+        return (f"Imported {len(self.photos)} of {self.scanned} photos "
+                f"({len(self.failures)} failed) in {self.elapsed:.2f}s "
+                f"({self.throughput:.1f} photos/s)")
+
+
+def import_photos(directory, students, thumbnail_dir, max_workers=None):
+    """
+    Import all photos in a directory for the given students.
+
+    Files are matched to students by ID or name, then decoded, validated
+    and thumbnailed in a process pool. Nothing is attached to the students;
+    the caller applies result.photos in one batch.
+
+    Args:
+        directory (str): Directory containing the photos
+        students (dict): Mapping of student ID to Student
+        thumbnail_dir (str): Where thumbnails are written, e.g.
+            thumbnail_folder(data_dir); never inside the source directory
+        max_workers (int, optional): Number of worker processes
+
+    Returns:
+        PhotoImportResult: Thumbnail paths by student ID plus failures
+    """
+    start = time.perf_counter()
+    result = PhotoImportResult()
+
+    matches, result.failures = match_photos(directory, students)
+    result.scanned = len(matches) + len(result.failures)
+
+    if matches:
+        os.makedirs(thumbnail_dir, exist_ok=True)
+
+        tasks = [(student_id, path, thumbnail_dir) for student_id, path in matches]
+        workers = max_workers or os.cpu_count() or 1
+        # Large chunks keep the per-task IPC overhead low for thousands of files
+        chunksize = max(1, len(tasks) // (workers * 4))
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for student_id, path, thumbnail_path, error in executor.map(process_photo, tasks, chunksize=chunksize):
+                if error:
+                    result.failures.append((path, error))
+                else:
+                    result.photos[student_id] = thumbnail_path
+
+    result.elapsed = time.perf_counter() - start
+    logging.info(f"Bulk photo import from {directory}: {result.summary()}")
+    return result
@@ -0,0 +1,560 @@
+import heapq
+import operator
+import re
+from operator import itemgetter
+
+from grades import GRADES
+
+# Positions of the fields in a scanned record: a student's as_row() followed
+# by the attendance date and status (for per-mark reports) and the number of
+# days the student was present and marked
+RECORD_FIELDS = ("id", "name", "age", "grade", "phone", "email", "date", "status", "present", "marked")
+
+# Position of the grade's code (see grades.GRADES) in a scanned record, after
+# the named fields; grade filters and group keys read it instead of the name
+GRADE_CODE = len(RECORD_FIELDS)
+
+# Fields that only exist per attendance mark; a spec using them is evaluated
+# once per mark instead of once per student
+MARK_FIELDS = ("date", "status")
+
+# Fields whose values are compared as integers in parsed conditions
+INTEGER_FIELDS = ("id", "age", "present", "marked")
+
+# Fields the numeric aggregates (mean, min, max, pNN) accept
+NUMERIC_FIELDS = INTEGER_FIELDS + ("age_band",)
+
+# Width of the 'age_band' group, in years
+AGE_BAND_WIDTH = 5
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "<": operator.lt,
+    ">": operator.gt,
+    "in": lambda value, options: value in options,
+    "contains": lambda value, text: text.lower() in str(value).lower()
+}
+
+CONDITION_PATTERN = re.compile(r"\s*(\w+)\s*(==|!=|<=|>=|<|>|\bin\b|\bcontains\b)\s*(.*?)\s*$")
+
+
+def field_getter(field):
+    """
+    Return a function reading a field from a scanned record.
+
+    Raises:
+        ValueError: If the field is unknown
+    """
+    if field == "age_band":
+        age = RECORD_FIELDS.index("age")
+        return lambda record: record[age] // AGE_BAND_WIDTH * AGE_BAND_WIDTH
+    if field not in RECORD_FIELDS:
+        raise ValueError(f"Unknown report field: {field} (available: {', '.join(RECORD_FIELDS)}, age_band)")
+    return itemgetter(RECORD_FIELDS.index(field))
+
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of a list by linear interpolation, or None if empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def in_date_range(dates, date):
+    """Return True if a YYYY-MM-DD date is within an inclusive (first, last) range with optional ends."""
+    first, last = dates
+    return (first is None or date >= first) and (last is None or date <= last)
+
+
+def parse_condition(text):
+    """
+    Parse a filter condition such as 'age >= 10' or 'grade in Grade 1,Grade 2'.
+
+    Returns:
+        tuple: (field, operator, value) for ReportSpec's where
+
+    Raises:
+        ValueError: If the condition cannot be parsed
+    """
+    match = CONDITION_PATTERN.fullmatch(text)
+    if not match:
+        raise ValueError(f"Invalid condition: {text} (expected FIELD OP VALUE, OP one of {', '.join(OPERATORS)})")
+    field, op, value = match.groups()
+    convert = int if field in INTEGER_FIELDS and op != "contains" else str
+    try:
+        value = tuple(convert(option.strip()) for option in value.split(",")) if op == "in" else convert(value)
+    except ValueError:
+        raise ValueError(f"Invalid condition: {text} ({field} takes whole numbers)")
+    return field, op, value
+
+
+class Aggregate:
+    """
+    One aggregate column of a report spec, written as 'function[:field]'.
+
+    count                 Records in the group
+    percentage            Share of the spec's records in the group
+    mean/min/max:FIELD    Over a numeric field (see NUMERIC_FIELDS)
+    pNN:FIELD             NN-th percentile of a field (e.g. p50:age)
+    first:FIELD           A field's value, for groups of one (e.g. by id)
+    present/absent/marked Attendance days
+    attendance_rate       Present days as a percentage of marked days
+    """
+
+    FUNCTIONS = ("count", "percentage", "mean", "min", "max", "percentile", "first",
+                 "present", "absent", "marked", "attendance_rate")
+    FIELD_FUNCTIONS = ("mean", "min", "max", "percentile", "first")
+    NUMERIC_FUNCTIONS = ("mean", "min", "max", "percentile")
+    ATTENDANCE_FUNCTIONS = ("present", "absent", "marked", "attendance_rate")
+
+    def __init__(self, text):
+        """
+        Parse an aggregate.
+
+        Raises:
+            ValueError: If the function or field is unknown or missing
+        """
+        self.text = text
+        name, _, field = text.partition(":")
+        self.quantile = None
+        match = re.fullmatch(r"p(\d+(?:\.\d+)?)", name)
+        if match:
+            name = "percentile"
+            self.quantile = float(match.group(1))
+            if self.quantile > 100:
+                raise ValueError(f"Percentile must be between 0 and 100: {text}")
+        if name not in self.FUNCTIONS:
+            available = ", ".join("pNN" if function == "percentile" else function for function in self.FUNCTIONS)
+            raise ValueError(f"Unknown aggregate: {text} (available: {available})")
+        if (name in self.FIELD_FUNCTIONS) != bool(field):
+            raise ValueError(f"Aggregate {name} " + ("needs a field, e.g. mean:age" if not field else "takes no field"))
+        if field:
+            field_getter(field)
+        if name in self.NUMERIC_FUNCTIONS and field not in NUMERIC_FIELDS:
+            raise ValueError(f"Aggregate {text} needs a numeric field (one of {', '.join(NUMERIC_FIELDS)})")
+        self.function = name
+        self.field = field or None
+
+    def initial(self):
+        """Return the empty accumulator of the aggregate."""
+        if self.function in ("mean",) + self.ATTENDANCE_FUNCTIONS:
+            return [0, 0]
+        if self.function == "percentile":
+            return []
+        return 0 if self.function in ("count", "percentage") else None
+
+    def merge(self, slot, other):
+        """Combine two accumulators of the aggregate."""
+        if self.function in ("count", "percentage"):
+            return slot + other
+        if self.function in ("mean",) + self.ATTENDANCE_FUNCTIONS:
+            return [slot[0] + other[0], slot[1] + other[1]]
+        if self.function == "percentile":
+            return slot + other
+        if slot is None or other is None:
+            return other if slot is None else slot
+        if self.function == "min":
+            return min(slot, other)
+        if self.function == "max":
+            return max(slot, other)
+        return slot
+
+    def result(self, slot, total):
+        """Return the aggregate's value from its accumulator and the spec's record count."""
+        function = self.function
+        if function == "count":
+            return slot
+        if function == "percentage":
+            return slot / total * 100 if total else 0
+        if function == "mean":
+            return slot[0] / slot[1] if slot[1] else None
+        if function == "percentile":
+            return percentile(slot, self.quantile)
+        if function == "present":
+            return slot[0]
+        if function == "absent":
+            return slot[1] - slot[0]
+        if function == "marked":
+            return slot[1]
+        if function == "attendance_rate":
+            return slot[0] / slot[1] * 100 if slot[1] else None
+        return slot
+
+
+class ReportSpec:
+    """
+    Declarative description of a report.
+
+    Records that pass every 'where' condition are grouped by the 'group_by'
+    fields, and each group gets one row with its group fields and the
+    aggregate columns. Records are students, or attendance marks joined to
+    their student if the spec uses 'date' or 'status'. Attendance counts
+    only include marks within 'dates'.
+    """
+
+    def __init__(self, name, group_by=(), aggregates=("count",), where=(), dates=None):
+        """
+        Initialize the spec.
+
+        Args:
+            name (str): Name of the report in the results
+            group_by (sequence): Fields to group by, e.g. ('grade',);
+                empty for one row over all records
+            aggregates (sequence): Aggregate texts, see Aggregate
+            where (sequence): (field, operator, value) conditions, see
+                OPERATORS and parse_condition()
+            dates (tuple, optional): Inclusive (first, last) YYYY-MM-DD
+                dates; either may be None for an open end
+
+        Raises:
+            ValueError: If a field, aggregate or operator is unknown
+        """
+        self.name = name
+        self.group_by = tuple(group_by)
+        self.aggregates = [Aggregate(text) for text in aggregates]
+        self.where = tuple(tuple(condition) for condition in where)
+        self.dates = tuple(dates) if dates else (None, None)
+        for field in self.group_by:
+            field_getter(field)
+        for field, op, _ in self.where:
+            field_getter(field)
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator: {op} (available: {', '.join(OPERATORS)})")
+
+        fields = set(self.group_by) | {field for field, _, _ in self.where}
+        fields.update(aggregate.field for aggregate in self.aggregates)
+        self.per_mark = bool(fields & set(MARK_FIELDS))
+        self.uses_attendance = bool(fields & {"present", "marked"}) or any(
+            aggregate.function in Aggregate.ATTENDANCE_FUNCTIONS for aggregate in self.aggregates)
+
+
+class ReportEngine:
+    """
+    Evaluates several report specs in one fused scan.
+
+    The attendance marks are read once, feeding the per-mark specs and the
+    per-student attendance counts every date range needs, and then the
+    students are read once, feeding all per-student specs. Group
+    accumulators merge, so parts of the roster (e.g. grade shards) can be
+    scanned separately, even in other processes, and combined with merge().
+    """
+
+    def __init__(self, specs):
+        """
+        Initialize the engine.
+
+        Args:
+            specs (iterable): ReportSpec objects, with distinct names
+        """
+        self.specs = list(specs)
+        # Per spec: accumulators by group key, and the number of records scanned
+        self.groups = [{} for _ in self.specs]
+        self.totals = [0] * len(self.specs)
+        # Positions of 'grade' in each spec's group key, which holds its code
+        self._grade_keys = [[index for index, field in enumerate(spec.group_by) if field == "grade"]
+                            for spec in self.specs]
+        self._plans = None
+
+    @staticmethod
+    def _condition(field, op, value):
+        """
+        Compile a condition into a (getter, operator, value) triple.
+
+        Grade equality, 'in' and 'contains' tests are resolved against the
+        distinct grades once, ignoring case and whitespace runs, and then
+        compare codes per record.
+        """
+        if field == "grade":
+            code = itemgetter(GRADE_CODE)
+            if op in ("==", "!="):
+                return code, OPERATORS[op], GRADES.lookup(value)
+            if op == "in":
+                return code, OPERATORS["in"], frozenset(GRADES.lookup(option) for option in value)
+            if op == "contains":
+                return code, OPERATORS["in"], GRADES.matching(value)
+        return field_getter(field), OPERATORS[op], value
+
+    @classmethod
+    def _plan(cls, spec):
+        """Compile a spec's conditions, group key and aggregate inputs into functions."""
+        conditions = [cls._condition(field, op, value) for field, op, value in spec.where]
+        key_getters = [itemgetter(GRADE_CODE) if field == "grade" else field_getter(field) for field in spec.group_by]
+        inputs = []
+        for aggregate in spec.aggregates:
+            if aggregate.function in Aggregate.ATTENDANCE_FUNCTIONS:
+                inputs.append(itemgetter(8, 9))
+            elif aggregate.field:
+                inputs.append(field_getter(aggregate.field))
+            else:
+                inputs.append(None)
+        return conditions, key_getters, inputs
+
+    def _add(self, position, record):
+        """Add one record to a spec's groups, if it passes the spec's conditions."""
+        conditions, key_getters, inputs = self._plans[position]
+        for getter, op, value in conditions:
+            if not op(getter(record), value):
+                return
+        self.totals[position] += 1
+        spec = self.specs[position]
+        key = tuple(getter(record) for getter in key_getters)
+        slots = self.groups[position].get(key)
+        if slots is None:
+            slots = self.groups[position][key] = [aggregate.initial() for aggregate in spec.aggregates]
+        for index, aggregate in enumerate(spec.aggregates):
+            function = aggregate.function
+            if function in ("count", "percentage"):
+                slots[index] += 1
+            elif function == "first":
+                if slots[index] is None:
+                    slots[index] = inputs[index](record)
+            elif function in Aggregate.ATTENDANCE_FUNCTIONS:
+                present, marked = inputs[index](record)
+                slots[index][0] += present
+                slots[index][1] += marked
+            else:
+                value = inputs[index](record)
+                if function == "mean":
+                    slots[index][0] += value
+                    slots[index][1] += 1
+                elif function == "percentile":
+                    slots[index].append(value)
+                elif slots[index] is None or (value < slots[index] if function == "min" else value > slots[index]):
+                    slots[index] = value
+
+    def scan(self, students, attendance_records):
+        """
+        Add students and their attendance to every spec.
+
+        Args:
+            students (iterable): Students (anything with as_row() and grade_code)
+            attendance_records (dict): Mapping of date to {student ID: status}
+        """
+        rows = {}
+        for student in students:
+            row = student.as_row()
+            rows[row[0]] = (row, student.grade_code)
+        # Compiled now rather than up front, so grade conditions see the
+        # grades of the students being scanned
+        self._plans = [self._plan(spec) for spec in self.specs]
+        per_mark = [position for position, spec in enumerate(self.specs) if spec.per_mark]
+        per_student = [position for position, spec in enumerate(self.specs) if not spec.per_mark]
+
+        # Attendance counts per distinct date range of the per-student specs
+        ranges = {self.specs[position].dates: {} for position in per_student if self.specs[position].uses_attendance}
+        for date, statuses in attendance_records.items():
+            counters = [counts for dates, counts in ranges.items() if in_date_range(dates, date)]
+            mark_specs = [position for position in per_mark if in_date_range(self.specs[position].dates, date)]
+            if not counters and not mark_specs:
+                continue
+            for student_id, status in statuses.items():
+                present = 1 if status == "Present" else 0
+                for counts in counters:
+                    count = counts.get(student_id)
+                    if count is None:
+                        counts[student_id] = [present, 1]
+                    else:
+                        count[0] += present
+                        count[1] += 1
+                entry = rows.get(student_id)
+                if entry is not None:
+                    row, code = entry
+                    for position in mark_specs:
+                        self._add(position, row + (date, status, present, 1, code))
+
+        no_marks = (0, 0)
+        for student_id, (row, code) in rows.items():
+            for position in per_student:
+                spec = self.specs[position]
+                present, marked = ranges[spec.dates].get(student_id, no_marks) if spec.uses_attendance else no_marks
+                self._add(position, row + (None, None, present, marked, code))
+
+    def _translate_keys(self, position, groups, function):
+        """Yield a spec's (key, slots) groups with function applied to the grade parts of the keys."""
+        grade_keys = self._grade_keys[position]
+        for key, slots in groups.items():
+            if grade_keys:
+                key = list(key)
+                for index in grade_keys:
+                    key[index] = function(key[index])
+                key = tuple(key)
+            yield key, slots
+
+    @property
+    def state(self):
+        """
+        Accumulators of every spec, picklable so workers can return them.
+
+        Grade codes only hold within one process, so group keys carry
+        grade names here.
+        """
+        groups = [dict(self._translate_keys(position, groups, GRADES.name))
+                  for position, groups in enumerate(self.groups)]
+        return groups, self.totals
+
+    def merge(self, state):
+        """
+        Combine the state of an engine that scanned other records with the same specs.
+
+        Returns:
+            ReportEngine: This engine
+        """
+        groups, totals = state
+        for position, spec in enumerate(self.specs):
+            self.totals[position] += totals[position]
+            mine = self.groups[position]
+            for key, slots in self._translate_keys(position, groups[position], GRADES.code):
+                if key in mine:
+                    mine[key] = [aggregate.merge(slot, other)
+                                 for aggregate, slot, other in zip(spec.aggregates, mine[key], slots)]
+                else:
+                    mine[key] = slots
+        return self
+
+    def results(self):
+        """
+        Return the rows of every report.
+
+        Returns:
+            dict: Report name to a list of row dicts (group fields, then
+                aggregate columns), sorted by the group fields
+        """
+        results = {}
+        for position, spec in enumerate(self.specs):
+            groups = dict(self._translate_keys(position, self.groups[position], GRADES.name))
+            if not spec.group_by and not groups:
+                groups = {(): [aggregate.initial() for aggregate in spec.aggregates]}
+            rows = []
+            for key in sorted(groups):
+                row = dict(zip(spec.group_by, key))
+                if "age_band" in row:
+                    row["age_band"] = f"{row['age_band']}-{row['age_band'] + AGE_BAND_WIDTH - 1}"
+                for aggregate, slot in zip(spec.aggregates, groups[key]):
+                    row[aggregate.text] = aggregate.result(slot, self.totals[position])
+                rows.append(row)
+            results[spec.name] = rows
+        return results
+
+
+class _HeapEntry:
+    """Entry of a bounded selection heap, ordered largest (key, position) first."""
+
+    __slots__ = ("key", "position", "item")
+
+    def __init__(self, key, position, item):
+        """Initialize an entry for an item with its sort key and stream position."""
+        self.key = key
+        self.position = position
+        self.item = item
+
+    def __lt__(self, other):
+        """Invert the order, so the heap's root is the largest kept item."""
+        return (self.key, self.position) > (other.key, other.position)
+
+
+def select_lowest(items, n, key, group=None):
+    """
+    Select the n items with the smallest key, overall or per group, by heap selection.
+
+    Only n items per group are kept in a heap while the items stream by, so
+    this is O(m log n) time for m items instead of sorting all of them, and
+    memory is n items per group. Ties keep the earlier item.
+
+    Args:
+        items (iterable): Items to select from
+        n (int): Items to keep per group
+        key (callable): Sort key of an item
+        group (callable, optional): Group of an item
+
+    Returns:
+        dict: Group (None without a group function) to its selected items,
+            in ascending key order
+    """
+    if group is None:
+        return {None: heapq.nsmallest(n, items, key=key)}
+    heaps = {}
+    for position, item in enumerate(items):
+        heap = heaps.setdefault(group(item), [])
+        entry = _HeapEntry(key(item), position, item)
+        if len(heap) < n:
+            heapq.heappush(heap, entry)
+        elif n:
+            # Replaces the largest kept item if this one is smaller
+            heapq.heappushpop(heap, entry)
+    return {name: [entry.item for entry in sorted(heaps[name], reverse=True)] for name in sorted(heaps)}
+
+
+def run_reports(specs, students, attendance_records):
+    """
+    Evaluate report specs over students and attendance in one fused scan.
+
+    Returns:
+        dict: Report name to rows, as returned by ReportEngine.results()
+    """
+    engine = ReportEngine(specs)
+    engine.scan(students, attendance_records)
+    return engine.results()
+
+
+# The built-in reports
+STUDENT_LIST = ReportSpec("students", ("id",), ("first:name", "first:age", "first:grade", "first:phone", "first:email"))
+GRADE_DISTRIBUTION = ReportSpec("grades", ("grade",), ("count", "percentage"))
+AGE_DISTRIBUTION = ReportSpec("ages", ("age",), ("count", "percentage"))
+AGE_STATISTICS = ReportSpec("age_statistics", (), ("count", "min:age", "max:age", "mean:age"))
+ATTENDANCE_BY_DATE = ReportSpec("attendance_by_date", ("date", "id"), ("first:name", "first:status"))
+ATTENDANCE_BY_STUDENT = ReportSpec("attendance_by_student", ("id",),
+                                   ("first:name", "present", "absent", "attendance_rate"), where=[("marked", ">", 0)])
+
+
+def grade_distribution(students):
+    """
+    Count students by grade.
+
+    Args:
+        students (iterable): Students (anything with as_row() and grade_code)
+
+    Returns:
+        list: Dicts with 'grade', 'count' and 'percentage', sorted by grade
+    """
+    return run_reports([GRADE_DISTRIBUTION], students, {})["grades"]
+
+
+def age_distribution(students):
+    """
+    Count students by age.
+
+    Args:
+        students (iterable): Students (anything with as_row() and grade_code)
+
+    Returns:
+        dict: 'ages' (dicts with 'age', 'count' and 'percentage', sorted
+            by age), plus 'min', 'max' and 'mean' (None for no students)
+    """
+    results = run_reports([AGE_DISTRIBUTION, AGE_STATISTICS], students, {})
+    statistics = results["age_statistics"][0]
+    return {"ages": results["ages"], "min": statistics["min:age"], "max": statistics["max:age"],
+            "mean": statistics["mean:age"]}
+
+
+def attendance_summary(students, attendance_records):
+    """
+    Count each student's present and absent days.
+
+    Args:
+        students (dict): Mapping of student ID to student
+        attendance_records (dict): Mapping of date to {student ID: status}
+
+    Returns:
+        list: Dicts with 'id', 'name', 'present', 'absent' and 'rate' (a
+            percentage) for every student with attendance, sorted by ID
+    """
+    return [{"id": row["id"], "name": row["first:name"], "present": row["present"], "absent": row["absent"],
+             "rate": row["attendance_rate"]}
+            for row in run_reports([ATTENDANCE_BY_STUDENT], students.values(), attendance_records)["attendance_by_student"]]
@@ -0,0 +1,117 @@
+from collections import Counter
+
+from sketches import age_histogram, attendance_rate_histogram
+
+
+class RosterStats:
+    """
+    Running aggregates over the roster and attendance.
+
+    Every update is O(1), so the dashboard can read the statistics without
+    scanning the students.
+    """
+
+    def __init__(self):
+        """Initialize empty statistics."""
+        self.count = 0
+        self.age_sum = 0
+        # Students per grade code (see grades.GRADES for the names)
+        self.grade_counts = Counter()
+        self.age_histogram = Counter()
+        self.present_by_date = Counter()
+        self.marked_by_date = Counter()
+        # Percentile sketches of the ages and of each student's attendance rate
+        self.age_sketch = age_histogram()
+        self.rate_sketch = attendance_rate_histogram()
+        # [present, marked] days of each student with attendance, and the
+        # students on the roster (marks of deleted students are kept but not
+        # counted in the rate sketch)
+        self.student_attendance = {}
+        self.members = set()
+
+    def add(self, student):
+        """Count a student that was added to the roster."""
+        self.count += 1
+        self.age_sum += student.age
+        self.grade_counts[student.grade_code] += 1
+        self.age_histogram[student.age] += 1
+        self.age_sketch.add(student.age)
+        self.members.add(student.id)
+        self._count_rate(student.id, 1)
+
+    def remove(self, student):
+        """Stop counting a student that was removed or is about to change."""
+        self.count -= 1
+        self.age_sum -= student.age
+        self._decrement(self.grade_counts, student.grade_code)
+        self._decrement(self.age_histogram, student.age)
+        self.age_sketch.remove(student.age)
+        self._count_rate(student.id, -1)
+        self.members.discard(student.id)
+
+    def mark(self, date, old_status, new_status, student_id=None):
+        """
+        Record an attendance change for one student on a date.
+
+        Args:
+            date (str): Attendance date (YYYY-MM-DD)
+            old_status (str): Previous status, or None if not yet marked
+            new_status (str): New status, or None if the mark was removed
+            student_id (int, optional): Student the mark is for, to keep
+                their attendance rate up to date
+        """
+        if old_status is not None:
+            self._decrement(self.marked_by_date, date)
+            if old_status == "Present":
+                self._decrement(self.present_by_date, date)
+        if new_status is not None:
+            self.marked_by_date[date] += 1
+            if new_status == "Present":
+                self.present_by_date[date] += 1
+        if student_id is None:
+            return
+
+        self._count_rate(student_id, -1)
+        days = self.student_attendance.setdefault(student_id, [0, 0])
+        for status, change in ((old_status, -1), (new_status, 1)):
+            if status is not None:
+                days[1] += change
+                if status == "Present":
+                    days[0] += change
+        self._count_rate(student_id, 1)
+
+    def _count_rate(self, student_id, count):
+        """Add (count=1) or remove (count=-1) a roster student's attendance rate in the sketch."""
+        days = self.student_attendance.get(student_id)
+        if days and days[1] and student_id in self.members:
+            self.rate_sketch.add(days[0] / days[1] * 100, count)
+
+    @staticmethod
+    def _decrement(counter, key):
+        """Decrement a counter, dropping keys that reach zero."""
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    @property
+    def mean_age(self):
+        """Average age, or 0 for an empty roster."""
+        return self.age_sum / self.count if self.count else 0
+
+    @property
+    def age_range(self):
+        """(minimum, maximum) age, or None for an empty roster."""
+        if not self.age_histogram:
+            return None
+        return min(self.age_histogram), max(self.age_histogram)
+
+    def attendance_rate(self, date):
+        """
+        Fraction of marked students who were present on a date.
+
+        Returns:
+            tuple: (rate, present, marked), with rate None if nobody was marked
+        """
+        marked = self.marked_by_date[date]
+        present = self.present_by_date[date]
+        return (present / marked if marked else None), present, marked
@@ -0,0 +1,571 @@
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+import reports
+from logging_setup import configure_logging
+from indexes import FIELD_KEYS
+from main import StudentManagementSystem, STUDENT_FIELDS
+
+# The server only ever listens on the loopback interface
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Idle time after which a kept-alive connection is closed
+KEEPALIVE_TIMEOUT = 15
+
+# Longest a client may pause while sending the headers or body of a request
+READ_TIMEOUT = 60
+
+# Largest request body accepted
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# Reports served by GET /reports/<name>
+REPORTS = {
+    "grades": lambda students, attendance: reports.grade_distribution(students.values()),
+    "ages": lambda students, attendance: reports.age_distribution(students.values()),
+    "attendance": reports.attendance_summary
+}
+
+
+class HTTPError(Exception):
+    """An error answered with a JSON body and the given status."""
+
+    def __init__(self, status, message, errors=None):
+        """
+        Initialize the error.
+
+        Args:
+            status (HTTPStatus): Response status
+            message (str): Error message
+            errors (dict, optional): Per-record error messages
+        """
+        super().__init__(message)
+        self.status = status
+        self.errors = errors
+
+
+class Request:
+    """A parsed HTTP request."""
+
+    def __init__(self, method, target, version, headers, body):
+        """
+        Initialize the request.
+
+        Args:
+            method (str): Request method
+            target (str): Request target (path and query)
+            version (str): HTTP version, e.g. 'HTTP/1.1'
+            headers (dict): Headers with lower-cased names
+            body (bytes): Request body
+        """
+        self.method = method
+        url = urlsplit(target)
+        self.path = [part for part in url.path.split("/") if part]
+        self.query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        """True if the connection should stay open after the response."""
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self):
+        """
+        Return the decoded JSON body.
+
+        Raises:
+            HTTPError: If the body is not valid JSON
+        """
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON body: {e}")
+
+    def json_lines(self):
+        """
+        Return the decoded JSON Lines body as a list.
+
+        Raises:
+            HTTPError: If a line is not valid JSON
+        """
+        try:
+            return [json.loads(line) for line in self.body.splitlines() if line.strip()]
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON Lines body: {e}")
+
+    def int_query(self, name, default=None, minimum=0):
+        """
+        Return an integer query parameter.
+
+        Args:
+            name (str): Parameter name
+            default: Value if the parameter is absent
+            minimum (int): Smallest accepted value
+
+        Raises:
+            HTTPError: If the parameter is not an integer of at least minimum
+        """
+        value = self.query.get(name)
+        if value is None:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            number = None
+        if number is None or number < minimum:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Query parameter {name} must be an integer of at least {minimum}")
+        return number
+
+
+def student_record(student):
+    """Return a student as a JSON-ready dict, including its version."""
+    record = dict(zip(STUDENT_FIELDS, student.as_row()))
+    record["version"] = student.version
+    return record
+
+
+def parse_student_id(text):
+    """
+    Convert a path segment to a student ID.
+
+    Raises:
+        HTTPError: If the segment is not an integer
+    """
+    if not text.isdigit():
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"Invalid student ID: {text}")
+    return int(text)
+
+
+def parse_date(text):
+    """
+    Check that a path segment is a YYYY-MM-DD date.
+
+    Raises:
+        HTTPError: If it is not
+    """
+    try:
+        datetime.strptime(text, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid date: {text} (expected YYYY-MM-DD)")
+    return text
+
+
+class StudentServer:
+    """
+    HTTP/JSON front end to a StudentManagementSystem.
+
+    All requests are served by one asyncio event loop, so changes to the
+    system never overlap. Reports run in a thread pool on a snapshot of
+    the data so the loop keeps serving other clients. Lists
+    and searches stream JSON Lines with chunked encoding, and connections
+    are kept alive between requests.
+
+    Endpoints:
+        GET    /students                 List (sort, descending, after_id, limit)
+        POST   /students                 Add one student (JSON object)
+        POST   /students/bulk            Add many students (JSON Lines)
+        GET    /students/<id>            Get a student
+        PATCH  /students/<id>            Update fields of a student (If-Match: version)
+        DELETE /students/<id>            Delete a student
+        GET    /search                   Search (text, by)
+        GET    /attendance/<date>        Attendance for a date
+        POST   /attendance/<date>        Mark attendance ({id: status})
+        GET    /reports/<name>           grades, ages or attendance
+        POST   /save                     Save to the data directory
+    """
+
+    def __init__(self, sms, data_dir=None, max_workers=None, backup_dir=None, backup_interval=3600):
+        """
+        Initialize the server.
+
+        Args:
+            sms (StudentManagementSystem): System to serve
+            data_dir (str, optional): Directory POST /save writes to
+            max_workers (int, optional): Threads for running reports
+            backup_dir (str, optional): Directory to take scheduled snapshots in
+            backup_interval (float): Seconds between scheduled snapshots
+        """
+        self.sms = sms
+        self.data_dir = data_dir
+        self.backup_dir = backup_dir
+        self.backup_interval = backup_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.modified = False
+        # Handlers by method and path pattern, '*' standing for an ID or date
+        self.routes = {
+            ("GET", "students"): self.list_students,
+            ("POST", "students"): self.add_student,
+            ("POST", "students/bulk"): self.add_students,
+            ("GET", "students/*"): self.get_student,
+            ("PATCH", "students/*"): self.update_student,
+            ("DELETE", "students/*"): self.delete_student,
+            ("GET", "search"): self.search,
+            ("GET", "attendance/*"): self.get_attendance,
+            ("POST", "attendance/*"): self.mark_attendance,
+            ("GET", "reports/*"): self.report,
+            ("POST", "save"): self.save
+        }
+
+    async def serve(self, port=DEFAULT_PORT):
+        """Listen on localhost until cancelled."""
+        server = await asyncio.start_server(self.handle_connection, HOST, port)
+        logging.info(f"Serving on http://{HOST}:{port}")
+        print(f"Serving on http://{HOST}:{port}")
+        if self.backup_dir:
+            # Kept so the task is not garbage collected while it sleeps
+            self.backup_task = asyncio.create_task(self.take_backups())
+        async with server:
+            await server.serve_forever()
+
+    async def take_backups(self):
+        """Save and snapshot the roster every backup_interval seconds."""
+        while True:
+            await asyncio.sleep(self.backup_interval)
+            try:
+                if self.data_dir:
+                    # Saved first so the change log the delta refers to persists
+                    await self.in_executor(self.sms.save, self.data_dir)
+                    self.modified = False
+                await self.in_executor(self.sms.backup, self.backup_dir)
+            except (ValueError, OSError) as e:
+                logging.error(f"Scheduled backup to {self.backup_dir} failed: {e}")
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until it is closed or idle."""
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except HTTPError as e:
+                    await self.send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                await self.dispatch(request, writer)
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """
+        Read one request from a connection.
+
+        The connection may be idle for KEEPALIVE_TIMEOUT seconds before the
+        request starts; after that, the client may pause for READ_TIMEOUT
+        seconds at a time, so a slow upload is not cut off.
+
+        Returns:
+            Request: The request, or None if the client closed the connection
+
+        Raises:
+            HTTPError: If the request is malformed
+            asyncio.TimeoutError: If the client stays silent too long
+        """
+        request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = headers.get("content-length", "0")
+        if not length.isdigit():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if int(length) > MAX_BODY_SIZE:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        body = await self.read_body(reader, int(length))
+        return Request(method.upper(), target, version, headers, body)
+
+    @staticmethod
+    async def read_body(reader, length):
+        """Read a request body of a known length, allowing READ_TIMEOUT seconds between pieces."""
+        body = bytearray()
+        while len(body) < length:
+            data = await asyncio.wait_for(reader.read(length - len(body)), READ_TIMEOUT)
+            if not data:
+                raise asyncio.IncompleteReadError(bytes(body), length)
+            body += data
+        return bytes(body)
+
+    async def in_executor(self, function, *args):
+        """Run a blocking call in the thread pool, so other connections are served meanwhile."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args))
+
+    async def dispatch(self, request, writer):
+        """Route a request to its handler and send the response."""
+        try:
+            handler = self.route(request)
+            await handler(request, writer)
+        except HTTPError as e:
+            body = {"error": str(e)}
+            if e.errors:
+                body["errors"] = {str(key): messages for key, messages in e.errors.items()}
+            await self.send_json(writer, e.status, body, request.keep_alive)
+        except (ValueError, OSError) as e:
+            logging.error(f"Error serving {request.method} /{'/'.join(request.path)}: {e}")
+            await self.send_json(writer, HTTPStatus.BAD_REQUEST, {"error": str(e)}, request.keep_alive)
+
+    def route(self, request):
+        """
+        Return the handler for a request.
+
+        Raises:
+            HTTPError: If no endpoint matches
+        """
+        path = "/".join(request.path)
+        if len(request.path) == 2 and path != "students/bulk":
+            path = f"{request.path[0]}/*"
+        handler = self.routes.get((request.method, path))
+        if handler is None:
+            if any(pattern == path for _, pattern in self.routes):
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{request.method} is not supported on /{path}")
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint for {request.method} /{'/'.join(request.path)}")
+        return handler
+
+    async def send_json(self, writer, status, body, keep_alive=True):
+        """Send a complete JSON response."""
+        payload = json.dumps(body).encode()
+        writer.write(self.head(status, keep_alive, {"Content-Type": "application/json",
+                                                     "Content-Length": str(len(payload))}) + payload)
+        await writer.drain()
+
+    async def send_json_lines(self, writer, records, keep_alive=True):
+        """
+        Stream records as JSON Lines, one chunk per line.
+
+        Records are consumed lazily and each line is written and drained as
+        it is produced, so memory stays flat for any roster size and slow
+        clients only hold back their own connection.
+        """
+        writer.write(self.head(HTTPStatus.OK, keep_alive, {"Content-Type": "application/x-ndjson",
+                                                           "Transfer-Encoding": "chunked"}))
+        for record in records:
+            await self.send_chunk(writer, (json.dumps(record) + "\n").encode())
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def send_chunk(writer, data):
+        """Send one chunk of a chunked response."""
+        writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def head(status, keep_alive, headers):
+        """Return the status line and headers of a response."""
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    def find_student(self, request):
+        """
+        Return the student a /students/<id> request is for.
+
+        Raises:
+            HTTPError: If there is no such student
+        """
+        student_id = parse_student_id(request.path[1])
+        if student_id not in self.sms.students:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Student not found with ID: {student_id}")
+        return self.sms.students[student_id]
+
+    async def list_students(self, request, writer):
+        """Stream students in sorted order, optionally after a cursor."""
+        sort_by = request.query.get("sort", "id")
+        if sort_by not in FIELD_KEYS:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Query parameter sort must be one of: {', '.join(FIELD_KEYS)}")
+        # Iterate a snapshot, since other requests may change the roster
+        # while this response waits on the client
+        students = self.sms.iter_snapshot(sort_by, request.int_query("after_id"),
+                                          request.query.get("descending", "") in ("1", "true"))
+        students = itertools.islice(students, request.int_query("limit"))
+        await self.send_json_lines(writer, (student_record(student) for student in students), request.keep_alive)
+
+    async def add_student(self, request, writer):
+        """Add one student from a JSON object."""
+        record = request.json()
+        if not isinstance(record, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected a JSON object")
+        record.pop("id", None)
+        ids, errors = await self.in_executor(self.sms.add_many, [record])
+        if errors:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, "Invalid student", errors)
+        self.modified = True
+        await self.send_json(writer, HTTPStatus.CREATED, student_record(self.sms.students[ids[0]]), request.keep_alive)
+
+    async def add_students(self, request, writer):
+        """Add many students from a JSON Lines body, one student per line."""
+        records = request.json_lines()
+        if not all(isinstance(record, dict) for record in records):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected one JSON object per line")
+        for record in records:
+            record.pop("id", None)
+        ids, errors = await self.in_executor(self.sms.add_many, records)
+        self.modified = self.modified or len(errors) < len(records)
+        # One result line per input line, in order
+        await self.send_json_lines(writer, (
+            {"line": line + 1, "id": student_id, "errors": errors.get(line, [])}
+            for line, student_id in enumerate(ids)
+        ), request.keep_alive)
+
+    async def get_student(self, request, writer):
+        """Return one student."""
+        await self.send_json(writer, HTTPStatus.OK, student_record(self.find_student(request)), request.keep_alive)
+
+    async def update_student(self, request, writer):
+        """
+        Update fields of one student from a JSON object.
+
+        An If-Match header holding the version the client read makes the
+        update conditional; it fails with 412 if the student changed since.
+        """
+        student = self.find_student(request)
+        changes = request.json()
+        if not isinstance(changes, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected a JSON object")
+        expected = request.headers.get("if-match", "").strip('" ')
+        if expected and not expected.isdigit():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "If-Match must be a student version number")
+        expected = int(expected) if expected else None
+
+        _, errors = await self.in_executor(self.sms.update_many, {student.id: changes}, {student.id: expected})
+        if errors and expected is not None and self.sms.students[student.id].version != expected:
+            raise HTTPError(HTTPStatus.PRECONDITION_FAILED, errors[student.id][0])
+        if errors:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, "Invalid update", errors)
+        self.modified = True
+        await self.send_json(writer, HTTPStatus.OK, student_record(self.sms.students[student.id]), request.keep_alive)
+
+    async def delete_student(self, request, writer):
+        """Delete one student."""
+        student = self.find_student(request)
+        await self.in_executor(self.sms.delete_many, [student.id])
+        self.modified = True
+        await self.send_json(writer, HTTPStatus.OK, {"id": student.id, "deleted": True}, request.keep_alive)
+
+    async def search(self, request, writer):
+        """Stream students matching a search text."""
+        by = request.query.get("by", "name")
+        if by not in ("name", "id", "grade"):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Query parameter by must be name, id or grade")
+        students = self.sms.search(request.query.get("text", ""), by)
+        await self.send_json_lines(writer, (student_record(student) for student in students), request.keep_alive)
+
+    async def get_attendance(self, request, writer):
+        """Return the attendance marked for a date."""
+        date = parse_date(request.path[1])
+        statuses = self.sms.attendance_records.get(date, {})
+        await self.send_json(writer, HTTPStatus.OK, {str(student_id): status for student_id, status in statuses.items()},
+                             request.keep_alive)
+
+    async def mark_attendance(self, request, writer):
+        """Mark attendance for a date from a JSON object of {id: status}."""
+        date = parse_date(request.path[1])
+        body = request.json()
+        if not isinstance(body, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected a JSON object of student ID to status")
+
+        statuses = {}
+        errors = {}
+        for key, status in body.items():
+            student_id = int(key) if str(key).isdigit() else None
+            if student_id not in self.sms.students:
+                errors[key] = [f"Student not found with ID: {key}"]
+            elif status not in ("Present", "Absent"):
+                errors[key] = ["Status must be Present or Absent"]
+            else:
+                statuses[student_id] = status
+        if errors:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, "Invalid attendance", errors)
+
+        await self.in_executor(self.sms.mark_attendance, date, statuses)
+        self.modified = True
+        rate, present, marked = self.sms.stats.attendance_rate(date)
+        await self.send_json(writer, HTTPStatus.OK, {"date": date, "marked": marked, "present": present, "rate": rate},
+                             request.keep_alive)
+
+    async def report(self, request, writer):
+        """Run a report in the thread pool and return its result."""
+        name = request.path[1]
+        if name not in REPORTS:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown report: {name} (available: {', '.join(REPORTS)})")
+
+        # The report sees a consistent snapshot while later requests keep
+        # changing the live roster
+        snapshot = self.sms.snapshot()
+        result = await self.in_executor(REPORTS[name], snapshot.students, snapshot.attendance_records)
+        await self.send_json(writer, HTTPStatus.OK, {"report": name, "result": result}, request.keep_alive)
+
+    async def save(self, request, writer):
+        """Save the system to the data directory."""
+        if not self.data_dir:
+            raise HTTPError(HTTPStatus.CONFLICT, "Server was started without --data-dir")
+        await self.in_executor(self.sms.save, self.data_dir)
+        self.modified = False
+        await self.send_json(writer, HTTPStatus.OK, {"saved": len(self.sms.students)}, request.keep_alive)
+
+
+def main(argv=None):
+    """
+    Run the server until interrupted.
+
+    Args:
+        argv (list, optional): Command line arguments, defaults to sys.argv
+
+    Returns:
+        int: Exit status
+    """
+    parser = argparse.ArgumentParser(description="Serve the student management system over HTTP on localhost.")
+    parser.add_argument("--data-dir", help="directory the roster is loaded from and saved to")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--backup-dir", help="directory to take scheduled snapshots in")
+    parser.add_argument("--backup-minutes", type=float, default=60,
+                        help="minutes between scheduled snapshots (default: 60)")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    sms = StudentManagementSystem()
+    if args.data_dir:
+        sms.load(args.data_dir)
+
+    server = StudentServer(sms, args.data_dir, backup_dir=args.backup_dir, backup_interval=args.backup_minutes * 60)
+    try:
+        asyncio.run(server.serve(args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown()
+        if args.data_dir and server.modified:
+            sms.save(args.data_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import csv
+import functools
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from reports import ReportEngine
+from roster_stats import RosterStats
+from student import PackedStudent, next_version
+
+# File in a sharded data directory listing the grade shards
+MANIFEST_FILE = "manifest.json"
+
+# Format version written in manifests
+MANIFEST_VERSION = 1
+
+STUDENTS_HEADER = ["ID", "Name", "Age", "Grade", "Phone", "Email"]
+ATTENDANCE_HEADER = ["Date", "ID", "Status"]
+
+
+def shard_file_name(grade):
+    """
+    Return the base file name of a grade's shard.
+
+    The readable part is a slug of the grade; the hash keeps grades that
+    slug the same (e.g. 'Grade 10' and 'grade-10') apart.
+    """
+    slug = re.sub(r"[^a-z0-9]+", "-", grade.lower()).strip("-")[:32]
+    digest = hashlib.blake2b(grade.encode(), digest_size=4).hexdigest()
+    return f"grade-{slug}-{digest}" if slug else f"grade-{digest}"
+
+
+def read_rows(path):
+    """Return the data rows of a CSV file, skipping its header."""
+    with open(path, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)
+        return list(reader)
+
+
+def write_rows(path, header, rows):
+    """Write a CSV file under a temporary name, then rename it into place."""
+    with open(path + ".tmp", 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(path + ".tmp", path)
+
+
+def read_shard_files(students_path, attendance_path):
+    """
+    Read a shard's files without a store.
+
+    Returns:
+        tuple: (students, attendance_records) as a list of PackedStudent
+            and a {date: {student ID: status}} dict
+    """
+    version = next_version()
+    students = [PackedStudent((int(row[0]), row[1], int(row[2]), row[3], row[4], row[5]), version)
+                for row in read_rows(students_path)]
+    attendance_records = {}
+    for date, student_id, status in read_rows(attendance_path):
+        attendance_records.setdefault(date, {})[int(student_id)] = status
+    return students, attendance_records
+
+
+def evaluate_shard(specs, students_path, attendance_path):
+    """
+    Evaluate report specs over one shard's files.
+
+    Runs in a worker process, so it reads the files itself and returns
+    only the (small, picklable) accumulators.
+
+    Returns:
+        tuple: ReportEngine state of the shard
+    """
+    engine = ReportEngine(specs)
+    engine.scan(*read_shard_files(students_path, attendance_path))
+    return engine.state
+
+
+def sketch_shard(students_path, attendance_path):
+    """
+    Build the age and attendance rate sketches of one shard's files, in a worker process.
+
+    Returns:
+        tuple: (age sketch, attendance rate sketch) Histograms
+    """
+    students, attendance_records = read_shard_files(students_path, attendance_path)
+    stats = RosterStats()
+    for student in students:
+        stats.add(student)
+    for date, statuses in attendance_records.items():
+        for student_id, status in statuses.items():
+            stats.mark(date, None, status, student_id)
+    return stats.age_sketch, stats.rate_sketch
+
+
+class ShardSet:
+    """
+    Grade shards of a data directory and which of them are loaded.
+
+    A sharded data directory holds a manifest plus one students file and
+    one attendance file per grade. Opening a roster reads only the
+    manifest, so grades can be loaded as they are needed; each student's
+    attendance is stored in the shard of their grade.
+    """
+
+    def __init__(self, data_dir, grades=None, next_id=1):
+        """
+        Initialize the shard set.
+
+        Args:
+            data_dir (str): Directory holding the shards
+            grades (dict, optional): Manifest entry of each grade
+            next_id (int): Next student ID, covering unloaded grades too
+        """
+        self.data_dir = data_dir
+        self.grades = grades or {}
+        self.next_id = next_id
+        self.loaded = set()
+
+    @classmethod
+    def open(cls, data_dir):
+        """
+        Read the manifest of a data directory.
+
+        Returns:
+            ShardSet: The shards, or None if the directory is not sharded
+
+        Raises:
+            ValueError: If the manifest has an unsupported version
+        """
+        path = os.path.join(data_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported shard manifest version in {data_dir}")
+        return cls(data_dir, manifest["grades"], manifest["next_id"])
+
+    @property
+    def unloaded(self):
+        """Grades in the manifest that are not loaded, sorted."""
+        return sorted(grade for grade in self.grades if grade not in self.loaded)
+
+    def paths(self, grade):
+        """Return the (students, attendance) file paths of a grade's shard."""
+        entry = self.grades[grade]
+        return (os.path.join(self.data_dir, entry["students"]),
+                os.path.join(self.data_dir, entry["attendance"]))
+
+    def read(self, grade):
+        """
+        Read a grade's shard.
+
+        Returns:
+            tuple: (rows, marks) where rows are student CSV rows and marks
+                are (date, student ID, status) rows
+        """
+        students_path, attendance_path = self.paths(grade)
+        return read_rows(students_path), read_rows(attendance_path)
+
+    def write(self, shards, next_id):
+        """
+        Write grade shards and then the manifest.
+
+        Shards are written before the manifest that points at them, so an
+        interrupted save leaves the previous manifest and shards usable.
+
+        Args:
+            shards (dict): (rows, marks) to store per grade; grades with no
+                rows are removed from the manifest
+            next_id (int): Next student ID to record
+        """
+        os.makedirs(self.data_dir, exist_ok=True)
+        removed = []
+        for grade, (rows, marks) in shards.items():
+            if not rows:
+                if grade in self.grades:
+                    removed.append(self.paths(grade))
+                    del self.grades[grade]
+                continue
+            name = shard_file_name(grade)
+            self.grades[grade] = {"students": f"{name}.csv", "attendance": f"{name}-attendance.csv",
+                                  "count": len(rows)}
+            students_path, attendance_path = self.paths(grade)
+            write_rows(students_path, STUDENTS_HEADER, rows)
+            write_rows(attendance_path, ATTENDANCE_HEADER, marks)
+        self.next_id = next_id
+
+        path = os.path.join(self.data_dir, MANIFEST_FILE)
+        with open(path + ".tmp", 'w') as f:
+            json.dump({"version": MANIFEST_VERSION, "next_id": self.next_id, "grades": self.grades}, f, indent=1)
+        os.replace(path + ".tmp", path)
+        for paths in removed:
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def evaluate(self, engine, grades, max_workers=None):
+        """
+        Scan grade shards from disk into a report engine, in parallel across processes.
+
+        Args:
+            engine (ReportEngine): Engine to merge the shards into
+            grades (iterable): Grades to scan
+            max_workers (int, optional): Worker processes (default: one per CPU)
+
+        Returns:
+            ReportEngine: The engine
+        """
+        for state in self.map(functools.partial(evaluate_shard, engine.specs), grades, max_workers):
+            engine.merge(state)
+        return engine
+
+    def sketch(self, age_sketch, rate_sketch, grades, max_workers=None):
+        """
+        Merge the age and attendance rate sketches of grade shards from disk, built in parallel.
+
+        Args:
+            age_sketch (Histogram): Age sketch to merge into
+            rate_sketch (Histogram): Attendance rate sketch to merge into
+            grades (iterable): Grades to sketch
+            max_workers (int, optional): Worker processes (default: one per CPU)
+        """
+        for ages, rates in self.map(sketch_shard, grades, max_workers):
+            age_sketch.merge(ages)
+            rate_sketch.merge(rates)
+
+    def map(self, function, grades, max_workers=None):
+        """
+        Call function(students_path, attendance_path) for each grade's shard in a process pool.
+
+        Returns:
+            list: The results, in the order of the grades
+        """
+        paths = [self.paths(grade) for grade in grades]
+        if len(paths) <= 1:
+            # Not worth starting a pool for
+            return [function(*shard_paths) for shard_paths in paths]
+        with ProcessPoolExecutor(max_workers) as pool:
+            return list(pool.map(function, *zip(*paths)))
+
+
+def loads_all_shards(method):
+    """
+    Load every unloaded grade shard of the object before running a method.
+
+    Applied outside reads/writes, so the shards are loaded under their own
+    write lock rather than by upgrading a read lock.
+    """
+    @functools.wraps(method)
+    def loaded(self, *args, **kwargs):
+        self.load_all()
+        return method(self, *args, **kwargs)
+    return loaded
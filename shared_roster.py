@@ -0,0 +1,389 @@
+import argparse
+import atexit
+import bisect
+import itertools
+import os
+import struct
+import sys
+import time
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+
+from student import PackedStudent
+
+# Segment header: magic, layout version, generation, students, attendance marks
+HEADER = struct.Struct("<4sIQQQ")
+MAGIC = b"SRST"
+LAYOUT_VERSION = 1
+
+# Control segment: the generation readers should be attached to, and 1
+# once the publisher has stopped (0 while it is publishing)
+CONTROL = struct.Struct("<QQ")
+
+# Columns of a data segment in storage order, with their array typecodes.
+# Text columns are a UTF-8 blob plus n + 1 offsets into it.
+COLUMNS = (
+    ("ids", "q"),
+    ("ages", "i"),
+    ("grade_codes", "i"),
+    ("name_offsets", "Q"), ("names", "B"),
+    ("phone_offsets", "Q"), ("phones", "B"),
+    ("email_offsets", "Q"), ("emails", "B"),
+    ("grade_offsets", "Q"), ("grades", "B"),
+    ("date_offsets", "Q"), ("dates", "B"),
+    ("mark_dates", "i"),
+    ("mark_ids", "q"),
+    ("mark_present", "b")
+)
+
+# Offset and length of every column, after the header
+COLUMN_TABLE = struct.Struct(f"<{2 * len(COLUMNS)}Q")
+
+# Python 3.13 can open segments without registering them for cleanup at exit
+UNTRACKED_SEGMENTS = sys.version_info >= (3, 13)
+
+
+def open_segment(name, create=False, size=0):
+    """
+    Open a shared memory segment that outlives this process.
+
+    By default Python unlinks segments a process created or attached to
+    when it exits; the roster must stay published until the publisher
+    replaces or closes it, so the segment is not tracked.
+    """
+    if UNTRACKED_SEGMENTS:
+        return shared_memory.SharedMemory(name, create=create, size=size, track=False)
+    segment = shared_memory.SharedMemory(name, create=create, size=size)
+    if os.name == "posix":
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def unlink_segment(segment):
+    """Remove a segment opened with open_segment()."""
+    if not UNTRACKED_SEGMENTS and os.name == "posix":
+        # unlink() unregisters the segment, so it has to be registered again first
+        resource_tracker.register(segment._name, "shared_memory")
+    segment.unlink()
+
+
+def segment_name(name, generation):
+    """Return the name of the data segment for a generation."""
+    return f"{name}-{generation}"
+
+
+def encode_text(values):
+    """Return (offsets, blob) arrays for a sequence of strings."""
+    encoded = [value.encode() for value in values]
+    offsets = array("Q", itertools.accumulate((len(value) for value in encoded), initial=0))
+    return offsets, array("B", b"".join(encoded))
+
+
+def build_segment(snapshot, generation):
+    """
+    Lay out a snapshot of the roster as columns.
+
+    Students are stored in ID order so readers can look IDs up by binary
+    search; grades and dates are stored once and referenced by code.
+
+    Args:
+        snapshot (Snapshot): Students and attendance to publish
+        generation (int): Generation number of the segment
+
+    Returns:
+        bytes: Segment contents
+    """
+    rows = [student.as_row() for _, student in sorted(snapshot.students.items())]
+    ids, names, ages, grades, phones, emails = zip(*rows) if rows else ((),) * 6
+    grade_codes = {}
+    date_codes = {}
+    marks = [(date_codes.setdefault(date, len(date_codes)), student_id, status == "Present")
+             for date, statuses in snapshot.attendance_records.items()
+             for student_id, status in statuses.items()]
+    mark_dates, mark_ids, mark_present = zip(*marks) if marks else ((),) * 3
+
+    columns = {
+        "ids": array("q", ids),
+        "ages": array("i", ages),
+        "grade_codes": array("i", (grade_codes.setdefault(grade, len(grade_codes)) for grade in grades)),
+        "mark_dates": array("i", mark_dates),
+        "mark_ids": array("q", mark_ids),
+        "mark_present": array("b", mark_present)
+    }
+    for column, values in (("name", names), ("phone", phones), ("email", emails),
+                           ("grade", grade_codes), ("date", date_codes)):
+        columns[f"{column}_offsets"], columns[f"{column}s"] = encode_text(values)
+
+    # Columns start on 8-byte boundaries so they can be cast in place
+    table = []
+    blobs = []
+    position = HEADER.size + COLUMN_TABLE.size
+    for column, _ in COLUMNS:
+        data = columns[column].tobytes()
+        padding = -position % 8
+        blobs.append(b"\0" * padding + data)
+        position += padding
+        table.extend((position, len(data)))
+        position += len(data)
+    header = HEADER.pack(MAGIC, LAYOUT_VERSION, generation, len(rows), len(marks))
+    return header + COLUMN_TABLE.pack(*table) + b"".join(blobs)
+
+
+class SharedRosterPublisher:
+    """
+    Publishes roster snapshots to shared memory for other processes.
+
+    Each publish writes a new data segment named '<name>-<generation>' and
+    then bumps the generation in the control segment '<name>'. The previous
+    data segment is unlinked right away: processes still attached to it
+    keep their mapping until they re-attach, and new readers only see the
+    new generation. Only one process should publish under a name.
+
+    The segments are not tracked by Python, so the publisher removes them
+    itself: close() is registered to run at exit, and marks the roster as
+    closed in the control segment so attached readers can tell (see
+    SharedRoster.is_closed).
+    """
+
+    def __init__(self, name):
+        """
+        Open (or create) the control segment of a shared roster.
+
+        Args:
+            name (str): Name of the shared roster
+        """
+        self.name = name
+        try:
+            self._control = open_segment(name, create=True, size=CONTROL.size)
+            CONTROL.pack_into(self._control.buf, 0, 0, 0)
+        except FileExistsError:
+            self._control = open_segment(name)
+            CONTROL.pack_into(self._control.buf, 0, self.generation, 0)
+        atexit.register(self.close)
+
+    @property
+    def generation(self):
+        """Generation currently published."""
+        return CONTROL.unpack_from(self._control.buf)[0]
+
+    @property
+    def closed(self):
+        """True once close() has been called."""
+        return self._control is None
+
+    def publish(self, snapshot):
+        """
+        Publish a snapshot as the next generation.
+
+        Args:
+            snapshot (Snapshot): Students and attendance to publish
+
+        Returns:
+            int: The new generation
+        """
+        previous = self.generation
+        generation = previous + 1
+        data = build_segment(snapshot, generation)
+        segment = open_segment(segment_name(self.name, generation), create=True, size=len(data))
+        segment.buf[:len(data)] = data
+        segment.close()
+
+        CONTROL.pack_into(self._control.buf, 0, generation, 0)
+        self._unlink(previous)
+        return generation
+
+    def _unlink(self, generation):
+        """Remove a data segment, if it exists."""
+        try:
+            segment = open_segment(segment_name(self.name, generation))
+        except FileNotFoundError:
+            return
+        segment.close()
+        unlink_segment(segment)
+
+    def close(self, unlink=True):
+        """
+        Stop publishing, marking the roster as closed for readers.
+
+        Calling it again does nothing; it also runs at exit.
+
+        Args:
+            unlink (bool): Also remove the published roster; readers keep
+                the generation they are attached to
+        """
+        if self.closed:
+            return
+        atexit.unregister(self.close)
+        control, self._control = self._control, None
+        generation = CONTROL.unpack_from(control.buf)[0]
+        CONTROL.pack_into(control.buf, 0, generation, 1)
+        if unlink:
+            self._unlink(generation)
+            control.close()
+            unlink_segment(control)
+        else:
+            control.close()
+
+
+class SharedRoster:
+    """
+    Read-only view of a roster published by SharedRosterPublisher.
+
+    Attaching maps the segment and casts its columns in place, so nothing
+    is copied and every attached process shares the same physical memory.
+    Strings are only decoded when a row is read. Check is_stale (or call
+    refresh()) to pick up generations published after attaching, and
+    is_closed to find out whether the publisher has stopped.
+    """
+
+    def __init__(self, name, timeout=1.0):
+        """
+        Attach to a shared roster.
+
+        Args:
+            name (str): Name the roster was published under
+            timeout (float): Seconds to keep retrying while a publish
+                replaces the segment being attached to
+
+        Raises:
+            FileNotFoundError: If no roster is published under the name
+        """
+        self.name = name
+        self.timeout = timeout
+        self._control = open_segment(name)
+        self._segment = None
+        self._views = []
+        self._attach()
+
+    def _attach(self):
+        """Attach to the current generation's data segment."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            generation = CONTROL.unpack_from(self._control.buf)[0]
+            try:
+                segment = open_segment(segment_name(self.name, generation))
+                break
+            except FileNotFoundError:
+                # Replaced between reading the generation and attaching
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.001)
+
+        magic, layout, self.generation, self._size, self.mark_count = HEADER.unpack_from(segment.buf)
+        if magic != MAGIC or layout != LAYOUT_VERSION:
+            segment.close()
+            raise ValueError(f"Shared memory {self.name} does not hold a roster")
+        table = COLUMN_TABLE.unpack_from(segment.buf, HEADER.size)
+        self._segment = segment
+        buffer = segment.buf.toreadonly()
+        self._views = [buffer]
+        for (column, typecode), offset, length in zip(COLUMNS, table[0::2], table[1::2]):
+            view = buffer[offset:offset + length].cast(typecode)
+            self._views.append(view)
+            setattr(self, f"_{column}", view)
+        self.grades = [self._text(self._grade_offsets, self._grades, code) for code in range(len(self._grade_offsets) - 1)]
+        self.dates = [self._text(self._date_offsets, self._dates, code) for code in range(len(self._date_offsets) - 1)]
+
+    def _detach(self):
+        """Release the column views and the data segment."""
+        # Views derived from the buffer are released before the buffer itself
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    @property
+    def is_stale(self):
+        """True if a newer generation was published since attaching."""
+        return CONTROL.unpack_from(self._control.buf)[0] != self.generation
+
+    @property
+    def is_closed(self):
+        """True if the publisher has stopped; the view stays readable but no longer changes."""
+        return CONTROL.unpack_from(self._control.buf)[1] == 1
+
+    def refresh(self):
+        """
+        Re-attach if a newer generation was published.
+
+        Returns:
+            bool: True if the view changed
+        """
+        if self.is_closed or not self.is_stale:
+            return False
+        self._detach()
+        self._attach()
+        return True
+
+    def close(self):
+        """Detach from the roster."""
+        self._detach()
+        self._control.close()
+
+    def __len__(self):
+        """Number of students."""
+        return self._size
+
+    @staticmethod
+    def _text(offsets, blob, position):
+        """Decode one string of a text column."""
+        return bytes(blob[offsets[position]:offsets[position + 1]]).decode()
+
+    def row(self, position):
+        """Return the (id, name, age, grade, phone, email) tuple at a position."""
+        return (self._ids[position], self._text(self._name_offsets, self._names, position), self._ages[position],
+                self.grades[self._grade_codes[position]], self._text(self._phone_offsets, self._phones, position),
+                self._text(self._email_offsets, self._emails, position))
+
+    def get(self, student_id):
+        """Return the row of a student ID, or None, by binary search over the ID column."""
+        position = bisect.bisect_left(self._ids, student_id)
+        if position < self._size and self._ids[position] == student_id:
+            return self.row(position)
+        return None
+
+    def rows(self):
+        """Yield every student row in ID order."""
+        for position in range(self._size):
+            yield self.row(position)
+
+    def students(self):
+        """Yield every student as a PackedStudent, for the report functions."""
+        return map(PackedStudent, self.rows())
+
+    def attendance_records(self):
+        """Return attendance as a {date: {student ID: status}} dict."""
+        records = {}
+        for code, student_id, present in zip(self._mark_dates, self._mark_ids, self._mark_present):
+            records.setdefault(self.dates[code], {})[student_id] = "Present" if present else "Absent"
+        return records
+
+    def grade_counts(self):
+        """Count students per grade straight from the code column."""
+        counts = [0] * len(self.grades)
+        for code in self._grade_codes:
+            counts[code] += 1
+        return dict(zip(self.grades, counts))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or remove a roster published to shared memory.")
+    parser.add_argument("name", help="name the roster was published under (main.py --share NAME)")
+    parser.add_argument("--unlink", action="store_true", help="remove the published roster")
+    args = parser.parse_args()
+
+    try:
+        if args.unlink:
+            SharedRosterPublisher(args.name).close()
+            sys.exit(0)
+        roster = SharedRoster(args.name)
+    except FileNotFoundError:
+        print(f"Error: no roster is published as {args.name}", file=sys.stderr)
+        sys.exit(1)
+    state = " (publisher closed)" if roster.is_closed else ""
+    print(f"Generation {roster.generation}{state}: {len(roster)} students, {roster.mark_count} attendance marks")
+    for grade, count in sorted(roster.grade_counts().items()):
+        print(f"{grade}\t{count}")
+    roster.close()
@@ -0,0 +1,127 @@
+import math
+
+
+class Histogram:
+    """
+    Mergeable fixed-bucket histogram for streaming percentiles.
+
+    Values are counted in equal-width buckets over [low, high); values
+    outside the range are counted in the first or last bucket. Adding and
+    removing a value are O(1), two histograms with the same layout merge
+    by adding their counts, and a percentile walks the fixed number of
+    buckets, so none of these depend on how many values were counted.
+
+    Error bound: percentile(q) returns the bucket holding the nearest-rank
+    q-th percentile of the counted values. A discrete histogram (integer
+    values, one bucket per integer) returns that value exactly; otherwise
+    the bucket's midpoint is returned, at most half a bucket width away.
+    Values clamped into the end buckets lose that bound.
+    """
+
+    def __init__(self, low, high, buckets, discrete=False):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            low (float): Lower edge of the first bucket
+            high (float): Upper edge of the last bucket
+            buckets (int): Number of buckets
+            discrete (bool): Values are integers and every bucket is one
+                integer wide, so bucket edges are reported exactly
+
+        Raises:
+            ValueError: If the range is empty, or discrete buckets are not
+                one integer wide
+        """
+        if high <= low or buckets <= 0:
+            raise ValueError("Histogram needs low < high and at least one bucket")
+        if discrete and high - low != buckets:
+            raise ValueError("Discrete histogram buckets must be one integer wide")
+        self.low = low
+        self.high = high
+        self.buckets = buckets
+        self.discrete = discrete
+        self.width = (high - low) / buckets
+        self.counts = [0] * buckets
+        self.count = 0
+
+    @property
+    def layout(self):
+        """(low, high, buckets, discrete), which must match for merging."""
+        return self.low, self.high, self.buckets, self.discrete
+
+    @property
+    def max_error(self):
+        """Largest difference between a reported and the true percentile, for values in range."""
+        return 0 if self.discrete else self.width / 2
+
+    def _bucket(self, value):
+        """Return the bucket index of a value, clamped to the end buckets."""
+        return min(max(int((value - self.low) / self.width), 0), self.buckets - 1)
+
+    def add(self, value, count=1):
+        """Count a value."""
+        self.counts[self._bucket(value)] += count
+        self.count += count
+
+    def remove(self, value, count=1):
+        """Stop counting a value that was added before."""
+        self.counts[self._bucket(value)] -= count
+        self.count -= count
+
+    def merge(self, other):
+        """
+        Add another histogram's counts to this one.
+
+        Returns:
+            Histogram: This histogram
+
+        Raises:
+            ValueError: If the layouts differ
+        """
+        if other.layout != self.layout:
+            raise ValueError(f"Cannot merge histograms with layouts {self.layout} and {other.layout}")
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.count += other.count
+        return self
+
+    def copy(self):
+        """Return an independent copy of the histogram."""
+        histogram = Histogram(*self.layout)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        return histogram
+
+    def percentile(self, q):
+        """
+        Return the q-th percentile (0-100) of the counted values, within max_error.
+
+        Returns:
+            float: The percentile, or None if nothing is counted
+
+        Raises:
+            ValueError: If q is not between 0 and 100
+        """
+        if not 0 <= q <= 100:
+            raise ValueError(f"Percentile must be between 0 and 100: {q}")
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if self.discrete:
+            return self.low + bucket
+        return self.low + (bucket + 0.5) * self.width
+
+
+def age_histogram():
+    """Return an empty sketch of student ages: exact for ages below 128."""
+    return Histogram(0, 128, 128, discrete=True)
+
+
+def attendance_rate_histogram():
+    """Return an empty sketch of attendance rates in percent: within 0.5 percentage points."""
+    return Histogram(0, 100, 100)
@@ -0,0 +1,129 @@
+import argparse
+import random
+import sys
+import threading
+import time
+
+import reports
+from main import StudentManagementSystem
+
+
+def stress_test(readers=8, writers=4, seconds=5.0, roster_size=2000, seed=None):
+    """
+    Hammer one StudentManagementSystem from many threads and check its invariants.
+
+    Writers add, update and delete students and mark attendance. Readers
+    take snapshots and run reports and searches on them, checking that each
+    snapshot is internally consistent. At the end the maintained indexes
+    and statistics are compared with values recomputed from scratch.
+
+    Args:
+        readers (int): Number of reader threads
+        writers (int): Number of writer threads
+        seconds (float): How long to run
+        roster_size (int): Number of students to start with
+        seed (int, optional): Random seed
+
+    Returns:
+        list: Descriptions of the failures found (empty if none)
+    """
+    rng = random.Random(seed)
+    sms = StudentManagementSystem()
+    phones = iter(range(10 ** 9, 10 ** 10))
+    phone_lock = threading.Lock()
+
+    def record():
+        with phone_lock:
+            phone = next(phones)
+        return {"name": rng.choice(["Ann", "Bob", "Cid", "Dan"]), "age": rng.randint(5, 18),
+                "grade": rng.choice(["A", "B", "C"]), "phone": f"0{phone}", "email": f"s{phone}@example.com"}
+
+    sms.add_many([record() for _ in range(roster_size)])
+    failures = []
+    # Each thread counts its own iterations and adds them in at the end
+    counts = {"reads": 0, "writes": 0}
+    counts_lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def reader():
+        done = 0
+        while time.monotonic() < stop:
+            snapshot = sms.snapshot()
+            if any(student.id != student_id for student_id, student in snapshot.students.items()):
+                failures.append("Snapshot holds a student under the wrong ID")
+            grades = reports.grade_distribution(snapshot.students.values())
+            if sum(grade["count"] for grade in grades) != len(snapshot.students):
+                failures.append("Grade counts do not add up to the snapshot size")
+            reports.attendance_summary(snapshot.students, snapshot.attendance_records)
+            sms.search("a")
+            done += 1
+        return "reads", done
+
+    def writer():
+        done = 0
+        while time.monotonic() < stop:
+            ids = list(sms.snapshot().students)
+            action = rng.random()
+            if action < 0.3 or not ids:
+                sms.add_many([record() for _ in range(rng.randint(1, 20))])
+            elif action < 0.6:
+                sms.update_many({student_id: {"age": rng.randint(5, 18), "grade": rng.choice(["A", "B", "C"])}
+                                 for student_id in rng.sample(ids, min(len(ids), 10))})
+            elif action < 0.8:
+                sms.delete_many(rng.sample(ids, min(len(ids), rng.randint(1, 10))))
+            else:
+                sms.mark_attendance(f"2024-01-{rng.randint(1, 28):02d}",
+                                    {student_id: rng.choice(["Present", "Absent"])
+                                     for student_id in rng.sample(ids, min(len(ids), 50))})
+            done += 1
+        return "writes", done
+
+    def run(target):
+        try:
+            kind, done = target()
+        except Exception as e:
+            failures.append(f"{target.__name__} raised {type(e).__name__}: {e}")
+            return
+        with counts_lock:
+            counts[kind] += done
+
+    threads = ([threading.Thread(target=run, args=(reader,)) for _ in range(readers)]
+               + [threading.Thread(target=run, args=(writer,)) for _ in range(writers)])
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Compare everything that is maintained incrementally with a recomputation
+    students = sms.students
+    if sms._sorted_ids != sorted(students):
+        failures.append("Sorted ID list does not match the students")
+    if sms.stats.count != len(students) or sms.stats.age_sum != sum(s.age for s in students.values()):
+        failures.append("Roster statistics do not match the students")
+    if set(sms.row_hashes) != set(students):
+        failures.append("Row hashes do not match the students")
+    for field, index in sms.unique_indexes.items():
+        if sum(len(owners) for owners in index.owners.values()) != len(students):
+            failures.append(f"Unique {field} index does not match the students")
+    for fields, index in sms._sort_indexes.items():
+        if [student_id for _, student_id in index.entries] != list(type(index)(fields, students.values()).ids()):
+            failures.append(f"Sort index {fields} does not match the students")
+
+    print(f"{counts['reads']} snapshot reads and {counts['writes']} write batches by "
+          f"{readers} readers and {writers} writers in {seconds:.1f}s; {len(students)} students at the end")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress test the student store with concurrent readers and writers.")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--roster-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    found = stress_test(args.readers, args.writers, args.seconds, args.roster_size, args.seed)
+    for failure in found:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if found else 0)
@@ -1,9 +1,244 @@
 import re
+import hashlib
+import itertools
 import logging
+import threading
+from grades import GRADES, grade_key
+from logging_setup import RECORD_LOGGER_NAME
+
+# Logging is configured by the entry points (see logging_setup.py)
+record_logger = logging.getLogger(RECORD_LOGGER_NAME)
+
+# Precompiled validation patterns
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+DIGIT_PATTERN = re.compile(r"\d")
+
+# Source of student versions, shared by every roster in this process
+_versions = itertools.count(1)
+_versions_lock = threading.Lock()
+
+
+def next_version():
+    """
+    Return a new student version.
+    
+    Versions only ever increase, so a student that is deleted and added
+    again, or replaced by an import, never comes back at a version a
+    client may still hold from the earlier record.
+    """
+    with _versions_lock:
+        return next(_versions)
+
+
+def row_hash(values):
+    """
+    Return a content hash of a student row.
+    
+    Values are hashed in their text form, so a Student.as_row() tuple and
+    the same row read back from a CSV export hash identically. The grade is
+    hashed by its grade_key(), so spellings of the same grade (see
+    grades.GradeDictionary) hash identically too.
+    
+    Args:
+        values (iterable): (id, name, age, grade, phone, email) values
+        
+    Returns:
+        bytes: 16-byte digest
+    """
+    values = tuple(map(str, values))
+    text = "\x1f".join(values[:3] + (grade_key(values[3]),) + values[4:])
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def _id_error(student_id):
+    """Return the error message for an invalid student ID, or None."""
+    if not isinstance(student_id, int) or isinstance(student_id, bool) or student_id <= 0:
+        return "Student ID must be a positive integer"
+    return None
+
+
+def _name_error(name):
+    """Return the error message for an invalid name, or None."""
+    if not isinstance(name, str) or not name.strip():
+        return "Name must be a non-empty string"
+    if DIGIT_PATTERN.search(name):
+        return "Name must not contain numbers"
+    return None
+
+
+def _age_error(age):
+    """Return the error message for an invalid age, or None."""
+    if not isinstance(age, int) or isinstance(age, bool) or age <= 0:
+        return "Age must be a positive integer"
+    return None
+
+
+def _grade_error(grade):
+    """Return the error message for an invalid grade, or None."""
+    if not isinstance(grade, str) or not grade.strip():
+        return "Grade must be a non-empty string"
+    return None
+
+
+def _phone_error(phone):
+    """Return the error message for an invalid phone number, or None."""
+    if not isinstance(phone, str) or len(phone) != 11 or not phone.isdigit():
+        return "Phone number must be an 11-digit number"
+    return None
+
+
+def _email_error(email):
+    """Return the error message for an invalid email address, or None."""
+    if not isinstance(email, str) or not EMAIL_PATTERN.match(email):
+        return "Invalid email address format"
+    return None
+
+
+def _parse_int(value):
+    """
+    Convert an int or a string of digits to an int, returning None otherwise.
+    
+    Floats are not truncated and booleans are not taken as 0 or 1, so
+    e.g. an age of 12.9 or true sent over HTTP is rejected.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        if text.isascii() and text.isdigit():
+            return int(text)
+    return None
+
+
+class ValidationResult:
+    """Per-row outcome of validating columns of student records."""
+    
+    def __init__(self, size):
+        """
+        Initialize an empty result.
+        
+        Args:
+            size (int): Number of rows validated
+        """
+        self.size = size
+        self.mask = [False] * size
+        self.errors = {}
+        self.ids = None
+        self.ages = None
+    
+    def add_error(self, row, message):
+        """Record an error message for a row."""
+        self.mask[row] = True
+        self.errors.setdefault(row, []).append(message)
+    
+    @property
+    def valid(self):
+        """True if every row passed validation."""
+        return not self.errors
+    
+    def valid_rows(self):
+        """Return the indexes of rows that passed validation."""
+        return [row for row, failed in enumerate(self.mask) if not failed]
+    
+    def messages(self, row):
+        """Return the error messages for a row."""
+        return self.errors.get(row, [])
+
+
+def validate_records(ids=None, names=None, ages=None, grades=None, phones=None, emails=None):
+    """
+    Validate columns of student records in a single pass.
+    
+    Each argument is an optional sequence holding one field for every row.
+    IDs and ages may be given as text and are converted to integers. A None
+    ID is accepted and left for the caller to allocate.
+    
+    Args:
+        ids (sequence, optional): Student IDs
+        names (sequence, optional): Student names
+        ages (sequence, optional): Student ages
+        grades (sequence, optional): Student grades
+        phones (sequence, optional): Phone numbers
+        emails (sequence, optional): Email addresses
+    
+    Returns:
+        ValidationResult: Error mask and messages per row, plus the
+            converted ids and ages columns
+    
+    Raises:
+        ValueError: If the given columns differ in length
+    """
+    columns = [column for column in (ids, names, ages, grades, phones, emails) if column is not None]
+    size = len(columns[0]) if columns else 0
+    if any(len(column) != size for column in columns):
+        raise ValueError("All columns must have the same number of rows")
+    
+    result = ValidationResult(size)
+    if ids is not None:
+        result.ids = [None] * size
+    if ages is not None:
+        result.ages = [None] * size
+    
+    for row in range(size):
+        if ids is not None and ids[row] is not None:
+            student_id = _parse_int(ids[row])
+            message = _id_error(student_id) if student_id is not None else "Student ID must be a valid integer"
+            if message:
+                result.add_error(row, message)
+            else:
+                result.ids[row] = student_id
+        
+        if names is not None:
+            message = _name_error(names[row])
+            if message:
+                result.add_error(row, message)
+        
+        if ages is not None:
+            age = _parse_int(ages[row])
+            message = _age_error(age) if age is not None else "Age must be a valid integer"
+            if message:
+                result.add_error(row, message)
+            else:
+                result.ages[row] = age
+        
+        if grades is not None:
+            message = _grade_error(grades[row])
+            if message:
+                result.add_error(row, message)
+        
+        if phones is not None:
+            message = _phone_error(phones[row])
+            if message:
+                result.add_error(row, message)
+        
+        if emails is not None:
+            message = _email_error(emails[row])
+            if message:
+                result.add_error(row, message)
+    
+    return result
+
+
+class VersionConflictError(ValueError):
+    """Raised when a student was changed since the version an edit was based on."""
+    
+    def __init__(self, student_id, expected_version, actual_version):
+        """
+        Initialize the error.
+        
+        Args:
+            student_id (int): ID of the student
+            expected_version (int): Version the edit was based on
+            actual_version (int): Current version of the student
+        """
+        super().__init__(f"Student ID {student_id} was changed by someone else "
+                         f"(version {actual_version}, edit based on version {expected_version})")
+        self.student_id = student_id
+        self.expected_version = expected_version
+        self.actual_version = actual_version
 
-# Single logging configuration
-logging.basicConfig(filename='student_management.log', level=logging.INFO, 
-                   format='%(asctime)s - %(levelname)s - %(message)s')
 
 class Contact:
     """Class representing contact information for a student."""
@@ -23,18 +258,22 @@ class Contact:
         self.validate_email(email)
         self.phone = phone
         self.email = email
+        # Bumped on every change so students can tell their cached row is stale
+        self.version = 0
     
     @staticmethod
     def validate_phone(phone):
         """Validate phone number format."""
-        if not isinstance(phone, str) or len(phone) != 11 or not phone.isdigit():
-            raise ValueError("Phone number must be an 11-digit number")
+        message = _phone_error(phone)
+        if message:
+            raise ValueError(message)
     
     @staticmethod
     def validate_email(email):
         """Validate email address format."""
-        if not isinstance(email, str) or not re.match(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", email):
-            raise ValueError("Invalid email address format")
+        message = _email_error(email)
+        if message:
+            raise ValueError(message)
     
     def update_details(self, phone, email):
         """
@@ -51,6 +290,7 @@ class Contact:
         self.validate_email(email)
         self.phone = phone
         self.email = email
+        self.version += 1
     
     def get_details(self):
         """Return contact details as a dictionary."""
@@ -84,47 +324,88 @@ class Student:
         self.age = age
         self.grade = grade
         self.contact = contact
+        # Renewed by every update, for optimistic concurrency checks
+        self.version = next_version()
+        
+        # Cached as_row() tuple and the contact state it was built from
+        self._row = None
+        self._row_contact = None
+        self._row_contact_version = None
     
     @staticmethod
     def validate_id(student_id):
         """Validate student ID."""
-        if not isinstance(student_id, int) or student_id <= 0:
-            raise ValueError("Student ID must be a positive integer")
+        message = _id_error(student_id)
+        if message:
+            raise ValueError(message)
     
     @staticmethod
     def validate_name(name):
         """Validate student name."""
-        if not isinstance(name, str) or not name.strip():
-            raise ValueError("Name must be a non-empty string")
-        if any(char.isdigit() for char in name):
-            raise ValueError("Name must not contain numbers")
+        message = _name_error(name)
+        if message:
+            raise ValueError(message)
     
     @staticmethod
     def validate_age(age):
         """Validate student age."""
-        if not isinstance(age, int) or age <= 0:
-            raise ValueError("Age must be a positive integer")
+        message = _age_error(age)
+        if message:
+            raise ValueError(message)
     
     @staticmethod
     def validate_grade(grade):
         """Validate student grade."""
-        if not isinstance(grade, str) or not grade.strip():
-            raise ValueError("Grade must be a non-empty string")
+        message = _grade_error(grade)
+        if message:
+            raise ValueError(message)
+    
+    @property
+    def grade(self):
+        """Student grade, as displayed (see grades.GradeDictionary)."""
+        return GRADES.names[self.grade_code]
     
-    def update_details(self, details):
+    @grade.setter
+    def grade(self, grade):
+        # Only the interned code is stored
+        self.grade_code = GRADES.code(grade)
+    
+    def check_version(self, expected_version):
+        """
+        Check that the student is still at the version an edit was based on.
+        
+        Args:
+            expected_version (int): Version the edit was based on, or None
+                to skip the check
+            
+        Raises:
+            VersionConflictError: If the student has changed since
+        """
+        if expected_version is not None and expected_version != self.version:
+            raise VersionConflictError(self.id, expected_version, self.version)
+    
+    def update_details(self, details, log=True, expected_version=None):
         """
         Update student details.
         
+        With expected_version the update is a compare-and-set: it only
+        happens if nobody else updated the student since that version.
+        
         Args:
             details (dict): Dictionary containing updated student information
                 Required keys: 'name', 'age', 'grade'
                 Optional keys: 'contact'
+            log (bool): Whether to log the update. Bulk callers disable
+                this and write one aggregated entry instead
+            expected_version (int, optional): Version the update is based on
                 
         Raises:
             ValueError: If required keys are missing or values are invalid
             TypeError: If contact is not a Contact object
+            VersionConflictError: If the student is no longer at expected_version
         """
         try:
+            self.check_version(expected_version)
             if not all(k in details for k in ['name', 'age', 'grade']):
                 raise ValueError('Missing required details (name, age, grade)')
             
@@ -135,18 +416,42 @@ class Student:
             self.name = details['name']
             self.age = details['age']
             self.grade = details['grade']
+            self._row = None
             
             if 'contact' in details:
                 contact = details['contact']
                 if not isinstance(contact, Contact):
                     raise TypeError("Contact must be a Contact object")
                 self.contact = contact
-                
-            logging.info(f"Updated details for student ID: {self.id}")
+            
+            self.version = next_version()
+            if log:
+                record_logger.info(f"Updated details for student ID: {self.id}")
         except (ValueError, TypeError) as e:
             logging.error(f"Error updating details: {e}")
             raise
     
+    def as_row(self):
+        """
+        Return the student's fields as a cached, immutable tuple.
+        
+        The tuple is rebuilt only after update_details() or a change to the
+        contact, so list, report and export loops can read it without
+        allocating anything per student.
+        
+        Returns:
+            tuple: (id, name, age, grade, phone, email), with empty phone
+                and email when there is no contact information
+        """
+        contact = self.contact
+        if (self._row is None or contact is not self._row_contact
+                or (contact is not None and contact.version != self._row_contact_version)):
+            self._row = (self.id, self.name, self.age, self.grade,
+                         contact.phone if contact else "", contact.email if contact else "")
+            self._row_contact = contact
+            self._row_contact_version = contact.version if contact else None
+        return self._row
+    
     def get_details(self):
         """Return student details as a dictionary."""
         details = {
@@ -157,3 +462,76 @@ class Student:
             "contact": self.contact.get_details() if self.contact else None
         }
         return details
+
+
+class PackedStudent:
+    """
+    Read-only student record kept in its packed row form.
+    
+    Imported rows are validated once and stored as a single tuple, in the
+    layout of Student.as_row(), next to the code of the grade. Lists,
+    searches and reports read the tuple directly; a full Student is only
+    created (see materialize) when the record is edited or opened.
+    """
+    
+    __slots__ = ("_row", "grade_code", "version")
+    
+    def __init__(self, row, version=None):
+        """
+        Initialize a packed record.
+        
+        Args:
+            row (tuple): Validated (id, name, age, grade, phone, email)
+            version (int, optional): Version from next_version(); records
+                stored together may share one. A new one by default
+        """
+        self.version = next_version() if version is None else version
+        self.grade_code = GRADES.code(row[3])
+        grade = GRADES.names[self.grade_code]
+        # Share the interned name rather than keeping each row's copy
+        self._row = row if row[3] is grade else row[:3] + (grade,) + row[4:]
+    
+    @property
+    def id(self):
+        """Student ID."""
+        return self._row[0]
+    
+    @property
+    def name(self):
+        """Student name."""
+        return self._row[1]
+    
+    @property
+    def age(self):
+        """Student age."""
+        return self._row[2]
+    
+    @property
+    def grade(self):
+        """Student grade."""
+        return self._row[3]
+    
+    @property
+    def contact(self):
+        """A new Contact built from the packed phone and email."""
+        return Contact(self._row[4], self._row[5])
+    
+    def check_version(self, expected_version):
+        """Check the version an edit was based on, as Student.check_version() does."""
+        if expected_version is not None and expected_version != self.version:
+            raise VersionConflictError(self.id, expected_version, self.version)
+    
+    def as_row(self):
+        """Return the packed (id, name, age, grade, phone, email) tuple."""
+        return self._row
+    
+    def get_details(self):
+        """Return student details as a dictionary."""
+        return self.materialize().get_details()
+    
+    def materialize(self):
+        """Return a full Student with the same details and version."""
+        student_id, name, age, grade, phone, email = self._row
+        student = Student(student_id, name, age, grade, Contact(phone, email))
+        student.version = self.version
+        return student
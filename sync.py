@@ -0,0 +1,169 @@
+import json
+import os
+import uuid
+from contextlib import contextmanager
+
+# File in a data directory holding the change log
+SYNC_FILE = "sync.json"
+
+# Format version written in changeset headers
+CHANGESET_VERSION = 1
+
+
+class ChangeLog:
+    """
+    Per-record change sequence numbers for delta sync and backups.
+
+    Every change to a student, an attendance mark or a photo path takes the next sequence
+    number of this instance. Only the latest change per record is kept, in
+    a dict ordered by sequence number, so the changes since any sequence
+    are read from the end without scanning unchanged records.
+
+    Each entry also keeps the record's value as of the last export (a
+    student's row hash or an attendance status). A receiving instance
+    applies a change only if its own copy still matches that value, and
+    reports a conflict otherwise. Exporting to several instances at
+    different points can make the kept value newer than what a receiver
+    has; that shows up as a conflict rather than as a lost update.
+
+    Records loaded from saved files are not changes: their loaded values
+    are the baseline that later changes are exported against.
+    """
+
+    def __init__(self):
+        """Initialize an empty change log with a new instance ID."""
+        self.instance = uuid.uuid4().hex
+        self.sequence = 0
+        self.exported = 0
+        self.changes = {}
+        self.paused = False
+
+    @contextmanager
+    def suspended(self):
+        """Ignore changes inside a with block, e.g. while loading saved records."""
+        paused, self.paused = self.paused, True
+        try:
+            yield
+        finally:
+            self.paused = paused
+
+    def record(self, key, previous):
+        """
+        Record a change to one record.
+
+        Args:
+            key (tuple): ('student', id) or ('attendance', date, id)
+            previous: Value before the change (None if the record was new)
+        """
+        if self.paused:
+            return
+        self.sequence += 1
+        # Re-inserting moves the record to the end, keeping sequence order
+        change = self.changes.pop(key, None)
+        if change is not None and change[0] > self.exported:
+            # Changed again before being exported; the receiver still has the older value
+            previous = change[1]
+        self.changes[key] = (self.sequence, previous)
+
+    def rebase(self, key, value):
+        """
+        Make a value received from another instance the kept value of a record.
+
+        The sender already has the received value, so a later local change
+        to the record has to be exported as based on it; keeping the value
+        from before the apply would make the sender report a conflict.
+
+        Args:
+            key (tuple): Key of a change recorded while applying
+            value: The received value
+        """
+        change = self.changes.get(key)
+        if change is not None:
+            self.changes[key] = (change[0], value)
+
+    def since(self, sequence):
+        """
+        Return the changes made after a sequence number.
+
+        Args:
+            sequence (int): Last sequence number the receiver has seen
+
+        Returns:
+            list: (key, sequence, previous) tuples in sequence order
+        """
+        changes = []
+        for key in reversed(self.changes):
+            change_sequence, previous = self.changes[key]
+            if change_sequence <= sequence:
+                break
+            changes.append((key, change_sequence, previous))
+        changes.reverse()
+        return changes
+
+    def save(self, data_dir):
+        """Write the change log to a data directory."""
+        path = os.path.join(data_dir, SYNC_FILE)
+        state = {
+            "instance": self.instance,
+            "sequence": self.sequence,
+            "exported": self.exported,
+            "changes": [list(key) + [change_sequence, previous]
+                        for key, (change_sequence, previous) in self.changes.items()]
+        }
+        with open(path + ".tmp", 'w') as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, data_dir):
+        """
+        Read the change log of a data directory.
+
+        Returns:
+            ChangeLog: The saved log, or None if the directory has none
+        """
+        path = os.path.join(data_dir, SYNC_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            state = json.load(f)
+        log = cls()
+        log.instance = state["instance"]
+        log.sequence = state["sequence"]
+        log.exported = state["exported"]
+        log.changes = {tuple(entry[:-2]): (entry[-2], entry[-1]) for entry in state["changes"]}
+        return log
+
+
+def write_changeset(stream, header, entries):
+    """
+    Write a changeset as JSON Lines: a header line, then one line per change.
+
+    Args:
+        stream: Text stream to write to
+        header (dict): Source instance and sequence numbers
+        entries (iterable): Change dicts
+    """
+    stream.write(json.dumps(dict(header, type="header", version=CHANGESET_VERSION)) + "\n")
+    stream.writelines(json.dumps(entry) + "\n" for entry in entries)
+
+
+def read_changeset(stream):
+    """
+    Read a changeset written by write_changeset().
+
+    Returns:
+        tuple: (header, entries)
+
+    Raises:
+        ValueError: If the stream is not a supported changeset
+    """
+    lines = (line for line in stream if line.strip())
+    try:
+        header = json.loads(next(lines))
+        entries = [json.loads(line) for line in lines]
+    except (StopIteration, json.JSONDecodeError) as e:
+        raise ValueError(f"Not a valid changeset: {e}")
+    if header.get("type") != "header" or header.get("version") != CHANGESET_VERSION:
+        raise ValueError("Not a valid changeset: missing or unsupported header")
+    return header, entries
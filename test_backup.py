@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from backup import BackupSet, BACKUP_MANIFEST
+from main import StudentManagementSystem
+
+
+def record(name, number):
+    """Return the details of a valid student, unique by number."""
+    return {"name": name, "age": 12, "grade": "Grade 5",
+            "phone": f"0{10 ** 9 + number}", "email": f"s{number}@example.com"}
+
+
+class BackupTest(unittest.TestCase):
+    """Tests of full and delta snapshots and point-in-time restores."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.backup_dir = self.directory.name
+        self.sms = StudentManagementSystem()
+        self.sms.add_many([record("Ann", 1), record("Bob", 2), record("Cid", 3)])
+        self.sms.mark_attendance("2024-01-02", {1: "Present", 2: "Absent"})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def take_chain(self):
+        """Take a full snapshot and two deltas, an hour apart on 2024-01-10."""
+        kinds = [self.sms.backup(self.backup_dir)["kind"]]
+        self.sms.update_many({1: {"name": "Anna"}})
+        self.sms.delete_many([3])
+        self.sms.set_photos({2: "photos/2.jpg"})
+        kinds.append(self.sms.backup(self.backup_dir)["kind"])
+        self.sms.mark_attendance("2024-01-03", {1: "Absent"})
+        kinds.append(self.sms.backup(self.backup_dir)["kind"])
+        self.assertEqual(kinds, ["full", "delta", "delta"])
+
+        # Snapshots taken within one second share a time; spread them out
+        path = os.path.join(self.backup_dir, BACKUP_MANIFEST)
+        with open(path) as f:
+            manifest = json.load(f)
+        for hour, snapshot in enumerate(manifest["snapshots"], 10):
+            snapshot["time"] = f"2024-01-10T{hour}:00:00"
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+
+    def restore(self, at=None):
+        """Restore the backups into a new system."""
+        sms = StudentManagementSystem()
+        sms.restore_backup(self.backup_dir, at)
+        return sms
+
+    def test_delta_holds_only_changes(self):
+        self.take_chain()
+        counts = [snapshot["records"] for snapshot in BackupSet(self.backup_dir).snapshots]
+        # Three students, two marks; then a student update, a deletion and a photo; then one mark
+        self.assertEqual(counts, [5, 3, 1])
+
+    def test_nothing_changed(self):
+        self.sms.backup(self.backup_dir)
+        self.assertIsNone(self.sms.backup(self.backup_dir))
+
+    def test_restore_latest(self):
+        self.take_chain()
+        sms = self.restore()
+        self.assertEqual(sorted(sms.students), [1, 2])
+        self.assertEqual(sms.students[1].name, "Anna")
+        self.assertEqual(sms.attendance_records, {"2024-01-02": {1: "Present", 2: "Absent"},
+                                                  "2024-01-03": {1: "Absent"}})
+        self.assertEqual(sms.photos, {2: "photos/2.jpg"})
+        self.assertEqual(sms.next_id, self.sms.next_id)
+
+    def test_restore_at(self):
+        self.take_chain()
+        sms = self.restore(datetime(2024, 1, 10, 11, 30))
+        self.assertEqual(sorted(sms.students), [1, 2])
+        self.assertNotIn("2024-01-03", sms.attendance_records)
+
+        sms = self.restore(datetime(2024, 1, 10, 10, 0))
+        self.assertEqual(sorted(sms.students), [1, 2, 3])
+        self.assertEqual(sms.students[1].name, "Ann")
+        self.assertEqual(sms.photos, {})
+
+    def test_restore_before_first_full_snapshot(self):
+        self.take_chain()
+        with self.assertRaises(ValueError):
+            self.restore(datetime(2024, 1, 9))
+
+    def test_restore_needs_empty_system(self):
+        self.take_chain()
+        with self.assertRaises(ValueError):
+            self.sms.restore_backup(self.backup_dir)
+
+    def test_new_change_log_starts_a_full_snapshot(self):
+        self.take_chain()
+        sms = self.restore()
+        sms.update_many({2: {"age": 13}})
+        self.assertEqual(sms.backup(self.backup_dir)["kind"], "full")
+        self.assertEqual(self.restore().students[2].age, 13)
+
+
+if __name__ == "__main__":
+    unittest.main()
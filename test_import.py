@@ -0,0 +1,41 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from main import StudentManagementSystem, STUDENT_FIELDS_HEADER
+
+
+class ImportTest(unittest.TestCase):
+    """Tests of StudentManagementSystem.import_csv()."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "students.csv")
+        # Two spellings of one grade: the first one seen is displayed for both
+        with open(self.path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(STUDENT_FIELDS_HEADER)
+            writer.writerow([1, "Ann", 12, "Grade 5", "01000000001", "ann@example.com"])
+            writer.writerow([2, "Bob", 13, "grade  5", "01000000002", "bob@example.com"])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reimport_is_a_no_op(self):
+        sms = StudentManagementSystem()
+        counts, errors = sms.import_csv(self.path)
+        self.assertEqual(errors, {})
+        self.assertEqual(counts["added"], 2)
+        self.assertEqual(sms.students[2].grade, "Grade 5")
+
+        sequence = sms.changes.sequence
+        for _ in range(2):
+            counts, errors = sms.import_csv(self.path)
+            self.assertEqual(errors, {})
+            self.assertEqual(counts, {"added": 0, "updated": 0, "unchanged": 2, "removed": 0})
+        self.assertEqual(sms.changes.sequence, sequence)
+
+
+if __name__ == "__main__":
+    unittest.main()
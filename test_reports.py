@@ -0,0 +1,89 @@
+import contextlib
+import io
+import pickle
+import tempfile
+import unittest
+
+from main import StudentManagementSystem, BatchRunner, OutputWriter, build_script_parser, EXIT_USAGE
+from reports import ReportEngine, ReportSpec, Aggregate
+
+
+def record(number):
+    """Return the details of a valid student, unique by number, in one of three grades."""
+    name = "".join(chr(ord("a") + int(digit)) for digit in str(number))
+    return {"name": f"Student {name.title()}", "age": 6 + number % 11, "grade": f"Grade {number % 3 + 1}",
+            "phone": f"0{10 ** 9 + number}", "email": f"s{number}@example.com"}
+
+
+SPECS = [
+    ReportSpec("by_grade", ["grade"], ["count", "mean:age", "min:age", "max:age", "p50:age", "attendance_rate"]),
+    ReportSpec("by_band", ["age_band"], ["count", "percentage", "present", "marked"], dates=("2024-01-02", None)),
+    ReportSpec("by_status", ["date", "status"], ["count"], where=[("grade", "!=", "Grade 2")]),
+    ReportSpec("overall", [], ["count", "p90:age"])
+]
+
+
+class ReportTest(unittest.TestCase):
+    """Tests of the report engine and of merging reports over grade shards."""
+
+    def setUp(self):
+        self.sms = StudentManagementSystem()
+        self.sms.add_many([record(number) for number in range(60)])
+        for day in range(1, 4):
+            self.sms.mark_attendance(f"2024-01-0{day}", {
+                student_id: "Present" if (student_id + day) % 4 else "Absent" for student_id in self.sms.students})
+        self.expected = self.sms.run_reports(SPECS)
+
+    def test_results(self):
+        by_grade = {row["grade"]: row for row in self.expected["by_grade"]}
+        self.assertEqual(sorted(by_grade), ["Grade 1", "Grade 2", "Grade 3"])
+        self.assertEqual(sum(row["count"] for row in by_grade.values()), 60)
+        ages = [student.age for student in self.sms.students.values() if student.grade == "Grade 1"]
+        self.assertEqual(by_grade["Grade 1"]["mean:age"], sum(ages) / len(ages))
+        self.assertEqual(by_grade["Grade 1"]["min:age"], min(ages))
+        self.assertEqual(by_grade["Grade 1"]["max:age"], max(ages))
+
+        self.assertAlmostEqual(sum(row["percentage"] for row in self.expected["by_band"]), 100)
+        # Two of the three days are in the date range
+        self.assertEqual(sum(row["marked"] for row in self.expected["by_band"]), 120)
+        self.assertEqual(sum(row["count"] for row in self.expected["by_status"]), 3 * 40)
+        self.assertEqual(self.expected["overall"][0]["count"], 60)
+
+    def test_merged_parts_match_one_scan(self):
+        parts = [[student for student in self.sms.students.values() if student.id % 2 == parity]
+                 for parity in (0, 1)]
+        engine = ReportEngine(SPECS)
+        for students in parts:
+            ids = {student.id for student in students}
+            attendance = {date: {student_id: status for student_id, status in statuses.items() if student_id in ids}
+                          for date, statuses in self.sms.attendance_records.items()}
+            part = ReportEngine(SPECS)
+            part.scan(students, attendance)
+            # Parts are scanned by worker processes and sent back pickled
+            engine.merge(pickle.loads(pickle.dumps(part.state)))
+        self.assertEqual(engine.results(), self.expected)
+
+    def test_unloaded_shards_match_loaded_roster(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.sms.shard(data_dir)
+            self.sms.save(data_dir)
+            sms = StudentManagementSystem()
+            sms.load(data_dir, ["Grade 1"])
+            self.assertEqual(sms.run_reports(SPECS, max_workers=2), self.expected)
+            self.assertEqual(len(sms.students), 20)
+
+    def test_numeric_aggregates_need_numeric_fields(self):
+        for text in ("mean:name", "min:grade", "max:email", "p50:status"):
+            with self.assertRaises(ValueError):
+                Aggregate(text)
+        self.assertEqual(Aggregate("first:name").field, "name")
+
+    def test_invalid_report_is_a_usage_error(self):
+        runner = BatchRunner(self.sms, OutputWriter(io.StringIO()))
+        args = build_script_parser().parse_args(["report", "--group-by", "grade", "--agg", "mean:name"])
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(runner.run(args), EXIT_USAGE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import os
+import tempfile
+import unittest
+
+from main import (StudentManagementSystem, BatchRunner, OutputWriter, build_script_parser,
+                  EXIT_OK, STUDENTS_FILE)
+from sharding import ShardSet
+
+
+def record(number, grade):
+    """Return the details of a valid student, unique by number."""
+    # Names may not contain digits
+    name = "".join(chr(ord("a") + int(digit)) for digit in str(number))
+    return {"name": f"Student {name.title()}", "age": 10 + number % 5, "grade": grade,
+            "phone": f"0{10 ** 9 + number}", "email": f"s{number}@example.com"}
+
+
+class ShardTest(unittest.TestCase):
+    """Tests of sharding a data directory by grade and loading it back."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_dir = self.directory.name
+        sms = StudentManagementSystem()
+        sms.add_many([record(number, f"Grade {number % 3 + 1}") for number in range(30)])
+        sms.save(self.data_dir)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def shard(self):
+        """Shard the data directory from a command script, as 'script' does."""
+        sms = StudentManagementSystem()
+        sms.load(self.data_dir)
+        output = io.StringIO()
+        runner = BatchRunner(sms, OutputWriter(output), self.data_dir)
+        status = runner.run_script(io.StringIO("shard\n"), build_script_parser())
+        self.assertEqual(status, EXIT_OK)
+        self.assertTrue(runner.modified)
+        sms.save(self.data_dir)
+        return output.getvalue()
+
+    def test_shard_from_script(self):
+        output = self.shard()
+        self.assertIn(self.data_dir, output)
+        shards = ShardSet.open(self.data_dir)
+        self.assertEqual(sorted(shards.grades), ["Grade 1", "Grade 2", "Grade 3"])
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, STUDENTS_FILE)))
+
+    def test_partial_load(self):
+        self.shard()
+        sms = StudentManagementSystem()
+        sms.load(self.data_dir, ["grade  1"])
+        self.assertEqual(len(sms.students), 10)
+        self.assertEqual(sms.shards.unloaded, ["Grade 2", "Grade 3"])
+
+        # A student of an unloaded grade is found by loading the rest
+        self.assertEqual(sms.get_student(2).grade, "Grade 2")
+        self.assertEqual(len(sms.students), 30)
+
+    def test_unique_checks_see_unloaded_shards(self):
+        self.shard()
+        sms = StudentManagementSystem()
+        sms.load(self.data_dir, ["Grade 1"])
+        # Student 2 is in Grade 2, which is not loaded yet
+        ids, errors = sms.add_many([dict(record(1, "Grade 1"), name="Copy")])
+        self.assertEqual(ids, [None])
+        self.assertIn(0, errors)
+        self.assertEqual(len(sms.students), 30)
+
+    def test_save_rewrites_loaded_shards_only(self):
+        self.shard()
+        sms = StudentManagementSystem()
+        sms.load(self.data_dir, ["Grade 1"])
+        updated, errors = sms.update_many({1: {"name": "Renamed"}})
+        self.assertEqual((updated, errors), ([1], {}))
+        sms.save(self.data_dir)
+
+        reloaded = StudentManagementSystem()
+        reloaded.load(self.data_dir)
+        self.assertEqual(len(reloaded.students), 30)
+        self.assertEqual(reloaded.get_student(1).name, "Renamed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import contextlib
+import io
+import math
+import random
+import tempfile
+import unittest
+
+from main import StudentManagementSystem, BatchRunner, OutputWriter, build_script_parser, EXIT_USAGE
+from sketches import Histogram, age_histogram, attendance_rate_histogram
+
+
+def nearest_rank(values, q):
+    """Return the exact nearest-rank q-th percentile of a list."""
+    values = sorted(values)
+    return values[max(1, math.ceil(q / 100 * len(values))) - 1]
+
+
+def record(number):
+    """Return the details of a valid student, unique by number, in one of three grades."""
+    name = "".join(chr(ord("a") + int(digit)) for digit in str(number))
+    return {"name": f"Student {name.title()}", "age": 5 + number * 7 % 13, "grade": f"Grade {number % 3 + 1}",
+            "phone": f"0{10 ** 9 + number}", "email": f"s{number}@example.com"}
+
+
+class HistogramTest(unittest.TestCase):
+    """Tests of the mergeable histogram sketch."""
+
+    def setUp(self):
+        rng = random.Random(1)
+        self.ages = [rng.randint(5, 18) for _ in range(1000)]
+        self.rates = [rng.uniform(0, 100) for _ in range(1000)]
+
+    def test_discrete_percentiles_are_exact(self):
+        sketch = age_histogram()
+        for age in self.ages:
+            sketch.add(age)
+        for q in (0, 1, 10, 25, 50, 75, 90, 99, 100):
+            self.assertEqual(sketch.percentile(q), nearest_rank(self.ages, q))
+
+    def test_percentiles_within_max_error(self):
+        sketch = attendance_rate_histogram()
+        for rate in self.rates:
+            sketch.add(rate)
+        for q in (1, 10, 50, 90, 99):
+            self.assertLessEqual(abs(sketch.percentile(q) - nearest_rank(self.rates, q)), sketch.max_error)
+
+    def test_merge_matches_one_sketch(self):
+        whole, first, second = age_histogram(), age_histogram(), age_histogram()
+        for position, age in enumerate(self.ages):
+            whole.add(age)
+            (first if position % 2 else second).add(age)
+        merged = first.copy().merge(second)
+        self.assertEqual((merged.counts, merged.count), (whole.counts, whole.count))
+        # The copy is independent of the sketch it was taken from
+        self.assertEqual(first.count, 500)
+
+    def test_merge_needs_same_layout(self):
+        with self.assertRaises(ValueError):
+            age_histogram().merge(Histogram(0, 100, 50))
+
+    def test_remove_undoes_add(self):
+        sketch = age_histogram()
+        for age in self.ages:
+            sketch.add(age)
+        sketch.add(200)
+        sketch.remove(200)
+        self.assertEqual(sketch.percentile(100), max(self.ages))
+        self.assertEqual(sketch.count, len(self.ages))
+
+    def test_invalid_percentiles(self):
+        sketch = age_histogram()
+        self.assertIsNone(sketch.percentile(50))
+        for q in (-1, 100.5, 150):
+            with self.assertRaises(ValueError):
+                sketch.percentile(q)
+
+
+class RosterSketchTest(unittest.TestCase):
+    """Tests of the sketches a roster maintains, loaded or in shards."""
+
+    def setUp(self):
+        self.sms = StudentManagementSystem()
+        self.sms.add_many([record(number) for number in range(60)])
+        for day in range(1, 5):
+            self.sms.mark_attendance(f"2024-01-0{day}", {
+                student_id: "Present" if student_id % (day + 1) else "Absent" for student_id in self.sms.students})
+
+    def rates(self):
+        """Return the exact attendance rate of every marked student."""
+        rates = {}
+        for statuses in self.sms.attendance_records.values():
+            for student_id, status in statuses.items():
+                days = rates.setdefault(student_id, [0, 0])
+                days[0] += status == "Present"
+                days[1] += 1
+        return [present / marked * 100 for present, marked in rates.values()]
+
+    def test_sketches_follow_changes(self):
+        self.sms.update_many({1: {"age": 40}})
+        self.sms.delete_many([2, 3])
+        sketches = self.sms.percentile_sketches()
+        ages = [student.age for student in self.sms.students.values()]
+        for q in (10, 50, 90, 100):
+            self.assertEqual(sketches["age"].percentile(q), nearest_rank(ages, q))
+        rates = self.rates()
+        for q in (10, 50, 90):
+            self.assertLessEqual(abs(sketches["attendance_rate"].percentile(q) - nearest_rank(rates, q)),
+                                 sketches["attendance_rate"].max_error)
+
+    def test_unloaded_shards_match_loaded_roster(self):
+        expected = self.sms.percentile_sketches()
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.sms.shard(data_dir)
+            self.sms.save(data_dir)
+            sms = StudentManagementSystem()
+            sms.load(data_dir, ["Grade 2"])
+            sketches = sms.percentile_sketches(max_workers=2)
+        for field, sketch in sketches.items():
+            self.assertEqual((sketch.counts, sketch.count), (expected[field].counts, expected[field].count))
+
+    def test_invalid_percentile_is_a_usage_error(self):
+        output = io.StringIO()
+        runner = BatchRunner(self.sms, OutputWriter(output))
+        args = build_script_parser().parse_args(["percentiles", "--q", "50", "--q", "150"])
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(runner.run(args), EXIT_USAGE)
+        self.assertEqual(output.getvalue(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
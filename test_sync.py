@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from main import StudentManagementSystem, STUDENTS_FILE
+
+
+def record(name, number, grade="Grade 5"):
+    """Return the details of a valid student, unique by number."""
+    return {"name": name, "age": 12, "grade": grade,
+            "phone": f"0{10 ** 9 + number}", "email": f"s{number}@example.com"}
+
+
+class SyncTest(unittest.TestCase):
+    """Tests of exporting and applying changesets between two instances."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # Two offices start from copies of one students file
+        seed = StudentManagementSystem()
+        seed.add_many([record("Ann", 1), record("Bob", 2), record("Cid", 3)])
+        paths = {}
+        for office in ("a", "b"):
+            paths[office] = os.path.join(self.directory.name, office)
+            os.makedirs(paths[office])
+        seed.export_csv(os.path.join(paths["a"], STUDENTS_FILE))
+        shutil.copy(os.path.join(paths["a"], STUDENTS_FILE), paths["b"])
+        self.a = StudentManagementSystem()
+        self.a.load(paths["a"])
+        self.b = StudentManagementSystem()
+        self.b.load(paths["b"])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def send(self, source, target, since=0):
+        """Export the changes of one instance since a sequence and apply them to another."""
+        path = os.path.join(self.directory.name, "changes.jsonl")
+        source.export_changes(path, since)
+        return target.apply_changes(path)
+
+    def test_loaded_records_are_not_changes(self):
+        path = os.path.join(self.directory.name, "changes.jsonl")
+        self.assertEqual(self.a.export_changes(path), 0)
+
+    def test_round_trip_from_same_seed(self):
+        self.a.update_many({1: {"name": "Anna"}})
+        self.a.mark_attendance("2024-01-02", {1: "Present", 2: "Absent"})
+        self.b.update_many({2: {"age": 13}})
+        self.b.delete_many([3])
+
+        counts, conflicts = self.send(self.a, self.b)
+        self.assertEqual(conflicts, {})
+        self.assertEqual(counts["applied"], 3)
+        counts, conflicts = self.send(self.b, self.a)
+        self.assertEqual(conflicts, {})
+        self.assertEqual(counts["applied"], 2)
+
+        for sms in (self.a, self.b):
+            self.assertEqual(sms.students[1].name, "Anna")
+            self.assertEqual(sms.students[2].age, 13)
+            self.assertNotIn(3, sms.students)
+            self.assertEqual(sms.attendance_records["2024-01-02"], {1: "Present", 2: "Absent"})
+
+    def test_apply_is_idempotent(self):
+        self.a.update_many({1: {"name": "Anna"}})
+        self.send(self.a, self.b)
+        counts, conflicts = self.send(self.a, self.b)
+        self.assertEqual(conflicts, {})
+        self.assertEqual((counts["applied"], counts["unchanged"]), (0, 1))
+
+    def test_edit_on_both_sides_conflicts(self):
+        self.a.update_many({1: {"name": "Anna"}})
+        self.b.update_many({1: {"name": "Annie"}})
+        counts, conflicts = self.send(self.a, self.b)
+        self.assertEqual(list(conflicts), ["student 1"])
+        self.assertEqual(counts["applied"], 0)
+        self.assertEqual(self.b.students[1].name, "Annie")
+
+    def test_edit_of_received_record_is_based_on_it(self):
+        self.a.update_many({1: {"name": "Anna"}})
+        self.send(self.a, self.b)
+        sequence = self.b.changes.sequence
+        self.b.update_many({1: {"name": "Annie"}})
+        counts, conflicts = self.send(self.b, self.a, since=sequence)
+        self.assertEqual(conflicts, {})
+        self.assertEqual(self.a.students[1].name, "Annie")
+
+    def test_photo_paths_are_not_synced(self):
+        self.a.set_photos({1: "/home/office-a/photos/1.jpg"})
+        path = os.path.join(self.directory.name, "changes.jsonl")
+        self.assertEqual(self.a.export_changes(path), 0)
+        self.send(self.a, self.b)
+        self.assertEqual(self.b.photos, {})
+
+
+if __name__ == "__main__":
+    unittest.main()